@@ -0,0 +1,92 @@
+"""
+XMLTransformer dvigatellarini solishtirish: etree (joriy), stream (SAX) va bytes (mmap).
+
+Ishga tushirish (loyiha ildizidan):
+    python benchmarks/bench_xml_transformer.py
+    python benchmarks/bench_xml_transformer.py --sizes 10000,100000 --engines stream,bytes
+
+Har bir o'lchov alohida jarayonda bajariladi, shuning uchun "peak RSS" shu dvigatelga tegishli.
+Diqqat: 5M outlet uchun etree bir necha GB xotira talab qilishi mumkin.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+DEFAULT_SIZES = "10000,100000,1000000,5000000"
+DEFAULT_ENGINES = "etree,stream,bytes"
+
+
+def generate_outlets(path: str, count: int, mappings: dict):
+    """Sintetik Outlets.xml: taxminan yarmi mapping'dagi AREA_ID ga ega."""
+    rng = random.Random(count)
+    mapped_ids = list(mappings) or ["1"]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<Outlets>\n')
+        for i in range(count):
+            area_id = rng.choice(mapped_ids) if i % 2 else str(900000 + i % 1000)
+            f.write(f'  <Outlet OL_ID="{i}" AREA_ID="{area_id}" NAME="Outlet {i}" ADDRESS="Street {i % 500}"/>\n')
+        f.write('</Outlets>\n')
+
+
+def _run_engine(engine: str, source_path: str, queue):
+    import shutil
+    from services import xml_transformer as module
+
+    module.settings.XML_TRANSFORM_ENGINE = engine
+    transformer = module.XMLTransformer()
+    mappings = transformer.mappings  # yuklashni vaqt o'lchovidan chiqaramiz
+
+    work_path = source_path + f".{engine}.xml"
+    shutil.copyfile(source_path, work_path)
+    try:
+        started = time.perf_counter()
+        changed = transformer.process_outlets(work_path)
+        elapsed = time.perf_counter() - started
+    finally:
+        os.remove(work_path)
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, peak_kb / 1024, changed, len(mappings)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES)
+    parser.add_argument("--engines", default=DEFAULT_ENGINES)
+    args = parser.parse_args()
+
+    os.chdir(PROJECT_ROOT)
+    from services.xml_transformer import XMLTransformer
+    mappings = XMLTransformer().mappings
+
+    print(f"{'outlets':>10} {'engine':>8} {'MB':>9} {'time, s':>9} {'peak RSS, MB':>13}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            source_path = os.path.join(tmp_dir, f"Outlets_{size}.xml")
+            generate_outlets(source_path, size, mappings)
+            file_mb = os.path.getsize(source_path) / (1024 * 1024)
+
+            for engine in args.engines.split(","):
+                queue = multiprocessing.Queue()
+                proc = multiprocessing.Process(target=_run_engine, args=(engine, source_path, queue))
+                proc.start()
+                proc.join()
+                if proc.exitcode != 0:
+                    print(f"{size:>10} {engine:>8} {file_mb:>9.1f} {'FAILED':>9}")
+                    continue
+                elapsed, peak_mb, _, _ = queue.get()
+                print(f"{size:>10} {engine:>8} {file_mb:>9.1f} {elapsed:>9.2f} {peak_mb:>13.1f}")
+
+            os.remove(source_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 class Settings(BaseSettings):
     # 1. SMARTUP ASOSIY SOZLAMALAR
@@ -10,11 +10,25 @@ class Settings(BaseSettings):
     COMPANY_NAME: str
     COMPANY_ID: int
     FILIAL_ID: int
+    SMARTUP_TOKEN_CACHE_FILE: str = ""  # Masalan: data/token_cache.json (bo'sh bo'lsa kesh o'chiq)
+    SMARTUP_TOKEN_REFRESH_MARGIN: int = 120  # Token tugashidan necha soniya oldin yangilanadi
 
     # 2. SALESWORK SOZLAMALAR (01:00 uchun)
     TEMPLATE_ID: str = ""
     PERIOD_TYPE: str = "L90D"
     DAYS_DIFF: int = 90
+    SALESWORK_DOWNLOAD_TO_DISK: bool = False  # ZIP ni RAM emas, to'g'ridan-to'g'ri backups/ ga yozish
+    SALESWORK_RESUME_ATTEMPTS: int = 5  # Disk rejimida uzilgan oqimni Range bilan davom ettirish urinishlari
+    ZIP_VALIDATE_ON_EXTRACT: bool = False  # testzip() o'rniga CRC ni ochish paytida bir o'tishda tekshirish
+    SALESWORK_DOWNLOAD_WORKERS: int = 1  # 1 dan katta bo'lsa shablonlar parallel yuklanadi
+    SMARTUP_MAX_CONNECTIONS_PER_HOST: int = 2  # Bitta Smartup serveriga bir vaqtdagi so'rovlar soni
+    SALESWORK_INCREMENTAL: bool = False  # Faqat oxirgi kunlarni yuklab, to'liq davrni lokal ombordan yig'ish
+    SALESWORK_INCREMENTAL_DAYS: int = 3  # Har safar qayta olinadigan oxirgi kunlar (kechikkan tuzatishlar uchun)
+    SALESWORK_INCREMENTAL_DATE_ATTRS: str = "DATE"  # Qator sanasi yoziladigan atribut(lar), vergul bilan
+    SALESWORK_STORE_DIR: str = "data/saleswork_store"
+    SALESWORK_SPLIT_PARTS: int = 1  # 1 dan katta bo'lsa davr shuncha qismga bo'linib, parallel so'raladi
+    # Bo'laklarni birlashtirishda ma'lumotnoma qatorlari kaliti: "ID" (hamma fayllar uchun) va/yoki "Outlets.xml:OUTLET_ID"
+    SALESWORK_MERGE_KEYS: str = "ID"
 
     # 3. SFTP/FTP SOZLAMALAR (Saleswork uchun)
     PROTOCOL: str = "SFTP"
@@ -23,13 +37,59 @@ class Settings(BaseSettings):
     SFTP_USERNAME: str = ""
     SFTP_PASSWORD: str = ""
     SFTP_REMOTE_PATH: str = "/"
+    SFTP_PARALLEL_CHANNELS: int = 1  # Parallel yuklash kanallari soni (1 - ketma-ket)
+    SFTP_PARALLEL_TRANSPORTS: bool = False  # True - har bir kanal uchun alohida SSH ulanish
+    SFTP_VERIFY_CHECKSUM: bool = False  # Yuklangandan keyin SHA1 solishtirish (server check-file qo'llasa)
+    # SSH transport sozlamalari (0 / "" - paramiko standarti); `main.py calibrate` natijasi ulardan ustun
+    SFTP_COMPRESS: bool = True
+    SFTP_WINDOW_SIZE: int = 0  # Bayt, masalan 8388608 (8 MB)
+    SFTP_MAX_PACKET_SIZE: int = 0  # Bayt, masalan 32768
+    SFTP_CIPHERS: str = ""  # Afzal shifrlar vergul bilan, masalan "aes128-gcm@openssh.com,aes128-ctr"
+    SFTP_PROFILE_FILE: str = "data/sftp_profile.json"  # Kalibrovka natijalari (klient va server bo'yicha)
+    SFTP_CALIBRATE_PAYLOAD_MB: int = 8
+    FTP_PARALLEL_CONNECTIONS: int = 1  # FTP: parallel yuklash ulanishlari soni (1 - ketma-ket)
+    FTP_BLOCK_SIZE: int = 8192  # storbinary blok hajmi (bayt)
+    FTP_PASSIVE: bool = True  # False - aktiv rejim (PORT)
+    FTP_TRUST_PASV_ADDRESS: bool = False  # True - PASV javobidagi IP ishlatiladi (odatda - boshqaruv ulanishi manzili)
+    UPLOAD_ATOMIC: bool = False  # Vaqtinchalik nom bilan yuklab, oxirida hammasini birdan qayta nomlash
+    UPLOAD_TEMP_SUFFIX: str = ".part"
+    # ZIP a'zolarini temp_extract ga ochmasdan oqim bilan yuklash (inkremental rejim va manifest bilan ishlamaydi)
+    UPLOAD_STREAM_FROM_ZIP: bool = False
+    UPLOAD_SKIP_UNCHANGED: bool = False  # Oldingi yuklash bilan bir xil (xesh) fayllarni yubormaslik
+    UPLOAD_MANIFEST_FILE: str = "data/upload_manifest.json"
 
     # 4. MONOLIT SOZLAMALAR (20:00 uchun - API orqali jo'natishga)
     ENABLE_XML_TRANSFORMATION: bool = False
+    XML_TRANSFORM_ENGINE: str = "etree"  # etree - to'liq daraxt; stream - oqimli SAX; bytes - baytlar ustida (mmap)
+    XML_AREA_MAPPING_FILE: str = "data/area_mappings.json"  # Klientga xos AREA_ID jadvali
+    XML_MAPPING_CACHE_DIR: str = "data/.mapping_cache"  # Kompilyatsiya qilingan jadvallar keshi (bo'sh - o'chiq)
+    XML_TRANSFORM_ON_EXTRACT: bool = False  # ZIP a'zolari ochilish paytida o'zgartiriladi (diskka bir marta yoziladi)
+    XML_TRANSFORM_WORKERS: int = 1  # Parallel transformatsiya jarayonlari (0 - yadrolar soni)
+    XML_TRANSFORM_RULES_FILE: str = ""  # Qoidalar fayli (JSON); bo'sh bo'lsa - faqat Outlets.xml AREA_ID
     MONOLIT_REPORT_TYPES: str = ""
     BALTIKA_API_URL: str = ""  # Monolit jo'natiladigan manzil
+    BALTIKA_STREAMING_UPLOAD: bool = False  # XMLData formasini str ga o'girmasdan, bo'laklab kodlab yuborish
+    BALTIKA_OUTBOX_ENABLED: bool = False  # Yuborilmagan hisobotlarni lokal navbatga qo'yib, keyin qayta yuborish
+    BALTIKA_OUTBOX_DIR: str = "data/baltika_outbox"
+    BALTIKA_OUTBOX_BASE_WAIT: float = 300.0  # Birinchi qayta urinishgacha kutish (har safar 2 baravar oshadi)
+    BALTIKA_OUTBOX_MAX_WAIT: float = 21600.0
+    BALTIKA_OUTBOX_MAX_ATTEMPTS: int = 0  # 0 - cheksiz; oshsa yozuv navbatdan chiqariladi (fayli saqlanadi)
 
-    # 5. BOSHQA SOZLAMALAR
+    # 5. RETRY SIYOSATI (endpoint bo'yicha: eksponensial kutish + jitter, Retry-After hisobga olinadi)
+    RETRY_SALESWORK_ATTEMPTS: int = 3
+    RETRY_SALESWORK_BASE_WAIT: float = 5.0
+    RETRY_SALESWORK_MAX_WAIT: float = 300.0
+    RETRY_MONOLIT_ATTEMPTS: int = 3
+    RETRY_MONOLIT_BASE_WAIT: float = 5.0
+    RETRY_MONOLIT_MAX_WAIT: float = 120.0
+
+    # 6. HTTP ULANISHLAR (Smartup va Baltika uchun umumiy)
+    HTTP_POOL_SIZE: int = 10  # Har bir host uchun keep-alive ulanishlar soni
+    HTTP_KEEP_ALIVE: bool = True
+    HTTP_TRANSPORT_RETRIES: int = 2  # Faqat ulanish o'rnatish xatolarida qayta urinish
+    HTTP_RETRY_BACKOFF: float = 0.5
+
+    # 7. BOSHQA SOZLAMALAR
     ENABLE_MONOLIT_REPORT: bool = False
     EMAIL_SENDER: str
     EMAIL_PASSWORD: str
@@ -53,6 +113,22 @@ class Settings(BaseSettings):
             # Agar kutilmagan belgi (harf) bo'lsa, xato bermay bo'sh ro'yxat qaytaradi
             return []
 
+    @property
+    def get_incremental_date_attrs(self) -> List[str]:
+        if not self.SALESWORK_INCREMENTAL_DATE_ATTRS:
+            return []
+        return [a.strip() for a in self.SALESWORK_INCREMENTAL_DATE_ATTRS.split(",") if a.strip()]
+
+    @property
+    def get_merge_keys(self) -> Dict[str, str]:
+        """{fayl_nomi (kichik harflarda): kalit_atribut}; "" kaliti - qolgan barcha fayllar uchun."""
+        keys = {}
+        for item in self.SALESWORK_MERGE_KEYS.split(","):
+            file_name, _, attr = item.strip().rpartition(":")
+            if attr.strip():
+                keys[file_name.strip().lower()] = attr.strip()
+        return keys
+
     @property
     def get_monolit_report_types(self) -> List[str]:
         if not self.MONOLIT_REPORT_TYPES:
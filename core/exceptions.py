@@ -13,6 +13,21 @@ class InvalidZipFileError(SmartupError):
     """ZIP fayl noto'g'ri yoki buzilgan bo'lganda."""
     pass
 
+class SmartupHTTPError(SmartupError):
+    """Smartup API xato HTTP status qaytarganda (retry siyosati status bo'yicha qaror qiladi)."""
+    def __init__(self, message: str, status_code: int, retry_after: float = None):
+        self.status_code = status_code
+        self.retry_after = retry_after
+        super().__init__(message)
+
+class SmartupAuthError(SmartupHTTPError):
+    """Token eskirgan yoki yaroqsiz (401 / avtorizatsiya sahifasi)."""
+    pass
+
+class SmartupCredentialsError(SmartupHTTPError):
+    """Token endpoint'ining o'zi 401 qaytardi (client_id/secret noto'g'ri) - qayta urinish foydasiz."""
+    pass
+
 # ==================== SFTP XATOLIKLARI ====================
 class SFTPError(SayonarBaseError):
     """SFTP ulanishi yoki fayl yuklash bilan bog'liq xatolik."""
@@ -29,4 +44,12 @@ class FileProcessingError(SayonarBaseError):
 
 class NoXmlFilesError(FileProcessingError):
     """ZIP ichida XML fayllar topilmaganda."""
+    pass
+
+class StreamTransformError(FileProcessingError):
+    """ZIP dan oqim bilan yuborishda XML transformatsiyasi xato berdi (yuklash to'xtatiladi, qayta urinilmaydi)."""
+    pass
+
+class IncrementalStoreError(FileProcessingError):
+    """Inkremental ombor qisqartirilgan yuklashni to'liq davrgacha to'ldira olmaganda."""
     pass
\ No newline at end of file
@@ -1,5 +1,7 @@
 import sys
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import List
 from core.config import settings
@@ -10,11 +12,16 @@ from services.sftp_manager import sftp_manager
 from services.ftp_manager import ftp_manager
 from services.mail_service import mail_service
 from utils.file_handler import file_handler
+from utils.saleswork_store import saleswork_store
+from utils.upload_manifest import upload_manifest
+from utils.upload_source import upload_name
 from services.xml_transformer import xml_transformer
 from services.baltika_client import baltika_client
+from utils.baltika_outbox import baltika_outbox
+from services.range_splitter import extract_and_merge, split_date_range
 
 
-def run_integration(job_type="all"):
+def run_integration(job_type="all", force=False):
     current_logs: List[str] = []
 
     # Log yozish yordamchisi
@@ -29,6 +36,24 @@ def run_integration(job_type="all"):
         elif level == "warning":
             logger.warning(message)
 
+    # Qoidalar bo'yicha umumiy natija (barcha transformatsiya rejimlari uchun bir xil format)
+    def log_rule_totals(results):
+        rule_totals = {}
+        for _, hits in results:
+            for rule_name, count in hits.items():
+                rule_totals[rule_name] = rule_totals.get(rule_name, 0) + count
+        for rule_name, count in rule_totals.items():
+            custom_log(f"📊 Правило '{rule_name}': заменено {count}.")
+
+    # Ochish/yuborish paytida transformatsiya qilingan fayllar natijasi
+    def log_transform_hits():
+        results = file_handler.transform_results()
+        for file_name, hits in results:
+            if hits:
+                details = ", ".join(f"{name}: {count}" for name, count in hits.items())
+                custom_log(f"✅ {file_name} обновлен ({details})")
+        log_rule_totals(results)
+
     # Bu sessiyada yaratilgan backup fayllar ro'yxati
     session_backup_files: List[str] = []
 
@@ -50,54 +75,202 @@ def run_integration(job_type="all"):
                 saleswork_files = []
 
                 # A. Yuklab olish va Extract qilish
-                for t_id in template_ids:
-                    try:
-                        custom_log(f"📥 Скачивание шаблона ID: {t_id}...")
-                        zip_content = smartup_client.download_sales_report(template_id=t_id)
-
+                period_begin, period_end = smartup_client.get_sales_period()
+                fetch_periods = {}
+
+                # Diskka ochmasdan yuklash: XML lar ZIP dan to'g'ridan-to'g'ri serverga oqadi.
+                # Inkremental ombor va manifest diskdagi fayllar bilan ishlaydi - ular bilan birga yoqilmaydi.
+                stream_upload = (settings.UPLOAD_STREAM_FROM_ZIP and not settings.SALESWORK_INCREMENTAL
+                                 and not settings.UPLOAD_SKIP_UNCHANGED)
+                if settings.UPLOAD_STREAM_FROM_ZIP and not stream_upload:
+                    custom_log("⚠️ Потоковая отправка из ZIP несовместима с инкрементальным режимом "
+                               "и манифестом, файлы будут распакованы на диск.", level="warning")
+
+                # Ochish va transformatsiya bitta oqimda: XML diskka bir marta, o'zgartirilgan holda yoziladi.
+                # Inkremental rejimda ombor xom qatorlarni saqlaydi, shuning uchun u yerda alohida bosqich qoladi.
+                fused_transform = (settings.ENABLE_XML_TRANSFORMATION
+                                   and (settings.XML_TRANSFORM_ON_EXTRACT or stream_upload)
+                                   and not settings.SALESWORK_INCREMENTAL)
+                file_handler.reset_stats()
+
+                def fetch_template(t_id):
+                    """Bitta shablonni yuklab oladi va ZIP manbasini (bytes yoki fayl yo'li) qaytaradi."""
+                    fetch_begin = period_begin
+                    if settings.SALESWORK_INCREMENTAL:
+                        # Ombor to'liq bo'lsa, faqat oxirgi kunlar so'raladi
+                        fetch_begin = saleswork_store.get_fetch_begin(t_id, period_begin, period_end)
+                    fetch_periods[t_id] = fetch_begin
+
+                    custom_log(f"📥 Скачивание шаблона ID: {t_id} (с {fetch_begin.strftime('%d.%m.%Y')})...")
+
+                    def download_range(begin_date, end_date):
+                        if settings.SALESWORK_DOWNLOAD_TO_DISK:
+                            # Katta arxivlar uchun: oqim to'g'ridan-to'g'ri backup faylga yoziladi
+                            backup_path = file_handler.new_backup_zip_path()
+                            session_backup_files.append(backup_path)
+                            return smartup_client.download_sales_report_to_file(
+                                template_id=t_id, file_path=backup_path,
+                                begin_date=begin_date, end_date=end_date
+                            )
+
+                        zip_content = smartup_client.download_sales_report(
+                            template_id=t_id, begin_date=begin_date, end_date=end_date
+                        )
                         backup_path = file_handler.save_zip_to_backup(zip_content)
                         session_backup_files.append(backup_path)
+                        return zip_content
+
+                    sub_ranges = split_date_range(fetch_begin, period_end, settings.SALESWORK_SPLIT_PARTS)
+                    if len(sub_ranges) == 1:
+                        return download_range(fetch_begin, period_end)
+
+                    # Uzun davr bir nechta qisqa so'rovlarga bo'linadi va parallel yuklanadi;
+                    # natija ro'yxat ko'rinishida qaytadi va keyin birlashtiriladi
+                    custom_log(f"✂️ Шаблон {t_id}: период разбит на {len(sub_ranges)} частей.")
+                    with ThreadPoolExecutor(max_workers=len(sub_ranges)) as range_pool:
+                        range_futures = [range_pool.submit(download_range, b, e) for b, e in sub_ranges]
+                        return [f.result() for f in range_futures]
+
+                workers = max(1, min(settings.SALESWORK_DOWNLOAD_WORKERS, len(template_ids)))
+                executor = None
+                if workers > 1:
+                    # Shablonlar parallel yuklanadi; umumiy vaqt eng sekin shablonga teng bo'ladi.
+                    # Server yuklamasi SmartupClient ichidagi host limiti bilan cheklanadi.
+                    custom_log(f"⚡ Параллельная загрузка шаблонов: {workers} потоков")
+                    executor = ThreadPoolExecutor(max_workers=workers)
+                    futures = {t_id: executor.submit(fetch_template, t_id) for t_id in template_ids}
 
-                        extracted = file_handler.extract_zip(zip_content)
-                        if extracted:
-                            saleswork_files.extend(extracted)
-                            custom_log(f"✅ Шаблон {t_id}: получено {len(extracted)} XML файлов.")
-                        else:
-                            custom_log(f"⚠️ Шаблон {t_id}: XML файлы не найдены.", level="warning")
-                    except Exception as e:
-                        custom_log(f"❌ Ошибка с шаблоном {t_id}: {e}", level="error")
+                try:
+                    # Extract natijalari shablonlar tartibida (ketma-ket) qayta ishlanadi
+                    for t_id in template_ids:
+                        try:
+                            if executor:
+                                zip_source = futures[t_id].result()
+                            else:
+                                zip_source = fetch_template(t_id)
+
+                            if stream_upload and not isinstance(zip_source, list):
+                                # Bo'laklarga ajratilgan davr (ro'yxat) birlashtirilishi kerak - u diskka ochiladi
+                                extracted = file_handler.zip_upload_sources(
+                                    zip_source, transformer=xml_transformer if fused_transform else None
+                                )
+                            elif isinstance(zip_source, list) and fused_transform:
+                                extracted = extract_and_merge(zip_source, file_handler, transformer=xml_transformer)
+                            elif isinstance(zip_source, list):
+                                extracted = extract_and_merge(zip_source, file_handler)
+                            elif fused_transform:
+                                extracted = file_handler.extract_zip(zip_source, transformer=xml_transformer)
+                            else:
+                                extracted = file_handler.extract_zip(zip_source)
+                            if extracted and settings.SALESWORK_INCREMENTAL:
+                                saleswork_store.ingest(t_id, extracted, fetch_periods[t_id], period_end,
+                                                      period_begin=period_begin)
+                                rebuilt = saleswork_store.rebuild(t_id, extracted, period_begin, period_end)
+                                custom_log(f"🧩 Шаблон {t_id}: {len(rebuilt)} файлов собрано из локального хранилища.")
+
+                            if extracted:
+                                saleswork_files.extend(extracted)
+                                custom_log(f"✅ Шаблон {t_id}: получено {len(extracted)} XML файлов.")
+                            else:
+                                custom_log(f"⚠️ Шаблон {t_id}: XML файлы не найдены.", level="warning")
+                        except Exception as e:
+                            custom_log(f"❌ Ошибка с шаблоном {t_id}: {e}", level="error")
+                finally:
+                    if executor:
+                        executor.shutdown(wait=True)
 
                 # B. Transformatsiya va Serverga yuklash
                 if saleswork_files:
-                    saleswork_files = list(set(saleswork_files))
-
-                    if settings.ENABLE_XML_TRANSFORMATION:
-                        custom_log("🔄 Начало: XML Трансформация (замена AREA_ID)...")
-                        for xml_file in saleswork_files:
-                            if os.path.basename(xml_file).lower() == "outlets.xml":
-                                try:
-                                    if xml_transformer.process_outlets(xml_file):
-                                        custom_log(f"✅ AREA_ID обновлен: {os.path.basename(xml_file)}")
-                                except Exception as trans_error:
-                                    custom_log(f"⚠️ Ошибка трансформации: {trans_error}", level="warning")
+                    if stream_upload:
+                        # Bir xil nomli fayllardan oxirgisi qoladi (temp_extract dagi qayta yozish kabi)
+                        saleswork_files = list({upload_name(f): f for f in saleswork_files}.values())
+                    else:
+                        saleswork_files = list(set(saleswork_files))
+
+                    if stream_upload and fused_transform:
+                        custom_log("🔄 XML Трансформация выполняется при отправке (потоково).")
+                    elif fused_transform:
+                        custom_log("🔄 XML Трансформация выполнена при распаковке.")
+                        log_transform_hits()
+                    elif settings.ENABLE_XML_TRANSFORMATION:
+                        if xml_transformer.rules:
+                            transform_targets = saleswork_files
+                            custom_log(f"🔄 Начало: XML Трансформация (правил: {len(xml_transformer.rules)})...")
+                        else:
+                            transform_targets = [f for f in saleswork_files if os.path.basename(f).lower() == "outlets.xml"]
+                            custom_log("🔄 Начало: XML Трансформация (замена AREA_ID)...")
+
+                        transform_started = time.perf_counter()
+                        transform_results = []
+                        for result in xml_transformer.transform_files(transform_targets, settings.XML_TRANSFORM_WORKERS):
+                            file_name = os.path.basename(result["file"])
+                            file_handler.add_stats(transform_disk_read=result["bytes_read"],
+                                                   disk_written=result["bytes_written"])
+                            if result["error"]:
+                                custom_log(f"⚠️ Ошибка трансформации {file_name}: {result['error']}", level="warning")
+                                continue
+                            transform_results.append((file_name, result["hits"]))
+                            if result["hits"] and result["changed"]:
+                                details = ", ".join(f"{name}: {count}" for name, count in result["hits"].items())
+                                custom_log(f"✅ {file_name} обновлен ({details}) за {result['seconds']:.2f} с")
+                            elif result["changed"]:
+                                custom_log(f"✅ AREA_ID обновлен: {file_name} (за {result['seconds']:.2f} с)")
+                        log_rule_totals(transform_results)
+                        if transform_targets:
+                            custom_log(f"⏱️ Трансформация {len(transform_targets)} файлов: "
+                                       f"{time.perf_counter() - transform_started:.2f} с.")
+
+                    custom_log(f"📊 Байты по этапам: {file_handler.stats_summary()}")
 
                     protocol = getattr(settings, "PROTOCOL", "SFTP")
-                    custom_log(f"📤 Отправка Saleswork на сервер ({protocol})...")
 
-                    if protocol == "FTP":
-                        success = ftp_manager.upload_files(saleswork_files)
+                    # O'zgarmagan fayllarni (oldingi yuklash bilan bir xil xesh) qayta yubormaymiz
+                    files_to_upload = saleswork_files
+                    upload_hashes = {}
+                    if settings.UPLOAD_SKIP_UNCHANGED:
+                        destination = f"{protocol}://{settings.SFTP_SERVER}:{settings.SFTP_PORT}{settings.SFTP_REMOTE_PATH}"
+                        files_to_upload, skipped_files, upload_hashes = upload_manifest.filter_changed(
+                            settings.COMPANY_NAME, destination, saleswork_files, force=force
+                        )
+                        force_note = " (принудительно: --force)" if force else ""
+                        custom_log(f"🧾 Манифест: к отправке {len(files_to_upload)}, "
+                                   f"пропущено без изменений {len(skipped_files)}{force_note}.")
+
+                    if not files_to_upload:
+                        custom_log("✅ Все файлы Saleswork не изменились, отправка не требуется.")
                     else:
-                        success = sftp_manager.upload_files(saleswork_files)
+                        custom_log(f"📤 Отправка Saleswork на сервер ({protocol})...")
 
-                    if not success:
-                        raise SFTPError(f"Ошибка при загрузке файлов Saleswork на сервер ({protocol}).")
-                    else:
-                        custom_log("✅ Файлы Saleswork успешно загружены на сервер.")
+                        if protocol == "FTP":
+                            success = ftp_manager.upload_files(files_to_upload)
+                        else:
+                            success = sftp_manager.upload_files(files_to_upload)
+
+                        if not success:
+                            raise SFTPError(f"Ошибка при загрузке файлов Saleswork на сервер ({protocol}).")
+                        else:
+                            custom_log("✅ Файлы Saleswork успешно загружены на сервер.")
+                            if stream_upload and fused_transform:
+                                # Potokli rejimda qoidalar fayl yuborilayotganda qo'llanadi
+                                log_transform_hits()
+
+                        if upload_hashes:
+                            upload_manifest.record(
+                                settings.COMPANY_NAME, destination,
+                                {path: upload_hashes[path] for path in files_to_upload}
+                            )
 
         # =====================================================================
         # 2-QISM: MONOLIT (20:00 da ishlaydi, BALTIKA API'ga yuboradi)
         # =====================================================================
         if job_type in ["all", "monolit"]:
+            # Oldingi ishga tushirishlarda yuborilmay qolgan hisobotlar (navbatdan, yangi hisobotlardan oldin)
+            if settings.BALTIKA_OUTBOX_ENABLED:
+                drained, drain_failed = baltika_outbox.drain(baltika_client.send_xml_file)
+                if drained or drain_failed:
+                    custom_log(f"📮 Очередь Baltika: отправлено {drained}, ошибок {drain_failed}.",
+                               level="warning" if drain_failed else "info")
+
             if getattr(settings, "ENABLE_MONOLIT_REPORT", False):
                 monolit_types = settings.get_monolit_report_types
                 if monolit_types:
@@ -121,6 +294,10 @@ def run_integration(job_type="all"):
                                 custom_log(f"✅ Отчет Monolit ({rep_type}) успешно отправлен через API.")
                             else:
                                 custom_log(f"❌ Ошибка отправки Monolit ({rep_type}) через API.", level="error")
+                                if settings.BALTIKA_OUTBOX_ENABLED:
+                                    # Backup sessiya oxirida o'chiriladi - XML navbatga alohida yoziladi
+                                    baltika_outbox.enqueue(rep_type, monolit_content, error="Отправка не удалась")
+                                    custom_log(f"📮 Отчет Monolit ({rep_type}) будет отправлен повторно из очереди.")
 
                         except Exception as e:
                             custom_log(f"❌ Ошибка с Monolit отчетом {rep_type}: {e}", level="error")
@@ -150,6 +327,13 @@ def run_integration(job_type="all"):
         sys.exit(1)
 
     finally:
+        # HTTP ulanishlar qayta ishlatilishi statistikasi (faqat logga)
+        for client in (smartup_client, baltika_client):
+            try:
+                client.log_connection_stats()
+            except Exception:
+                pass
+
         custom_log("🧹 Выполняется очистка...")
         file_handler.cleanup_temp()
 
@@ -165,8 +349,22 @@ def run_integration(job_type="all"):
         custom_log("Процесс завершен.")
 
 if __name__ == "__main__":
-    current_job = "all"
-    if len(sys.argv) > 1:
-        current_job = sys.argv[1].lower()
+    # --force: manifestga qaramasdan barcha fayllarni qayta yuborish
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    force_upload = "--force" in sys.argv[1:]
 
-    run_integration(job_type=current_job)
\ No newline at end of file
+    current_job = "all"
+    if args:
+        current_job = args[0].lower()
+
+    if current_job == "drain-outbox":
+        # Navbatdagi Baltika hisobotlarini qayta yuborish (--force: kutish vaqtiga qaramaslik)
+        baltika_outbox.drain(baltika_client.send_xml_file, force=force_upload)
+    elif current_job == "calibrate":
+        # SSH transport profillarini sinab, eng tezini shu klient uchun saqlash
+        if settings.PROTOCOL.upper() == "SFTP":
+            sftp_manager.calibrate()
+        else:
+            logger.warning(f"Калибровка доступна только для SFTP (протокол: {settings.PROTOCOL}).")
+    else:
+        run_integration(job_type=current_job, force=force_upload)
\ No newline at end of file
@@ -17,7 +17,7 @@ def log(message):
     print(f"[{datetime.now().strftime('%H:%M:%S')}] [MANAGER] {message}")
 
 
-def run_client(client, job_type):
+def run_client(client, job_type, extra_args=None):
     name = client["name"]
     env_file = client["env_file"]
 
@@ -35,7 +35,7 @@ def run_client(client, job_type):
     try:
         # ASOSIY O'ZGARISH: main.py ga job_type ni yuboramiz (masalan: main.py saleswork)
         result = subprocess.run(
-            [sys.executable, "main.py", job_type],
+            [sys.executable, "main.py", job_type] + (extra_args or []),
             env=env,
             check=True,
             text=True
@@ -49,9 +49,13 @@ def run_client(client, job_type):
 
 def main():
     # Terminaldan kelgan buyruqni o'qiymiz (saleswork, monolit yoki all)
+    # "--" bilan boshlanadigan bayroqlar (masalan --force) main.py ga o'tkaziladi
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    extra_args = [a for a in sys.argv[1:] if a.startswith("--")]
+
     job_type = "all"
-    if len(sys.argv) > 1:
-        job_type = sys.argv[1].lower()
+    if args:
+        job_type = args[0].lower()
     log(f"=== ЗАПУСК ИНТЕГРАЦИИ ({job_type.upper()}) ===")
 
     for client in CLIENTS:
@@ -61,7 +65,7 @@ def main():
             log(f"⏭️ Пропуск {client['name']} (не имеет Monolit отчетов)")
             continue
 
-        run_client(client, job_type)
+        run_client(client, job_type, extra_args)
         log("-" * 40)
 
     log("=== ВСЕ ЗАДАЧИ ЗАВЕРШЕНЫ ===")
@@ -1,12 +1,97 @@
+import io
+import os
 import requests
+from typing import BinaryIO, Iterator, Union
+from urllib.parse import quote_plus
 from core.config import settings
 from core.logger import logger
+from services.http_session import create_session, log_pool_stats
+
+# application/x-www-form-urlencoded jadvali: requests (urlencode -> quote_plus) bilan bir xil.
+# Xavfsiz belgilar o'zicha, probel "+", qolgan har bir bayt "%XX" (katta harflar bilan).
+# Har bir bayt uchta translate() jadvali orqali 3 baytga yoyiladi (bayt/"%", 1-hex, 2-hex),
+# ortiqcha to'ldiruvchi \x00 lar o'chiriladi - hammasi C darajasida, Python sikli yo'q.
+_FORM_SAFE = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_.-~"
+_FORM_SINGLE = _FORM_SAFE + b" "  # Kodlangandan keyin ham 1 bayt bo'lib qoladiganlar
+_HEX = b"0123456789ABCDEF"
+_FORM_LEAD = bytes(b if b in _FORM_SAFE else (0x2B if b == 0x20 else 0x25) for b in range(256))
+_FORM_HIGH = bytes(0 if b in _FORM_SINGLE else _HEX[b >> 4] for b in range(256))
+_FORM_LOW = bytes(0 if b in _FORM_SINGLE else _HEX[b & 0x0F] for b in range(256))
+
+
+def form_encode(chunk: bytes) -> bytes:
+    """Baytlarni quote_plus() natijasi bilan bir xil ko'rinishga kodlaydi."""
+    out = bytearray(3 * len(chunk))
+    out[0::3] = chunk.translate(_FORM_LEAD)
+    out[1::3] = chunk.translate(_FORM_HIGH)
+    out[2::3] = chunk.translate(_FORM_LOW)
+    return bytes(out.translate(None, b"\x00"))
+
+
+class FormEncodedBody:
+    """
+    `data={field: xml}` so'rov tanasini XML ni to'liq str ga o'girmasdan, bo'laklab hosil qiladi.
+    Manba - bytes/str yoki o'qiladigan fayl-obyekt (seek qo'llashi shart: hajm oldindan hisoblanadi).
+    len() Content-Length uchun, read()/iteratsiya - urllib3 uchun. Tarmoqqa chiqadigan baytlar
+    `requests.post(data={field: xml_text})` bilan aynan bir xil.
+    """
+
+    def __init__(self, field: str, source: Union[bytes, str, BinaryIO], chunk_size: int = 1024 * 1024):
+        if isinstance(source, str):
+            source = source.encode('utf-8')
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        self.chunk_size = chunk_size
+        self._source = source
+        self._start = source.tell()
+        self._buffer = quote_plus(field).encode('ascii') + b"="
+        self._pos = 0
+        self._length = len(self._buffer) + self._encoded_length()
+        source.seek(self._start)
+
+    def _chunks(self) -> Iterator[bytes]:
+        return iter(lambda: self._source.read(self.chunk_size), b"")
+
+    def _encoded_length(self) -> int:
+        # Har bir "xavfli" bayt 3 ga (%XX) aylanadi; translate() ularni C tezligida sanaydi
+        return sum(len(chunk) + 2 * len(chunk.translate(None, _FORM_SINGLE)) for chunk in self._chunks())
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            data = self._buffer[self._pos:] + b"".join(map(form_encode, self._chunks()))
+            self._buffer, self._pos = b"", 0
+            return data
+
+        while len(self._buffer) - self._pos < size:
+            chunk = self._source.read(self.chunk_size)
+            if not chunk:
+                break
+            self._buffer = self._buffer[self._pos:] + form_encode(chunk)
+            self._pos = 0
+
+        data = self._buffer[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                return
+            yield data
 
 
 class BaltikaClient:
     def __init__(self):
         # API manzili config.py (va .env) orqali olinadi
         self.url = settings.BALTIKA_API_URL
+        self.session = create_session()
+
+    def log_connection_stats(self):
+        log_pool_stats(self.session, "Baltika")
 
     def send_xml(self, xml_content: bytes, report_type: str) -> bool:
         """
@@ -16,6 +101,10 @@ class BaltikaClient:
             logger.error("❌ Ошибка: В .env файле не указан BALTIKA_API_URL!")
             return False
 
+        if getattr(settings, "BALTIKA_STREAMING_UPLOAD", False):
+            # Oqimli rejim: XML str ga o'girilmaydi, tana bo'laklab kodlanadi
+            return self._post(FormEncodedBody("XMLData", xml_content), report_type)
+
         # XML baytlarini matnga o'giramiz
         try:
             xml_text = xml_content.decode('utf-8')
@@ -28,12 +117,31 @@ class BaltikaClient:
         payload = {
             "XMLData": xml_text
         }
+        return self._post(payload, report_type)
+
+    def send_xml_file(self, file_path: str, report_type: str) -> bool:
+        """Diskdagi XML faylni xotiraga to'liq o'qimasdan (oqim bilan) Baltika API'siga yuboradi."""
+        if not self.url:
+            logger.error("❌ Ошибка: В .env файле не указан BALTIKA_API_URL!")
+            return False
+        try:
+            with open(file_path, 'rb') as f:
+                return self._post(FormEncodedBody("XMLData", f), report_type)
+        except OSError as e:
+            logger.error(f"❌ Не удалось прочитать файл {os.path.basename(file_path)}: {e}")
+            return False
+
+    def _post(self, payload, report_type: str) -> bool:
+        headers = None
+        if isinstance(payload, FormEncodedBody):
+            # Lug'at emas, oqim berilganda requests Content-Type qo'ymaydi - o'zimiz qo'yamiz
+            headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
         try:
             logger.info(f"📤 Отправка файла ({report_type}) на сервер Baltika (API)...")
 
             # Timeoutni 120 soniya qilamiz (katta hajmdagi fayllar va server javobi uchun)
-            response = requests.post(self.url, data=payload, timeout=120)
+            response = self.session.post(self.url, data=payload, headers=headers, timeout=120)
 
             if response.status_code == 200:
                 # Javobning faqat bosh qismini logga yozamiz (ekranni to'ldirib yubormasligi uchun)
@@ -52,4 +160,4 @@ class BaltikaClient:
 
 
 # Boshqa fayllardan chaqirish uchun tayyor obyekt
-baltika_client = BaltikaClient()
\ No newline at end of file
+baltika_client = BaltikaClient()
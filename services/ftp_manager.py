@@ -1,8 +1,15 @@
 import os
-from ftplib import FTP
-from typing import List
+import time
+import uuid
+import threading
+from ftplib import FTP, all_errors, error_perm
+from queue import Empty, Queue
+from typing import Dict, List, Optional, Set, Union
 from core.config import settings
 from core.logger import logger
+from core.exceptions import StreamTransformError
+from utils.upload_manifest import staged_base_name, staged_file_name
+from utils.upload_source import UploadSource, upload_name, upload_size
 
 
 class FTPManager:
@@ -12,59 +19,314 @@ class FTPManager:
         self.username = settings.SFTP_USERNAME
         self.password = settings.SFTP_PASSWORD
         self.remote_path = settings.SFTP_REMOTE_PATH
+        # Server REST (davom ettirish) buyrug'ini qo'llaydimi (None - hali noma'lum)
+        self.rest_supported: Optional[bool] = None
 
-    def upload_files(self, file_paths: List[str]) -> bool:
+    def _open_connection(self) -> FTP:
+        """Ulanadi, login qiladi va ish papkasiga o'tadi (passiv rejim sozlamalari - Settings dan)."""
+        ftp = FTP()
+        try:
+            ftp.connect(self.host, self.port, timeout=30)
+            ftp.login(self.username, self.password)
+        except Exception:
+            ftp.close()
+            raise
+        ftp.set_pasv(settings.FTP_PASSIVE)
+        ftp.trust_server_pasv_ipv4_address = settings.FTP_TRUST_PASV_ADDRESS
+
+        if self.remote_path:
+            try:
+                ftp.cwd(self.remote_path)
+            except Exception:
+                logger.warning(f"Не удалось перейти в каталог: {self.remote_path}, загрузка будет выполнена в корневую папку.")
+
+        ftp.voidcmd('TYPE I')  # SIZE buyrug'i binar rejimda aniq bayt sonini qaytaradi
+        return ftp
+
+    @staticmethod
+    def _close_connection(ftp: FTP):
+        try:
+            ftp.quit()
+        except Exception:
+            try:
+                ftp.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _remote_size(ftp: FTP, name: str) -> Optional[int]:
+        try:
+            return ftp.size(name)
+        except error_perm:
+            return None
+
+    @staticmethod
+    def _unsupported(error: error_perm) -> bool:
+        """Server buyruqni tanimaydi / qo'llamaydi (500-504), ya'ni bu fayl bilan bog'liq xato emas."""
+        return str(error)[:3] in ("500", "501", "502", "504")
+
+    @staticmethod
+    def _progress(written: Dict, local_path: Union[str, UploadSource], position: int):
         """
-        Fayllarni FTP serverga yuklash.
+        storbinary callback: fayl bo'yicha shu ishga tushirishda yuborilgan baytlarni written ga yozadi.
+        Birinchi blok yuborilgan bo'lsa, STOR qabul qilingan - yakuniy nomdagi fayl endi bizniki.
         """
-        if not file_paths:
-            return False
+        def callback(block: bytes):
+            nonlocal position
+            position += len(block)
+            written[local_path] = position
+        return callback
 
-        ftp = FTP()
+    def _store(self, ftp: FTP, local_path: Union[str, UploadSource], target_name: str, offset: int = 0,
+               written: Dict = None):
+        """
+        Bitta faylni (yoki oqim manbasini) STOR qiladi.
+        Oqim manbasi transformatsiya xatosi bersa, serverda qolgan qisman fayl o'chiriladi.
+        """
         try:
-            logger.info(f"Подключение к FTP-серверу: {self.host}:{self.port}")
+            self._transfer(ftp, local_path, target_name, offset, {} if written is None else written)
+        except StreamTransformError:
+            try:
+                ftp.voidresp()  # Uzilgan STOR ning javobi
+            except all_errors:
+                pass
+            try:
+                ftp.delete(target_name)
+            except all_errors:
+                pass
+            raise
 
-            # 1. Ulanish
-            ftp.connect(self.host, self.port, timeout=30)
-            ftp.login(self.username, self.password)
-            logger.info("Авторизация FTP успешна.")
+    def _transfer(self, ftp: FTP, local_path: Union[str, UploadSource], target_name: str, offset: int,
+                  written: Dict):
+        """
+        offset > 0 bo'lsa - serverdagi qisman fayl REST+STOR bilan, server REST ni qo'llamasa APPE bilan
+        davom ettiriladi; ikkalasi ham bo'lmasa fayl boshidan yuboriladi.
+        """
+        filename = upload_name(local_path)
+        is_stream = isinstance(local_path, UploadSource)
+        with (local_path.open() if is_stream else open(local_path, 'rb')) as f:
+            if offset and self.rest_supported is not False:
+                logger.info(f"Продолжение загрузки {filename} с позиции {offset} байт (REST).")
+                f.seek(offset)
+                try:
+                    ftp.storbinary(f'STOR {target_name}', f, blocksize=settings.FTP_BLOCK_SIZE,
+                                   callback=self._progress(written, local_path, offset), rest=offset)
+                    self.rest_supported = True
+                    logger.info(f"✅ Загружен: {filename}")
+                    return
+                except error_perm as e:
+                    if not self._unsupported(e):
+                        raise
+                    logger.info(f"Сервер не поддерживает REST ({e}), используется APPE.")
+                    self.rest_supported = False
 
-            # 2. Papkaga kirish
-            if self.remote_path:
+            if offset:
+                logger.info(f"Продолжение загрузки {filename} с позиции {offset} байт (APPE).")
+                f.seek(offset)
                 try:
-                    ftp.cwd(self.remote_path)
-                except Exception:
-                    logger.warning(f"Не удалось перейти в каталог: {self.remote_path}, загрузка будет выполнена в корневую папку.")
+                    ftp.storbinary(f'APPE {target_name}', f, blocksize=settings.FTP_BLOCK_SIZE,
+                                   callback=self._progress(written, local_path, offset))
+                    logger.info(f"✅ Загружен: {filename}")
+                    return
+                except error_perm as e:
+                    if not self._unsupported(e):
+                        raise
+                    logger.info(f"Сервер не поддерживает APPE ({e}), файл будет отправлен заново.")
+                f.seek(0)
 
-            # 3. Fayllarni yuklash
-            uploaded_count = 0
-            for local_path in file_paths:
-                filename = os.path.basename(local_path)
-                logger.info(f"Загрузка через FTP: {filename}")
+            logger.info(f"Загрузка через FTP: {filename}")
+            # 'STOR filename' komandasi bilan yuklaymiz
+            ftp.storbinary(f'STOR {target_name}', f, blocksize=settings.FTP_BLOCK_SIZE,
+                           callback=self._progress(written, local_path, 0))
 
-                with open(local_path, 'rb') as f:
-                    # 'STOR filename' komandasi bilan yuklaymiz
-                    ftp.storbinary(f'STOR {filename}', f)
+        logger.info(f"✅ Загружен: {filename}")
 
-                logger.info(f"✅ Загружен: {filename}")
-                uploaded_count += 1
+    def _send_file(self, ftp: FTP, local_path: Union[str, UploadSource], target_name: str,
+                   written: Dict, confirmed: Set):
+        """
+        Faylni yuboradi va tasdiqlanganlar ro'yxatiga qo'shadi.
+        Oldingi urinishda serverga yozish boshlangan fayl (written da bor) avval SIZE bilan tekshiriladi:
+        to'liq bo'lsa - qayta yuborilmaydi, qisman bo'lsa - qolgan qismi yuboriladi. STOR gacha yetmagan
+        fayllar boshidan yuboriladi - yakuniy nomdagi fayl oldingi ishga tushirishniki bo'lishi mumkin. Atomar rejimda vaqtinchalik nomda kontent xeshi bor,
+        shuning uchun oldingi ishga tushirishdan qolgan fayl ham tekshiriladi.
+        Oqim manbalari (UploadSource) har doim boshidan yuboriladi.
+        """
+        offset = 0
+        if not isinstance(local_path, UploadSource) and (local_path in written or settings.UPLOAD_ATOMIC):
+            remote_size = self._remote_size(ftp, target_name)
+            local_size = os.path.getsize(local_path)
+            if remote_size == local_size:
+                logger.info(f"✅ {upload_name(local_path)} уже полностью на сервере, повторная отправка не нужна.")
+                confirmed.add(local_path)
+                return
+            if remote_size and remote_size < local_size:
+                offset = remote_size
 
-            # 4. Ulanishni yopish
-            ftp.quit()
+        self._store(ftp, local_path, target_name, offset, written)
+        confirmed.add(local_path)
 
-            if uploaded_count == len(file_paths):
-                logger.info(f"SUCCESS: Все {uploaded_count} файлов отправлены на FTP.")
-                return True
-            return False
+    def _store_parallel(self, connections: List[FTP], file_paths: List[Union[str, UploadSource]],
+                        targets: Dict, written: Dict, confirmed: Set):
+        """
+        Fayllarni bir nechta FTP ulanish orqali parallel yuklaydi (umumiy navbat, eng kattasi birinchi).
+        Bitta fayl xato bersa, qolgan ishchilar to'xtaydi va xato yuqoriga ko'tariladi (hammasi yoki hech narsa).
+        """
+        logger.info(f"⚡ Параллельная отправка: {len(connections)} соединений FTP.")
+        pending = Queue()
+        for local_path in sorted(file_paths, key=upload_size, reverse=True):
+            pending.put(local_path)
+
+        errors = []
+
+        def worker(ftp):
+            while not errors:
+                try:
+                    local_path = pending.get_nowait()
+                except Empty:
+                    return
+                try:
+                    self._send_file(ftp, local_path, targets[local_path], written, confirmed)
+                except Exception as e:
+                    errors.append(e)
+                    return
+
+        threads = [threading.Thread(target=worker, args=(ftp,), daemon=True) for ftp in connections]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
 
-        except Exception as e:
-            logger.error(f"Ошибка FTP: {e}")
+    def _publish(self, ftp: FTP, staged: List[tuple], published: Set[str]):
+        """
+        Atomar rejim: vaqtinchalik nomlar asl nomlarga o'zgartiriladi (RNFR/RNTO).
+        Server mavjud faylni almashtirishga ruxsat bermasa, eski fayl o'chirilib, keyin nomlanadi.
+        Qayta urinishda allaqachon nomlangan fayllarga tegilmaydi.
+        """
+        renamed = 0
+        for temp_name, filename in staged:
+            if temp_name in published:
+                continue
             try:
-                ftp.close()
-            except:
-                pass
+                ftp.rename(temp_name, filename)
+            except error_perm:
+                try:
+                    ftp.delete(filename)
+                except error_perm:
+                    pass
+                ftp.rename(temp_name, filename)
+            published.add(temp_name)
+            renamed += 1
+        logger.info(f"📦 Опубликовано (переименовано) файлов: {renamed}.")
+
+    @staticmethod
+    def _remove_stale_staged(ftp: FTP, staged: List[tuple]):
+        """
+        Oldingi ishga tushirishlardan qolgan vaqtinchalik fayllarni (NLST) o'chiradi.
+        Joriy yuklashning vaqtinchalik nomlariga tegilmaydi.
+        """
+        current = {temp_name for temp_name, _ in staged}
+        names = {filename for _, filename in staged}
+        try:
+            entries = ftp.nlst()
+        except all_errors:
+            return
+        for entry in entries:
+            entry = entry.rsplit('/', 1)[-1]  # Ba'zi serverlar to'liq yo'l qaytaradi
+            if entry not in current and staged_base_name(entry) in names:
+                try:
+                    ftp.delete(entry)
+                    logger.info(f"🧹 Удален устаревший временный файл: {entry}")
+                except all_errors:
+                    pass
+
+    def upload_files(self, file_paths: List[Union[str, UploadSource]]) -> bool:
+        """
+        Fayllarni FTP serverga yuklash.
+        UploadSource manbalari diskka yozilmasdan, oqimdan to'g'ridan-to'g'ri STOR qilinadi.
+        FTP_PARALLEL_CONNECTIONS > 1 bo'lsa fayllar bir nechta ulanish orqali parallel yuboriladi.
+        Xato bo'lsa qayta ulanib, faqat tasdiqlanmagan fayllar yuboriladi (uzilgan fayl - davomidan).
+        """
+        if not file_paths:
             return False
 
+        # Serverdagi nomlar (atomar rejimda - vaqtinchalik); urinishlar orasida o'zgarmaydi
+        targets = {}
+        staged = []
+        run_token = uuid.uuid4().hex[:16]
+        for local_path in file_paths:
+            filename = upload_name(local_path)
+            targets[local_path] = filename
+            if settings.UPLOAD_ATOMIC:
+                # Oqim manbasining kontent xeshi oldindan noma'lum - nom shu ishga tushirish uchun noyob
+                targets[local_path] = (f"{filename}.{run_token}{settings.UPLOAD_TEMP_SUFFIX}"
+                                       if isinstance(local_path, UploadSource) else staged_file_name(local_path))
+                staged.append((targets[local_path], filename))
+
+        attempt = 0
+        max_attempts = 3
+        # Urinishlar orasida saqlanadi: qayta urinishda faqat tasdiqlanmagan fayllar yuboriladi
+        written: Dict = {}  # Shu ishga tushirishda serverga yuborilgan baytlar (fayl bo'yicha)
+        confirmed: Set = set()
+        published: Set[str] = set()
+        self.rest_supported = None
+
+        while attempt < max_attempts:
+            ftp = None
+            extra_connections: List[FTP] = []
+            try:
+                logger.info(f"Подключение к FTP-серверу: {self.host}:{self.port}")
+
+                # 1. Ulanish va papkaga kirish
+                ftp = self._open_connection()
+                logger.info("Авторизация FTP успешна.")
+
+                remaining = [p for p in file_paths if p not in confirmed]
+                if confirmed:
+                    logger.info(f"Подтверждено на сервере: {len(confirmed)} из {len(file_paths)} файлов, "
+                                f"отправляются оставшиеся {len(remaining)}.")
+
+                # 2. Yuklash (bitta yoki bir nechta ulanish orqali)
+                connections = max(1, min(settings.FTP_PARALLEL_CONNECTIONS, len(remaining)))
+                if connections > 1:
+                    extra_connections = [self._open_connection() for _ in range(connections - 1)]
+                    self._store_parallel([ftp] + extra_connections, remaining, targets, written, confirmed)
+                else:
+                    for local_path in remaining:
+                        self._send_file(ftp, local_path, targets[local_path], written, confirmed)
+
+                if staged:
+                    self._remove_stale_staged(ftp, staged)
+                    self._publish(ftp, staged, published)
+
+                # 3. Ulanishni yopish
+                ftp.quit()
+                logger.info(f"SUCCESS: Все {len(confirmed)} файлов отправлены на FTP.")
+                return True
+
+            except all_errors as e:
+                attempt += 1
+                logger.warning(f"Ошибка FTP (Попытка {attempt}/{max_attempts}): {e}")
+                if ftp is not None:
+                    ftp.close()
+                if attempt < max_attempts:
+                    time.sleep(15)
+
+            except Exception as e:
+                logger.error(f"Ошибка FTP: {e}")
+                if ftp is not None:
+                    ftp.close()
+                return False
+
+            finally:
+                for extra in extra_connections:
+                    self._close_connection(extra)
+
+        logger.error("ERROR: Не удалось загрузить файлы на FTP.")
+        return False
+
 
 # Singleton
-ftp_manager = FTPManager()
\ No newline at end of file
+ftp_manager = FTPManager()
@@ -0,0 +1,70 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from core.config import settings
+from core.logger import logger
+
+
+def create_session() -> requests.Session:
+    """
+    Keep-alive va ulanishlar puliga ega requests.Session yaratadi.
+    Token, hisobot va Baltika so'rovlari bitta TCP+TLS ulanishni qayta ishlatadi.
+    """
+    session = requests.Session()
+
+    # Transport darajasidagi retry faqat ulanish o'rnatish xatolari uchun:
+    # so'rov serverga yetib borgan bo'lsa, POST qayta yuborilmaydi (read/status = 0).
+    retries = Retry(
+        total=settings.HTTP_TRANSPORT_RETRIES,
+        connect=settings.HTTP_TRANSPORT_RETRIES,
+        read=0,
+        status=0,
+        other=0,
+        backoff_factor=settings.HTTP_RETRY_BACKOFF,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings.HTTP_POOL_SIZE,
+        pool_maxsize=settings.HTTP_POOL_SIZE,
+        max_retries=retries,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    if not settings.HTTP_KEEP_ALIVE:
+        session.headers["Connection"] = "close"
+
+    return session
+
+
+def get_pool_stats(session: requests.Session) -> dict:
+    """
+    Sessiya bo'yicha ulanishlar statistikasini qaytaradi:
+    requests - jami so'rovlar, connections - ochilgan yangi ulanishlar, reused - qayta ishlatilganlar.
+    """
+    stats = {"requests": 0, "connections": 0, "reused": 0}
+
+    for adapter in set(session.adapters.values()):
+        pool_manager = getattr(adapter, "poolmanager", None)
+        if pool_manager is None:
+            continue
+        for key in pool_manager.pools.keys():
+            pool = pool_manager.pools.get(key)
+            if pool is None:
+                continue
+            stats["requests"] += pool.num_requests
+            stats["connections"] += pool.num_connections
+
+    stats["reused"] = max(0, stats["requests"] - stats["connections"])
+    return stats
+
+
+def log_pool_stats(session: requests.Session, name: str):
+    """Ulanishlar qayta ishlatilishi statistikasini logga yozadi."""
+    stats = get_pool_stats(session)
+    if not stats["requests"]:
+        return
+    logger.info(
+        f"🔌 HTTP ({name}): запросов {stats['requests']}, новых соединений {stats['connections']}, "
+        f"повторно использовано {stats['reused']}."
+    )
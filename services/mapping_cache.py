@@ -0,0 +1,79 @@
+import os
+import json
+import marshal
+import hashlib
+from typing import Dict
+from core.logger import logger
+
+# Kesh formati o'zgarsa oshiriladi (eski keshlar e'tiborsiz qoldiriladi)
+_CACHE_VERSION = 1
+
+
+class MappingCache:
+    """
+    JSON mapping jadvallarining kompilyatsiya qilingan (marshal) keshi.
+    Manba faylning mtime va hajmi o'zgarmagan bo'lsa JSON qayta parse qilinmaydi.
+    O'zgargan bo'lsa - sha256 solishtiriladi: kontent bir xil bo'lsa faqat belgi yangilanadi.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _cache_path(self, source_path: str) -> str:
+        key = hashlib.sha1(os.path.abspath(source_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    @staticmethod
+    def _parse(raw: bytes) -> Dict[str, str]:
+        return {str(k): str(v) for k, v in json.loads(raw.decode('utf-8')).items()}
+
+    def _read_entry(self, cache_path: str):
+        try:
+            with open(cache_path, 'rb') as f:
+                entry = marshal.load(f)
+            if isinstance(entry, tuple) and len(entry) == 5 and entry[0] == _CACHE_VERSION:
+                return entry
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+        return None
+
+    def _write_entry(self, cache_path: str, entry: tuple):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                marshal.dump(entry, f)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            # Kesh ishlamasa ham transformatsiya to'xtamasligi kerak
+            logger.warning(f"Не удалось сохранить кэш маппинга: {e}")
+
+    def load(self, source_path: str) -> Dict[str, str]:
+        """Manba JSON dan jadvalni qaytaradi (iloji bo'lsa keshdan)."""
+        stat = os.stat(source_path)
+        cache_path = self._cache_path(source_path)
+        entry = self._read_entry(cache_path)
+
+        if entry and entry[1] == stat.st_mtime_ns and entry[2] == stat.st_size:
+            return entry[4]
+
+        with open(source_path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+
+        if entry and entry[3] == digest:
+            mapping = entry[4]
+        else:
+            mapping = self._parse(raw)
+            logger.info(f"Кэш маппинга обновлен: {os.path.basename(source_path)} ({len(mapping)} значений).")
+
+        self._write_entry(cache_path, (_CACHE_VERSION, stat.st_mtime_ns, stat.st_size, digest, mapping))
+        return mapping
+
+
+def load_mapping_file(source_path: str, cache_dir: str = "") -> Dict[str, str]:
+    """JSON mapping faylini o'qiydi; cache_dir berilsa kompilyatsiya qilingan kesh ishlatiladi."""
+    if cache_dir:
+        return MappingCache(cache_dir).load(source_path)
+    with open(source_path, 'rb') as f:
+        return MappingCache._parse(f.read())
@@ -0,0 +1,156 @@
+import os
+import shutil
+import xml.etree.ElementTree as ET
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple, Union
+from core.config import settings
+from core.logger import logger
+from utils.saleswork_store import SalesworkStore
+
+# Farq qiladigan sana atributlaridan eng kichigi olinadiganlari (davr boshi)
+_BEGIN_HINTS = ("BEGIN", "FROM", "START")
+
+
+def split_date_range(begin: datetime, end: datetime, parts: int) -> List[Tuple[datetime, datetime]]:
+    """
+    begin..end (ikkala chegara ham kiradi) oralig'ini kesishmaydigan `parts` ta bo'lakka bo'ladi.
+    Kunlar soni bo'laklar sonidan kam bo'lsa, har bir kun alohida bo'lak bo'ladi.
+    """
+    total_days = (end.date() - begin.date()).days + 1
+    parts = max(1, min(parts, total_days))
+
+    ranges = []
+    start = begin
+    for i in range(parts):
+        # Qoldiq kunlar birinchi bo'laklarga bittadan qo'shiladi
+        days = total_days // parts + (1 if i < total_days % parts else 0)
+        part_end = start + timedelta(days=days - 1)
+        ranges.append((start, part_end))
+        start = part_end + timedelta(days=1)
+    return ranges
+
+
+def _row_key(row: ET.Element) -> tuple:
+    """Qatorning mazmuniga qarab kalit (atributlar tartibi ahamiyatsiz)."""
+    return (
+        row.tag,
+        tuple(sorted(row.attrib.items())),
+        (row.text or "").strip(),
+        b"".join(ET.tostring(child) for child in row),
+    )
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    for fmt in SalesworkStore.DATE_FORMATS:
+        try:
+            return datetime.strptime(value[:10], fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _merge_root_attrs(parts_attrs: List[dict]) -> dict:
+    """
+    Bo'laklar ildiz atributlarini birlashtiradi. Bir xil qiymatlar o'zgarmaydi.
+    Farq qiladigan sanalar butun davrni qoplaydi: BEGIN/FROM/START nomlilarida eng kichigi,
+    qolganlarida eng kattasi olinadi. Boshqa farqlarda oxirgi bo'lak qiymati qoladi.
+    """
+    merged = {}
+    for attrs in parts_attrs:
+        for name, value in attrs.items():
+            if name not in merged or merged[name] == value:
+                merged[name] = value
+                continue
+            old_date, new_date = _parse_date(merged[name]), _parse_date(value)
+            if old_date and new_date:
+                take_min = any(hint in name.upper() for hint in _BEGIN_HINTS)
+                if (new_date < old_date) == take_min and new_date != old_date:
+                    merged[name] = value
+            else:
+                logger.warning(f"Атрибут {name} корня различается в частях, взято последнее значение: {value}")
+                merged[name] = value
+    return merged
+
+
+def merge_xml_files(part_files: List[str], target_path: str, key_attr: str = "",
+                    date_attrs: List[str] = ()) -> int:
+    """
+    Bir xil entity fayllarini (masalan, har bo'lakdagi Outlets.xml) bitta faylga birlashtiradi.
+
+    key_attr berilsa, shu atributi bor va sanasi (date_attrs) yo'q qatorlar ma'lumotnoma
+    hisoblanadi: (teg, kalit) bo'yicha bitta qoladi, oxirgi bo'lakdagi versiyasi bilan
+    (bo'laklar orasida atributlari farq qilsa ham). Qolgan qatorlar mazmuni bo'yicha:
+    har bir qator bo'laklar ichidagi eng ko'p uchragan sonicha qoladi, shunda bitta bo'lak
+    ichidagi haqiqiy takror qatorlar saqlanadi.
+    Ildiz atributlari barcha bo'laklardan yig'iladi (_merge_root_attrs).
+    Qaytadi: natijaviy qatorlar soni.
+    """
+    root_tag = None
+    parts_attrs = []
+    rows = []
+    keyed = {}  # {(teg, kalit): rows dagi indeks}
+    emitted = Counter()
+
+    for part_file in part_files:
+        root = ET.parse(part_file).getroot()
+        root_tag = root_tag or root.tag
+        parts_attrs.append(dict(root.attrib))
+
+        part_counts = Counter()
+        for row in root:
+            key_value = row.get(key_attr) if key_attr else None
+            if key_value is not None and not any(row.get(attr) for attr in date_attrs):
+                entity = (row.tag, key_value)
+                if entity in keyed:
+                    rows[keyed[entity]] = row  # Oxirgi bo'lak versiyasi, birinchi uchragan o'rnida
+                else:
+                    keyed[entity] = len(rows)
+                    rows.append(row)
+                continue
+
+            key = _row_key(row)
+            part_counts[key] += 1
+            if part_counts[key] > emitted[key]:
+                rows.append(row)
+                emitted[key] += 1
+
+    merged_root = ET.Element(root_tag, _merge_root_attrs(parts_attrs))
+    merged_root.extend(rows)
+    ET.ElementTree(merged_root).write(target_path, encoding='utf-8', xml_declaration=True)
+    return len(merged_root)
+
+
+def extract_and_merge(zip_sources: List[Union[bytes, str]], file_handler, transformer=None) -> List[str]:
+    """
+    Har bir bo'lak ZIP ni alohida papkaga ochadi va bir xil nomli XML larni
+    temp_extract dagi bitta faylga birlashtiradi (bitta so'rov natijasi bilan bir xil fayllar to'plami).
+    transformer berilsa, bo'laklar ochilish paytida o'zgartiriladi (file_handler.extract_zip ga uzatiladi).
+    """
+    parts_dir = os.path.join(file_handler.temp_dir, ".parts")
+    part_files = {}  # {nisbiy_yo'l: [bo'lak fayllari]}
+
+    try:
+        for i, zip_source in enumerate(zip_sources):
+            part_dir = os.path.join(parts_dir, str(i))
+            if transformer is not None:
+                extracted = file_handler.extract_zip(zip_source, target_dir=part_dir, transformer=transformer)
+            else:
+                extracted = file_handler.extract_zip(zip_source, target_dir=part_dir)
+            for xml_file in extracted:
+                rel_path = os.path.relpath(xml_file, part_dir)
+                part_files.setdefault(rel_path, []).append(xml_file)
+
+        merged_files = []
+        for rel_path, files in part_files.items():
+            target_path = os.path.normpath(os.path.join(file_handler.temp_dir, rel_path))
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            merge_keys = settings.get_merge_keys
+            key_attr = merge_keys.get(os.path.basename(rel_path).lower(), merge_keys.get("", ""))
+            rows = merge_xml_files(files, target_path, key_attr, settings.get_incremental_date_attrs)
+            merged_files.append(target_path)
+            logger.info(f"Объединено {rel_path}: {len(files)} частей, {rows} строк.")
+
+        return merged_files
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
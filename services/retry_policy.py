@@ -0,0 +1,132 @@
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+from tenacity import retry
+
+from core.config import settings
+from core.exceptions import InvalidZipFileError, SmartupAuthError, SmartupCredentialsError, SmartupHTTPError
+from core.logger import logger
+
+# Xatolik turlari
+TRANSIENT = "transient"  # Vaqtinchalik: kutib qayta urinish mumkin
+AUTH = "auth"            # Token yangilanib, darhol qayta urinish mumkin
+PERMANENT = "permanent"  # Qayta urinishdan foyda yo'q
+FATAL = "fatal"          # Token olinmadi (401 token endpoint'idan): na kutish, na token yangilash yordam beradi
+
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def classify_status(status_code: int) -> str:
+    """HTTP status kodini xatolik turiga ajratadi."""
+    if status_code == 401:
+        return AUTH
+    if status_code in TRANSIENT_STATUS_CODES or status_code >= 500:
+        return TRANSIENT
+    if 400 <= status_code < 500:
+        return PERMANENT
+    return TRANSIENT
+
+
+def classify_exception(exc: BaseException) -> str:
+    """Istisnoni xatolik turiga ajratadi."""
+    if isinstance(exc, SmartupCredentialsError):
+        return FATAL
+    if isinstance(exc, SmartupAuthError):
+        return AUTH
+    if isinstance(exc, SmartupHTTPError):
+        return classify_status(exc.status_code)
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        return classify_status(exc.response.status_code)
+    if isinstance(exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                        requests.exceptions.ChunkedEncodingError, InvalidZipFileError)):
+        return TRANSIENT
+    # Noma'lum xatolar avvalgidek qayta uriniladi
+    return TRANSIENT
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """`Retry-After` sarlavhasini (soniya yoki HTTP sana) soniyalarga o'giradi."""
+    if not value or not isinstance(value, str):
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """
+    Endpoint bo'yicha retry siyosati (tenacity uchun).
+    Sozlamalar Settings dan olinadi: RETRY_<ENDPOINT>_ATTEMPTS, _BASE_WAIT, _MAX_WAIT.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint.upper()
+
+    def _setting(self, name: str):
+        return getattr(settings, f"RETRY_{self.endpoint}_{name}")
+
+    def should_retry(self, retry_state) -> bool:
+        if retry_state.outcome is None or not retry_state.outcome.failed:
+            return False
+
+        exc = retry_state.outcome.exception()
+        kind = classify_exception(exc)
+        if kind == PERMANENT:
+            logger.error(f"⛔ Постоянная ошибка ({self.endpoint}), повтор не имеет смысла: {exc}")
+            return False
+        if kind == FATAL:
+            logger.error(f"⛔ Ошибка авторизации Smartup ({self.endpoint}), проверьте client_id/secret: {exc}")
+            return False
+        return True
+
+    def stop(self, retry_state) -> bool:
+        return retry_state.attempt_number >= self._setting("ATTEMPTS")
+
+    def wait(self, retry_state) -> float:
+        exc = retry_state.outcome.exception()
+        kind = classify_exception(exc)
+        max_wait = float(self._setting("MAX_WAIT"))
+
+        # Token allaqachon tashlab yuborilgan - kutish shart emas
+        if kind == AUTH:
+            return 0.0
+
+        retry_after = getattr(exc, "retry_after", None)
+        if retry_after is not None:
+            return min(float(retry_after), max_wait)
+
+        # Eksponensial kutish + jitter: [cap/2, cap]
+        cap = min(max_wait, float(self._setting("BASE_WAIT")) * (2 ** (retry_state.attempt_number - 1)))
+        return random.uniform(cap / 2, cap)
+
+    def before_sleep(self, retry_state):
+        exc = retry_state.outcome.exception()
+        logger.warning(
+            f"🔁 Повтор {self.endpoint} через {retry_state.next_action.sleep:.1f} с "
+            f"(попытка {retry_state.attempt_number}/{self._setting('ATTEMPTS')}, "
+            f"тип: {classify_exception(exc)}): {exc}"
+        )
+
+    def decorator(self):
+        return retry(
+            stop=self.stop,
+            wait=self.wait,
+            retry=self.should_retry,
+            before_sleep=self.before_sleep,
+            reraise=True
+        )
+
+
+def smartup_retry(endpoint: str):
+    """Smartup metodlari uchun retry dekoratori (masalan: @smartup_retry("saleswork"))."""
+    return RetryPolicy(endpoint).decorator()
@@ -1,10 +1,21 @@
 import paramiko
+import hashlib
+import io
+import json
 import os
+import random
 import socket
+import threading
 import time
-from typing import List
+import uuid
+from datetime import datetime
+from queue import Empty, Queue
+from typing import Dict, List, Optional, Set, Union
 from core.config import settings
 from core.logger import logger
+from core.exceptions import StreamTransformError
+from utils.upload_manifest import staged_base_name, staged_file_name
+from utils.upload_source import DigestReader, UploadSource, upload_name, upload_size
 
 
 class SFTPManager:
@@ -13,6 +24,16 @@ class SFTPManager:
     Ulanishni boshqarish va fayllarni uzatishni ta'minlaydi.
     """
 
+    # `calibrate` sinab ko'radigan transport profillari (0 / "" - paramiko standarti)
+    CALIBRATION_PROFILES = [
+        {"compress": True, "window_size": 0, "max_packet_size": 0, "ciphers": ""},
+        {"compress": False, "window_size": 0, "max_packet_size": 0, "ciphers": ""},
+        {"compress": True, "window_size": 8 * 1024 * 1024, "max_packet_size": 32768, "ciphers": ""},
+        {"compress": False, "window_size": 8 * 1024 * 1024, "max_packet_size": 32768, "ciphers": ""},
+        {"compress": False, "window_size": 8 * 1024 * 1024, "max_packet_size": 32768,
+         "ciphers": "aes128-gcm@openssh.com,aes128-ctr"},
+    ]
+
     def __init__(self):
         self.host = settings.SFTP_SERVER
         self.port = settings.SFTP_PORT
@@ -22,25 +43,115 @@ class SFTPManager:
 
         self.ssh = None
         self.sftp = None
+        # Parallel rejimdagi qo'shimcha kanallar va (kerak bo'lsa) alohida SSH ulanishlar
+        self.extra_sftp: List[paramiko.SFTPClient] = []
+        self.extra_ssh: List[paramiko.SSHClient] = []
+        # Server "check-file" kengaytmasini qo'llab-quvvatlaydimi (None - hali noma'lum)
+        self.checksum_supported: Optional[bool] = None
+        self.staged_names: Dict[str, str] = {}  # Atomar rejim: {lokal_yo'l: vaqtinchalik_nom}
+        self.run_token = uuid.uuid4().hex[:16]  # Oqim manbalarining vaqtinchalik nomlari uchun (kontent xeshi yo'q)
+        self.transport_options: Optional[dict] = None  # Birinchi ulanishda aniqlanadi
+
+    def _profile_key(self) -> str:
+        return f"{settings.COMPANY_NAME}|{self.host}:{self.port}"
+
+    def _load_profiles(self) -> dict:
+        if not os.path.exists(settings.SFTP_PROFILE_FILE):
+            return {}
+        try:
+            with open(settings.SFTP_PROFILE_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Файл профилей SFTP поврежден, используются настройки: {e}")
+            return {}
+
+    def _save_profile(self, profile: dict):
+        profiles = self._load_profiles()
+        profiles[self._profile_key()] = profile
+        profile_dir = os.path.dirname(settings.SFTP_PROFILE_FILE)
+        if profile_dir and not os.path.exists(profile_dir):
+            os.makedirs(profile_dir)
+        tmp_path = settings.SFTP_PROFILE_FILE + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(profiles, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, settings.SFTP_PROFILE_FILE)
+
+    @staticmethod
+    def _describe(options: dict) -> str:
+        return (f"compress={'on' if options['compress'] else 'off'}, "
+                f"window={options['window_size'] or 'default'}, "
+                f"packet={options['max_packet_size'] or 'default'}, "
+                f"ciphers={options['ciphers'] or 'default'}")
+
+    def _get_transport_options(self) -> dict:
+        """
+        Transport sozlamalari: Settings dagi qiymatlar, shu klient va server uchun
+        kalibrovka qilingan profil bo'lsa - profil qiymatlari.
+        """
+        if self.transport_options is None:
+            options = {
+                "compress": settings.SFTP_COMPRESS,
+                "window_size": settings.SFTP_WINDOW_SIZE,
+                "max_packet_size": settings.SFTP_MAX_PACKET_SIZE,
+                "ciphers": settings.SFTP_CIPHERS,
+            }
+            profile = self._load_profiles().get(self._profile_key())
+            if profile:
+                options.update({k: profile[k] for k in options if k in profile})
+                logger.info(f"Используется откалиброванный профиль SSH ({profile.get('mbps')} МБ/с): "
+                            f"{self._describe(options)}")
+            self.transport_options = options
+        return self.transport_options
+
+    @staticmethod
+    def _transport_factory(options: dict):
+        """Oyna/paket hajmi va shifrlar tartibi berilgan paramiko.Transport yaratuvchi (SSHClient.connect uchun)."""
+        preferred = [c.strip() for c in options["ciphers"].split(",") if c.strip()]
+
+        def factory(sock, gss_kex=False, gss_deleg_creds=True, disabled_algorithms=None):
+            kwargs = {}
+            if options["window_size"]:
+                kwargs["default_window_size"] = options["window_size"]
+            if options["max_packet_size"]:
+                kwargs["default_max_packet_size"] = options["max_packet_size"]
+            transport = paramiko.Transport(sock, gss_kex=gss_kex, gss_deleg_creds=gss_deleg_creds,
+                                           disabled_algorithms=disabled_algorithms, **kwargs)
+            if preferred:
+                # Mijoz ro'yxatidagi tartib muzokarada ustun; qo'llab-quvvatlanmaydigan nomlar tashlanadi
+                security = transport.get_security_options()
+                first = [c for c in preferred if c in security.ciphers]
+                security.ciphers = tuple(first + [c for c in security.ciphers if c not in first])
+            return transport
+
+        return factory
+
+    def _open_ssh(self, options: dict = None) -> paramiko.SSHClient:
+        options = options or self._get_transport_options()
+        extra = {}
+        if options["window_size"] or options["max_packet_size"] or options["ciphers"]:
+            extra["transport_factory"] = self._transport_factory(options)
+
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh.connect(
+            hostname=self.host,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            timeout=60,
+            banner_timeout=30,
+            look_for_keys=False,
+            allow_agent=False,
+            compress=options["compress"],
+            **extra
+        )
+        return ssh
 
     def _connect(self):
         """SSH va SFTP sessiyasini ochadi."""
         try:
             logger.info(f"Установка соединения с SFTP-сервером: {self.host}")
-            self.ssh = paramiko.SSHClient()
-            self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
-            self.ssh.connect(
-                hostname=self.host,
-                port=self.port,
-                username=self.username,
-                password=self.password,
-                timeout=60,
-                banner_timeout=30,
-                look_for_keys=False,
-                allow_agent=False,
-                compress=True
-            )
+            self.ssh = self._open_ssh()
             self.sftp = self.ssh.open_sftp()
             logger.info("SFTP-соединение успешно установлено.")
 
@@ -53,15 +164,278 @@ class SFTPManager:
 
     def _close(self):
         """Ulanishlarni xavfsiz yopadi."""
+        for extra in self.extra_sftp + self.extra_ssh:
+            try:
+                extra.close()
+            except Exception:
+                pass
+        self.extra_sftp, self.extra_ssh = [], []
         if self.sftp:
             self.sftp.close()
         if self.ssh:
             self.ssh.close()
         logger.info("Соединения SFTP закрыты.")
 
-    def upload_files(self, file_paths: List[str]) -> bool:
+    @staticmethod
+    def _file_size(path: Union[str, UploadSource]) -> int:
+        return upload_size(path)
+
+    def _remote_path_for(self, file_name: str) -> str:
+        # Monolit fayllari alohida papkaga, oddiy (saleswork) fayllar - asosiy papkaga
+        if file_name.startswith("monolit_"):
+            return f"{self.remote_path}/monolit/{file_name}"
+        return f"{self.remote_path}/{file_name}"
+
+    def _upload_target(self, local_path: str) -> str:
+        """Fayl yoziladigan masofaviy yo'l: atomar rejimda - shu papkadagi vaqtinchalik nom."""
+        final_path = self._remote_path_for(upload_name(local_path))
+        if not settings.UPLOAD_ATOMIC:
+            return final_path
+        if local_path not in self.staged_names:
+            if isinstance(local_path, UploadSource):
+                self.staged_names[local_path] = f"{local_path.name}.{self.run_token}{settings.UPLOAD_TEMP_SUFFIX}"
+            else:
+                self.staged_names[local_path] = staged_file_name(local_path)
+        return f"{final_path.rsplit('/', 1)[0]}/{self.staged_names[local_path]}"
+
+    def _publish(self, sftp: paramiko.SFTPClient, file_paths: List[str], published: Set[str]):
+        """
+        Atomar rejim: barcha fayllar yuklangandan keyin vaqtinchalik nomlar asl nomlarga o'zgartiriladi.
+        posix-rename mavjud bo'lsa almashtirish atomar; bo'lmasa eski fayl o'chirilib, keyin nomlanadi.
+        """
+        renamed = 0
+        for local_path in file_paths:
+            if local_path in published:
+                continue
+            staged_path = self._upload_target(local_path)
+            final_path = self._remote_path_for(upload_name(local_path))
+            try:
+                sftp.posix_rename(staged_path, final_path)
+            except IOError:
+                try:
+                    sftp.remove(final_path)
+                except IOError:
+                    pass
+                sftp.rename(staged_path, final_path)
+            published.add(local_path)
+            renamed += 1
+        logger.info(f"📦 Опубликовано (переименовано) файлов: {renamed}.")
+        self._remove_stale_staged(sftp, file_paths)
+
+    def _remove_stale_staged(self, sftp: paramiko.SFTPClient, file_paths: List[str]):
+        """Oldingi ishga tushirishlardan qolgan (boshqa kontentli) vaqtinchalik fayllarni o'chiradi."""
+        by_dir: Dict[str, Set[str]] = {}
+        current = set(self.staged_names.values())
+        for local_path in file_paths:
+            remote_dir = self._remote_path_for(upload_name(local_path)).rsplit('/', 1)[0]
+            by_dir.setdefault(remote_dir, set()).add(upload_name(local_path))
+
+        for remote_dir, names in by_dir.items():
+            try:
+                entries = sftp.listdir(remote_dir or "/")
+            except IOError:
+                continue
+            for entry in entries:
+                if entry not in current and staged_base_name(entry) in names:
+                    try:
+                        sftp.remove(f"{remote_dir}/{entry}")
+                        logger.info(f"🧹 Удален устаревший временный файл: {entry}")
+                    except IOError:
+                        pass
+
+    def _ensure_monolit_dir(self, sftp: paramiko.SFTPClient, file_paths: List[str]):
+        """Monolit papkasini faqat bir marta tekshiramiz/yaratamiz (monolit fayllar bo'lsa)."""
+        if not any(upload_name(p).startswith("monolit_") for p in file_paths):
+            return
+        monolit_remote_dir = f"{self.remote_path}/monolit"
+        try:
+            sftp.stat(monolit_remote_dir)
+        except IOError:
+            # Agar papka yo'q bo'lsa (IOError), uni yaratamiz
+            logger.info(f"📁 Папка 'monolit' не найдена на сервере. Создаем: {monolit_remote_dir}")
+            sftp.mkdir(monolit_remote_dir)
+
+    def _put_file(self, sftp: paramiko.SFTPClient, local_path: str, offset: int = 0, written: Dict[str, int] = None):
+        """
+        Bitta faylni yuklaydi va o'tkazish tezligini log qiladi.
+        offset > 0 bo'lsa - serverdagi qisman yozilgan fayl shu joydan davom ettiriladi.
+        written ga shu ishga tushirishda serverga yozilgan baytlar soni yoziladi (birinchi bo'lak yozilgandan boshlab).
+        UploadSource oqim sifatida (putfo) yuboriladi, nazorat summasi yuborish paytida hisoblanadi.
+        """
+        if written is None:
+            written = {}
+        file_name = upload_name(local_path)
+        remote_full_path = self._upload_target(local_path)
+        if offset:
+            logger.info(f"Продолжение отправки {file_name} с позиции {offset} байт.")
+        elif file_name.startswith("monolit_"):
+            logger.info(f"Отправка файла Monolit в отдельную папку: {file_name}")
+        else:
+            logger.info(f"Отправка файла: {file_name}")
+
+        started = time.perf_counter()
+        sent_bytes = self._file_size(local_path) - offset
+        if isinstance(local_path, UploadSource):
+            with local_path.open() as src:
+                reader = DigestReader(src)
+                try:
+                    sftp.putfo(reader, remote_full_path)
+                except StreamTransformError:
+                    # Qisman yozilgan fayl serverda qolmasin (atomar bo'lmagan rejimda u yakuniy nom bilan)
+                    try:
+                        sftp.remove(remote_full_path)
+                    except IOError:
+                        pass
+                    raise
+            sent_bytes = reader.bytes_read
+            verified = self._checksum_matches(sftp, local_path, remote_full_path, reader.digest.digest())
+        elif offset:
+            with open(local_path, 'rb') as src, sftp.open(remote_full_path, 'r+') as dst:
+                src.seek(offset)
+                dst.seek(offset)
+                dst.set_pipelined(True)
+                position = offset
+                for chunk in iter(lambda: src.read(32768), b""):
+                    dst.write(chunk)
+                    position += len(chunk)
+                    written[local_path] = position
+            verified = self._remote_matches(sftp, local_path, remote_full_path)
+        else:
+            # put() hajmni o'zi tekshiradi (confirm=True), bu yerda faqat nazorat summasi qoladi
+            def progress(done, _total):
+                # Chaqirilgan bo'lsa fayl shu ishga tushirishda truncate qilingan - serverdagi kontent bizniki
+                written[local_path] = done
+
+            sftp.put(local_path, remote_full_path, progress)
+            verified = self._checksum_matches(sftp, local_path, remote_full_path)
+        elapsed = max(time.perf_counter() - started, 1e-6)
+
+        if not verified:
+            raise IOError(f"Файл {file_name} на сервере не совпадает с локальным (размер/контрольная сумма)")
+
+        size_mb = sent_bytes / (1024 * 1024)
+        logger.info(f"✅ Успешно отправлен: {file_name} ({size_mb:.2f} МБ за {elapsed:.2f} с, "
+                    f"{size_mb / elapsed:.2f} МБ/с)")
+
+    def _remote_matches(self, sftp: paramiko.SFTPClient, local_path: str, remote_full_path: str) -> bool:
+        """Serverdagi fayl lokal bilan bir xilmi: hajm, SFTP_VERIFY_CHECKSUM bo'lsa - SHA1 ham (server qo'llasa)."""
+        try:
+            remote_size = sftp.stat(remote_full_path).st_size
+        except IOError:
+            return False
+        if remote_size != self._file_size(local_path):
+            return False
+        return self._checksum_matches(sftp, local_path, remote_full_path)
+
+    def _checksum_matches(self, sftp: paramiko.SFTPClient, local_path: str, remote_full_path: str,
+                          local_digest: bytes = None) -> bool:
+        if not settings.SFTP_VERIFY_CHECKSUM or self.checksum_supported is False:
+            return True
+
+        try:
+            with sftp.open(remote_full_path, 'r') as remote_file:
+                remote_hash = remote_file.check('sha1')
+            self.checksum_supported = True
+        except IOError:
+            logger.info("Сервер не поддерживает проверку контрольной суммы (check-file), сверяется только размер.")
+            self.checksum_supported = False
+            return True
+
+        if local_digest is None:
+            local_hash = hashlib.sha1()
+            with open(local_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    local_hash.update(chunk)
+            local_digest = local_hash.digest()
+        return remote_hash == local_digest
+
+    def _send_file(self, sftp: paramiko.SFTPClient, local_path: str, written: Dict[str, int], confirmed: Set[str]):
+        """
+        Faylni yuboradi va tasdiqlanganlar ro'yxatiga qo'shadi.
+        Oldingi urinishda serverga yozish boshlangan fayl (written da bor) avval serverda tekshiriladi:
+        to'liq bo'lsa - qayta yuborilmaydi, qisman bo'lsa - qolgan qismi yuboriladi. Yozish boshlanmagan
+        fayllar (urinish ochishdan oldin uzilgan bo'lsa ham) har doim boshidan yuboriladi - yakuniy nomdagi
+        fayl kechagi nusxa bo'lishi mumkin. Atomar rejimda vaqtinchalik nomda kontent
+        xeshi bor, shuning uchun oldingi (muvaffaqiyatsiz) ishga tushirishdan qolgan fayl ham qayta ishlatiladi.
+        UploadSource hajmi oldindan noma'lum - u har doim boshidan to'liq yuboriladi.
+        """
+        file_name = upload_name(local_path)
+        offset = 0
+        resumable = not isinstance(local_path, UploadSource)
+        if resumable and (local_path in written or settings.UPLOAD_ATOMIC):
+            remote_full_path = self._upload_target(local_path)
+            if self._remote_matches(sftp, local_path, remote_full_path):
+                logger.info(f"✅ {file_name} уже полностью на сервере, повторная отправка не нужна.")
+                confirmed.add(local_path)
+                return
+            try:
+                remote_size = sftp.stat(remote_full_path).st_size
+            except IOError:
+                remote_size = 0
+            if 0 < remote_size < self._file_size(local_path):
+                offset = remote_size
+
+        try:
+            self._put_file(sftp, local_path, offset, written)
+        except IOError:
+            if not offset:
+                raise
+            # Davom ettirilgan fayl mos kelmadi - keyingi urinishda boshidan yuboriladi
+            written.pop(local_path, None)
+            raise
+        confirmed.add(local_path)
+
+    def _upload_parallel(self, file_paths: List[str], channels: int, written: Dict[str, int], confirmed: Set[str]):
+        """
+        Fayllarni bir nechta SFTP kanal orqali parallel yuklaydi (eng kattasi birinchi).
+        Kanallar bitta SSH transportda ochiladi; SFTP_PARALLEL_TRANSPORTS=True bo'lsa - har biri alohida ulanishda.
+        Bitta fayl xato bersa, qolgan ishchilar to'xtaydi va xato yuqoriga ko'tariladi (hammasi yoki hech narsa).
+        """
+        for _ in range(channels - 1):
+            if settings.SFTP_PARALLEL_TRANSPORTS:
+                ssh = self._open_ssh()
+                self.extra_ssh.append(ssh)
+                self.extra_sftp.append(ssh.open_sftp())
+            else:
+                self.extra_sftp.append(self.ssh.open_sftp())
+        mode = "соединений" if settings.SFTP_PARALLEL_TRANSPORTS else "каналов"
+        logger.info(f"⚡ Параллельная отправка: {channels} {mode} SFTP.")
+
+        self._ensure_monolit_dir(self.sftp, file_paths)
+
+        # Katta fayllar birinchi navbatda - oxirida bitta uzun fayl kutib qolmasligi uchun
+        pending = Queue()
+        for path in sorted(file_paths, key=self._file_size, reverse=True):
+            pending.put(path)
+
+        errors = []
+
+        def worker(sftp):
+            while not errors:
+                try:
+                    path = pending.get_nowait()
+                except Empty:
+                    return
+                try:
+                    self._send_file(sftp, path, written, confirmed)
+                except Exception as e:
+                    errors.append(e)
+                    return
+
+        threads = [threading.Thread(target=worker, args=(sftp,), daemon=True)
+                   for sftp in [self.sftp] + self.extra_sftp]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+    def upload_files(self, file_paths: List[Union[str, UploadSource]]) -> bool:
         """
         Berilgan fayllar ro'yxatini SFTP serverga yuklaydi.
+        Ro'yxatda lokal fayl yo'llari ham, diskda bo'lmagan UploadSource manbalari ham bo'lishi mumkin.
         """
         if not file_paths:
             logger.warning("Файлы для загрузки не найдены.")
@@ -69,48 +443,41 @@ class SFTPManager:
 
         attempt = 0
         max_attempts = 3
+        # Urinishlar orasida saqlanadi: qayta urinishda faqat tasdiqlanmagan fayllar yuboriladi
+        written: Dict[str, int] = {}  # Shu ishga tushirishda serverga yozilgan baytlar (fayl bo'yicha)
+        confirmed: Set[str] = set()
+        published: Set[str] = set()
+        self.staged_names = {}
+        self.transport_options = None
 
         while attempt < max_attempts:
             try:
                 self._connect()
 
-                # Monolit papkasi allaqachon tekshirildimi yoki yo'qligini bilish uchun belgi
-                monolit_dir_checked = False
-
-                uploaded_count = 0
-                for local_path in file_paths:
-                    file_name = os.path.basename(local_path)
-
-                    # --- O'ZGARISH SHU YERDA: MONOLIT FAYLLAR UCHUN ALOHIDA MANTIQ ---
-                    if file_name.startswith("monolit_"):
-                        monolit_remote_dir = f"{self.remote_path}/monolit"
-
-                        # Papkani faqat bir marta tekshiramiz/yaratamiz
-                        if not monolit_dir_checked:
-                            try:
-                                self.sftp.stat(monolit_remote_dir)
-                            except IOError:
-                                # Agar papka yo'q bo'lsa (IOError), uni yaratamiz
-                                logger.info(f"📁 Папка 'monolit' не найдена на сервере. Создаем: {monolit_remote_dir}")
-                                self.sftp.mkdir(monolit_remote_dir)
-                            monolit_dir_checked = True
-
-                        remote_full_path = f"{monolit_remote_dir}/{file_name}"
-                        logger.info(f"Отправка файла Monolit в отдельную папку: {file_name}")
-                    else:
-                        # Oddiy (saleswork) fayllar uchun eski mantiq
-                        remote_full_path = f"{self.remote_path}/{file_name}"
-                        logger.info(f"Отправка файла: {file_name}")
-
-                    # Faylni serverga joylash
-                    self.sftp.put(local_path, remote_full_path)
-                    uploaded_count += 1
-                    logger.info(f"✅ Успешно отправлен: {file_name}")
+                remaining = [p for p in file_paths if p not in confirmed]
+                if confirmed:
+                    logger.info(f"Подтверждено на сервере: {len(confirmed)} из {len(file_paths)} файлов, "
+                                f"отправляются оставшиеся {len(remaining)}.")
+
+                channels = max(1, min(settings.SFTP_PARALLEL_CHANNELS, len(remaining)))
+                if channels > 1:
+                    self._upload_parallel(remaining, channels, written, confirmed)
+                else:
+                    self._ensure_monolit_dir(self.sftp, remaining)
+                    for local_path in remaining:
+                        self._send_file(self.sftp, local_path, written, confirmed)
 
+                uploaded_count = len(confirmed)
+                if uploaded_count == len(file_paths) and settings.UPLOAD_ATOMIC:
+                    self._publish(self.sftp, file_paths, published)
                 if uploaded_count == len(file_paths):
                     logger.info(f"SUCCESS: Все {uploaded_count} файлов загружены на SFTP.")
                     return True
 
+            except StreamTransformError as e:
+                # Tarkib xatosi - qayta ulanish yordam bermaydi
+                logger.error(f"ERROR: {e}")
+                return False
             except (socket.error, paramiko.SSHException, EOFError, IOError) as e:
                 attempt += 1
                 logger.warning(f"Ошибка соединения (Попытка {attempt}/{max_attempts}): {e}")
@@ -121,6 +488,66 @@ class SFTPManager:
         logger.error("ERROR: Не удалось загрузить файлы на SFTP.")
         return False
 
+    @staticmethod
+    def _calibration_payload(size: int) -> bytes:
+        """Haqiqiy yuklamaga o'xshash sintetik XML (siqilish darajasi ham o'xshash bo'lishi uchun)."""
+        rnd = random.Random(0)
+        parts, total = [b"<Sales>\n"], 0
+        while total < size:
+            row = (f'<Sale OL_ID="{rnd.randint(1, 99999)}" PRODUCT_ID="{rnd.randint(1, 9999)}" '
+                   f'QTY="{rnd.randint(1, 500)}" AMOUNT="{rnd.random() * 1e6:.2f}"/>\n').encode('utf-8')
+            parts.append(row)
+            total += len(row)
+        parts.append(b"</Sales>\n")
+        return b"".join(parts)
+
+    def calibrate(self, payload_mb: int = None) -> Optional[dict]:
+        """
+        Bir nechta transport profilini sozlangan serverda sintetik fayl bilan sinaydi
+        va eng tezini shu klient uchun SFTP_PROFILE_FILE ga yozadi. Qaytadi: tanlangan profil yoki None.
+        """
+        payload_mb = payload_mb or settings.SFTP_CALIBRATE_PAYLOAD_MB
+        payload = self._calibration_payload(payload_mb * 1024 * 1024)
+        remote_file = f"{self.remote_path.rstrip('/')}/.sftp_calibrate_{os.getpid()}.tmp"
+        size_mb = len(payload) / (1024 * 1024)
+        logger.info(f"🔧 Калибровка SFTP {self.host}: {len(self.CALIBRATION_PROFILES)} профилей, "
+                    f"файл {size_mb:.1f} МБ.")
+
+        results = []
+        for options in self.CALIBRATION_PROFILES:
+            ssh = sftp = None
+            try:
+                ssh = self._open_ssh(options)
+                sftp = ssh.open_sftp()
+                started = time.perf_counter()
+                sftp.putfo(io.BytesIO(payload), remote_file)
+                speed = size_mb / max(time.perf_counter() - started, 1e-6)
+                results.append((speed, options))
+                logger.info(f"⏱ {self._describe(options)}: {speed:.2f} МБ/с")
+            except (socket.error, paramiko.SSHException, EOFError, IOError) as e:
+                logger.warning(f"Профиль не проверен ({self._describe(options)}): {e}")
+            finally:
+                if sftp:
+                    try:
+                        sftp.remove(remote_file)
+                    except IOError:
+                        pass
+                    sftp.close()
+                if ssh:
+                    ssh.close()
+
+        if not results:
+            logger.error("Калибровка SFTP не удалась: ни один профиль не сработал.")
+            return None
+
+        speed, best = max(results, key=lambda r: r[0])
+        profile = dict(best, mbps=round(speed, 2), payload_mb=payload_mb,
+                       calibrated_at=datetime.now().isoformat(timespec="seconds"))
+        self._save_profile(profile)
+        self.transport_options = None
+        logger.info(f"✅ Выбран профиль SFTP ({profile['mbps']} МБ/с): {self._describe(best)}")
+        return profile
+
 
 # Singleton instance
 sftp_manager = SFTPManager()
\ No newline at end of file
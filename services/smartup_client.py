@@ -1,17 +1,48 @@
 import requests
 import io
+import os
+import threading
+import time
 import zipfile
+from urllib.parse import urlparse
 from datetime import datetime, timedelta
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
+from typing import Optional, Tuple
 
 from core.config import settings
 from core.logger import logger
+from core.exceptions import InvalidZipFileError, SmartupAuthError, SmartupCredentialsError, SmartupHTTPError
+from services.token_cache import TokenCache
+from services.http_session import create_session, log_pool_stats
+from services.retry_policy import parse_retry_after, smartup_retry
 
 
 class SmartupClient:
+    # Bitta Smartup serveriga bir vaqtda ketadigan og'ir so'rovlar chegarasi (host bo'yicha)
+    _host_slots = {}
+    _host_slots_lock = threading.Lock()
+
     def __init__(self):
         self.base_url = settings.SMARTUP_SERVER_URL
         self.token = None
+        self.token_expires_at = None  # Unix vaqt; None - muddati noma'lum
+        self.token_issued_at = None  # Token olingan vaqt (umri = token_expires_at - token_issued_at)
+        self._token_lock = threading.Lock()
+
+        # Token va hisobot so'rovlari uchun umumiy keep-alive sessiya
+        self.session = create_session()
+
+        # Jarayonlar orasida umumiy token keshi (ixtiyoriy)
+        self.token_cache = TokenCache(settings.SMARTUP_TOKEN_CACHE_FILE) if settings.SMARTUP_TOKEN_CACHE_FILE else None
+
+    def _host_slot(self) -> threading.BoundedSemaphore:
+        """Joriy server (host) uchun umumiy semaforni qaytaradi."""
+        host = urlparse(self.base_url).netloc or self.base_url
+        with SmartupClient._host_slots_lock:
+            slot = SmartupClient._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(max(1, settings.SMARTUP_MAX_CONNECTIONS_PER_HOST))
+                SmartupClient._host_slots[host] = slot
+        return slot
 
     def _get_oauth_token(self) -> str:
         """Smartup tizimidan OAuth2 access token oladi."""
@@ -27,10 +58,13 @@ class SmartupClient:
         }
 
         try:
-            response = requests.post(url, json=payload, timeout=30)
+            response = self.session.post(url, json=payload, timeout=30)
 
             if response.status_code != 200:
                 logger.error(f"❌ Ошибка при получении токена: {response.text}")
+                if response.status_code == 401:
+                    # Token endpoint'i rad etdi - data endpoint'idagi 401 dan farqli, yangi token yordam bermaydi
+                    raise SmartupCredentialsError("Smartup отклонил учетные данные клиента", response.status_code)
                 response.raise_for_status()
 
             data = response.json()
@@ -42,6 +76,11 @@ class SmartupClient:
 
             final_token = f"Bearer {access_token}"
 
+            # Muddatidan oldin yangilash uchun tugash vaqtini eslab qolamiz
+            expires_in = data.get('expires_in')
+            self.token_issued_at = time.time()
+            self.token_expires_at = self.token_issued_at + float(expires_in) if expires_in else None
+
             logger.info(f"✅ Токен успешно получен (Начало: {final_token[:15]}...)")
 
             return final_token
@@ -50,23 +89,75 @@ class SmartupClient:
             logger.error(f"Критическая ошибка при получении токена: {e}")
             raise e
 
+    def _token_cache_key(self) -> str:
+        return TokenCache.make_key(self.base_url, settings.SMARTUP_CLIENT_ID)
+
+    def _token_expiring(self) -> bool:
+        """Token muddati tugagan yoki SMARTUP_TOKEN_REFRESH_MARGIN soniya ichida tugaydimi."""
+        if self.token_expires_at is None:
+            return False
+        margin = TokenCache.refresh_margin(settings.SMARTUP_TOKEN_REFRESH_MARGIN,
+                                           self.token_expires_at, self.token_issued_at)
+        return time.time() >= self.token_expires_at - margin
+
     def _ensure_token(self):
-        if not self.token:
+        # Parallel yuklashlarda token faqat bir marta olinishi uchun
+        with self._token_lock:
+            if self.token and not self._token_expiring():
+                return
+
+            if self.token:
+                logger.info("🔄 Срок действия токена истекает, токен обновляется заранее...")
+                self.token = None
+
+            if self.token_cache:
+                cached = self.token_cache.get(self._token_cache_key(), margin=settings.SMARTUP_TOKEN_REFRESH_MARGIN)
+                if cached:
+                    self.token = cached["token"]
+                    self.token_expires_at = cached.get("expires_at")
+                    self.token_issued_at = cached.get("issued_at")
+                    logger.info("🔑 Токен Smartup взят из кэша.")
+                    return
+
             self.token = self._get_oauth_token()
+            if self.token_cache:
+                self.token_cache.set(self._token_cache_key(), self.token, self.token_expires_at, self.token_issued_at)
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_fixed(5),
-        retry=retry_if_exception_type(Exception),
-        reraise=True
-    )
-    def download_sales_report(self, template_id: int) -> bytes:
-        self._ensure_token()
+    def _invalidate_token(self):
+        """Yaroqsiz tokenni xotiradan ham, keshdan ham o'chiradi."""
+        self.token = None
+        self.token_expires_at = None
+        self.token_issued_at = None
+        if self.token_cache:
+            self.token_cache.invalidate(self._token_cache_key())
 
-        url = f"{self.base_url}/trade/rep/integration/saleswork"
+    def log_connection_stats(self):
+        log_pool_stats(self.session, "Smartup")
 
+    @staticmethod
+    def get_sales_period() -> Tuple[datetime, datetime]:
+        """Saleswork hisobotining to'liq davri: (kecha - DAYS_DIFF) .. kecha."""
         end_date = datetime.today() - timedelta(days=1)
         begin_date = end_date - timedelta(days=settings.DAYS_DIFF)
+        return begin_date, end_date
+
+    def _request_sales_report(self, template_id: int, begin_date: datetime = None, end_date: datetime = None,
+                              range_from: int = 0, if_range: str = None, identity: bool = False):
+        """
+        Saleswork hisobotiga so'rov yuboradi va stream rejimidagi javobni qaytaradi.
+        range_from > 0 bo'lsa, yuklashni davom ettirish uchun `Range` va `If-Range` sarlavhalari qo'shiladi
+        (hisobot o'zgargan bo'lsa server 206 emas, to'liq 200 javob qaytaradi).
+        identity=True - javob siqilmasdan (Content-Encoding'siz) so'raladi: Range baytlari faylga yozilgan
+        baytlar bilan bir xil bo'lishi uchun (ZIP baribir siqilgan).
+        """
+        self._ensure_token()
+
+        url = f"{self.base_url}/trade/rep/integration/saleswork"
+
+        # Sana berilmasa, to'liq DAYS_DIFF davri olinadi
+        default_begin, default_end = self.get_sales_period()
+        begin_date = begin_date or default_begin
+        end_date = end_date or default_end
 
         payload = {
             "begin_date": begin_date.strftime('%d.%m.%Y'),
@@ -84,11 +175,16 @@ class SmartupClient:
             "Authorization": self.token,
             "Content-Type": "application/json"
         }
+        if identity:
+            headers["Accept-Encoding"] = "identity"
+        if range_from:
+            headers["Range"] = f"bytes={range_from}-"
+            headers["If-Range"] = if_range
 
-        response = requests.post(url, json=payload, headers=headers, stream=True, timeout=1800)
+        response = self.session.post(url, json=payload, headers=headers, stream=True, timeout=1800)
 
         # XATOLIKNI QAYTA ISHLASH
-        if response.status_code != 200:
+        if response.status_code not in (200, 206):
             try:
                 error_text = response.text
             except:
@@ -99,50 +195,166 @@ class SmartupClient:
             # Agar "Avtorizatsiya kerak" degan HTML xato kelsa yoki 401 bo'lsa
             if response.status_code == 401 or "authorization" in error_text.lower() or "авторизация" in error_text.lower():
                 logger.warning("🔄 Токен устарел или недействителен. Попытка обновления...")
-                self.token = None
+                self._invalidate_token()
                 # Retry ishlashi uchun exception otamiz
-                raise Exception("Authorization Failed - Retrying")
+                raise SmartupAuthError("Authorization Failed - Retrying", response.status_code)
 
-            raise Exception(f"Ошибка Smartup API: {response.status_code}")
+            raise SmartupHTTPError(f"Ошибка Smartup API: {response.status_code}", response.status_code,
+                                   parse_retry_after(response.headers.get("Retry-After")))
 
-        # YUKLASH JARAYONI
-        buffer = io.BytesIO()
+        return response
+
+    @staticmethod
+    def _check_zip(zip_source, head: bytes):
+        """
+        Javob haqiqatan ZIP ekanligini tekshiradi.
+        ZIP_VALIDATE_ON_EXTRACT yoqilgan bo'lsa, faqat markaziy katalog o'qiladi -
+        CRC tekshiruvi FileHandler.extract_zip ichida, ochish bilan bir o'tishda bajariladi.
+        """
+        try:
+            with zipfile.ZipFile(zip_source) as zf:
+                if not settings.ZIP_VALIDATE_ON_EXTRACT and zf.testzip() is not None:
+                    raise InvalidZipFileError("Внутренняя структура ZIP-файла повреждена")
+        except zipfile.BadZipFile:
+            # Agar HTML qaytgan bo'lsa, uni ko'ramiz
+            logger.error(f"❌ Полученный файл не является ZIP! Ответ сервера (начало): {head}")
+            raise InvalidZipFileError("Сервер не вернул ZIP-файл. Возможно, снова ошибка авторизации.")
+
+    @staticmethod
+    def _write_stream(response, target, chunk_size: int = 1024 * 1024) -> int:
+        """Javob oqimini bo'laklab `target` ga yozadi va umumiy hajmni qaytaradi."""
         total_size = 0
-        chunk_size = 1024 * 1024
+        log_step = 5 * 1024 * 1024
 
         logger.info("📥 Начался поток данных (Stream)...")
 
-        for i, chunk in enumerate(response.iter_content(chunk_size=chunk_size)):
+        for chunk in response.iter_content(chunk_size=chunk_size):
             if chunk:
-                buffer.write(chunk)
+                target.write(chunk)
+                prev_size = total_size
                 total_size += len(chunk)
-                if i % 5 == 0:  # Har 5MB da log
+                if prev_size == 0 or total_size // log_step != prev_size // log_step:  # Har 5MB da log
                     logger.info(f"⏳ Загрузка... {total_size / (1024 * 1024):.2f} MB")
 
         logger.info(f"✅ Загрузка завершена. Всего: {total_size / (1024 * 1024):.2f} MB")
-
-        buffer.seek(0)
-        file_content = buffer.read()
+        return total_size
+
+    @staticmethod
+    def _content_encoded(response) -> bool:
+        return response.headers.get("Content-Encoding", "identity").strip().lower() not in ("", "identity")
+
+    @staticmethod
+    def _validator(response) -> Optional[str]:
+        """If-Range uchun kuchli validator: ETag (zaif W/ emas) yoki Last-Modified; bo'lmasa None."""
+        etag = response.headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            return etag
+        return response.headers.get("Last-Modified")
+
+    def _write_stream_resumable(self, response, target, template_id: int, begin_date: datetime = None,
+                                end_date: datetime = None) -> int:
+        """
+        Oqimni faylga yozadi; oqim uzilsa, yozilgan qismni saqlab `Range` + `If-Range` bilan davom ettiradi.
+        Smartup har bir so'rovda hisobotni qayta yig'adi, shuning uchun davom ettirish faqat birinchi javob
+        validator (ETag/Last-Modified) bergan bo'lsa va server aynan shu joydan 206 qaytarsa qilinadi.
+        Aks holda (200, validatorsiz javob yoki boshqa Content-Range) fayl boshidan qayta yoziladi.
+        Javob Content-Encoding bilan kelsa ham davom ettirilmaydi: yozilgan baytlar ochilgan (decoded),
+        Range esa kodlangan baytlarni sanaydi.
+        """
+        validator = self._validator(response)
+        resumes = 0
+        while True:
+            try:
+                # Kichik bo'laklar: uzilishda yo'qotiladigan (qayta yuklanadigan) qism kamroq bo'ladi
+                self._write_stream(response, target, chunk_size=64 * 1024)
+                return target.tell()
+            except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError) as e:
+                response.close()
+                resumes += 1
+                if resumes > settings.SALESWORK_RESUME_ATTEMPTS:
+                    raise
+
+                offset = target.tell()
+                logger.warning(
+                    f"⚠️ Поток прерван на {offset / (1024 * 1024):.2f} MB ({e}). "
+                    f"Продолжение загрузки ({resumes}/{settings.SALESWORK_RESUME_ATTEMPTS})...")
+                if offset and not validator:
+                    logger.warning("Сервер не вернул ETag/Last-Modified - продолжение невозможно, "
+                                   "загрузка начинается заново.")
+                    offset = 0
+                elif offset and self._content_encoded(response):
+                    logger.warning(f"Ответ сжат ({response.headers.get('Content-Encoding')}) - позиция в файле "
+                                   f"не совпадает с Range, загрузка начинается заново.")
+                    offset = 0
+
+                response = self._request_sales_report(template_id, begin_date, end_date,
+                                                      range_from=offset, if_range=validator, identity=True)
+                content_range = response.headers.get("Content-Range", "")
+
+                if offset and response.status_code == 206:
+                    if (content_range.startswith(f"bytes {offset}-")
+                            and self._validator(response) in (None, validator)
+                            and not self._content_encoded(response)):
+                        logger.info(f"↪️ Сервер поддерживает Range: продолжение с байта {offset}.")
+                        continue
+                    # Boshqa joydan (yoki boshqa hisobotdan) qism - faylni buzmaslik uchun to'liq qayta so'rov
+                    logger.warning(f"Сервер вернул неожиданный диапазон ({content_range}), "
+                                   f"загрузка начинается заново.")
+                    response.close()
+                    response = self._request_sales_report(template_id, begin_date, end_date, identity=True)
+                elif offset:
+                    # Server Range'ni qo'llamaydi yoki hisobot o'zgargan - butun faylni qaytadan yozamiz
+                    logger.warning("Сервер не поддерживает Range или отчет изменился, загрузка начинается заново.")
+
+                target.seek(0)
+                target.truncate()
+                validator = self._validator(response)
+
+    @smartup_retry("saleswork")
+    def download_sales_report(self, template_id: int, begin_date: datetime = None,
+                              end_date: datetime = None) -> bytes:
+        with self._host_slot():
+            response = self._request_sales_report(template_id, begin_date, end_date)
+
+            # YUKLASH JARAYONI
+            buffer = io.BytesIO()
+            self._write_stream(response, buffer)
+
+        file_content = buffer.getvalue()
 
         # ZIP TEKSHIRUVI
-        try:
-            with zipfile.ZipFile(io.BytesIO(file_content)) as zf:
-                if zf.testzip() is not None:
-                    raise Exception("Внутренняя структура ZIP-файла повреждена")
-        except zipfile.BadZipFile:
-            # Agar HTML qaytgan bo'lsa, uni ko'ramiz
-            logger.error(f"❌ Полученный файл не является ZIP! Ответ сервера (начало): {file_content[:500]}")
-            raise Exception("Сервер не вернул ZIP-файл. Возможно, снова ошибка авторизации.")
+        self._check_zip(io.BytesIO(file_content), file_content[:500])
 
         return file_content
 
+    @smartup_retry("saleswork")
+    def download_sales_report_to_file(self, template_id: int, file_path: str, begin_date: datetime = None,
+                                      end_date: datetime = None) -> str:
+        """
+        Hisobotni xotiraga yig'masdan to'g'ridan-to'g'ri diskka (`file_path`) yozadi.
+        Katta shablonlarda RAM sarfi arxiv hajmiga bog'liq bo'lmaydi.
+        """
+        try:
+            with self._host_slot():
+                response = self._request_sales_report(template_id, begin_date, end_date, identity=True)
+                with open(file_path, 'wb') as f:
+                    self._write_stream_resumable(response, f, template_id, begin_date, end_date)
+
+            # ZIP TEKSHIRUVI (fayldan)
+            with open(file_path, 'rb') as f:
+                head = f.read(500)
+            self._check_zip(file_path, head)
+
+        except Exception:
+            # Yarim yozilgan yoki buzilgan faylni qoldirmaymiz
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+
+        return file_path
+
     # === YANGI QO'SHILGAN QISM (MONOLIT UCHUN) ===
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_fixed(5),
-        retry=retry_if_exception_type(Exception),
-        reraise=True
-    )
+    @smartup_retry("monolit")
     def download_monolit_report(self, report_type: str) -> bytes:
         self._ensure_token()
 
@@ -168,15 +380,16 @@ class SmartupClient:
         }
 
         # Timeoutni 600 soniya (10 minut) qilib qo'yamiz, Monolit og'ir report bo'lishi mumkin
-        response = requests.post(url, json=payload, headers=headers, timeout=600)
+        response = self.session.post(url, json=payload, headers=headers, timeout=600)
 
         if response.status_code != 200:
             error_text = response.text[:300]
             logger.error(f"❌ Ответ сервера Monolit (Статус {response.status_code}): {error_text}")
             if response.status_code == 401:
-                self.token = None
-                raise Exception("Authorization Failed - Retrying")
-            raise Exception(f"Ошибка Monolit API: {response.status_code}")
+                self._invalidate_token()
+                raise SmartupAuthError("Authorization Failed - Retrying", response.status_code)
+            raise SmartupHTTPError(f"Ошибка Monolit API: {response.status_code}", response.status_code,
+                                   parse_retry_after(response.headers.get("Retry-After")))
 
         file_content = response.content
         logger.info(f"✅ Успешно скачан отчет Monolit ({report_type}), размер: {len(file_content) / 1024:.2f} KB")
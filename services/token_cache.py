@@ -0,0 +1,88 @@
+import os
+import json
+import time
+from typing import Optional
+from core.logger import logger
+
+
+class TokenCache:
+    """
+    OAuth tokenlarini fayl orqali saqlaydi (server URL + client ID bo'yicha).
+    manager.py har bir klient uchun yangi jarayon ishga tushiradi, shuning uchun
+    token jarayonlar orasida shu fayl orqali qayta ishlatiladi.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    @staticmethod
+    def make_key(server_url: str, client_id: str) -> str:
+        return f"{server_url.rstrip('/')}|{client_id}"
+
+    def _read_all(self) -> dict:
+        if not os.path.exists(self.file_path):
+            return {}
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Кэш токенов поврежден и будет перезаписан: {e}")
+            return {}
+
+    def _write_all(self, data: dict):
+        cache_dir = os.path.dirname(self.file_path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        # Boshqa jarayon yarim yozilgan faylni o'qimasligi uchun: avval temp, keyin rename
+        tmp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        try:
+            os.chmod(tmp_path, 0o600)
+        except OSError:
+            pass
+        os.replace(tmp_path, self.file_path)
+
+    @staticmethod
+    def refresh_margin(margin: float, expires_at: Optional[float], issued_at: Optional[float]) -> float:
+        """
+        Oldindan yangilash oralig'i token umrining yarmidan oshmaydi: aks holda qisqa muddatli
+        (expires_in <= margin) token olingan zahoti eskirgan hisoblanib, har safar yangisi so'ralardi.
+        """
+        if expires_at is None or issued_at is None:
+            return margin
+        return min(margin, max(0.0, expires_at - issued_at) // 2)
+
+    def get(self, key: str, margin: int = 0) -> Optional[dict]:
+        """
+        Amal qilish muddati `margin` soniyadan ko'proq qolgan tokenni qaytaradi (margin - refresh_margin bo'yicha).
+        Qaytadi: {"token": ..., "expires_at": ..., "issued_at": ...} yoki None.
+        """
+        entry = self._read_all().get(key)
+        if not entry or not entry.get("token"):
+            return None
+
+        expires_at = entry.get("expires_at")
+        if expires_at is None:
+            return entry
+        if time.time() >= expires_at - self.refresh_margin(margin, expires_at, entry.get("issued_at")):
+            return None
+        return entry
+
+    def set(self, key: str, token: str, expires_at: Optional[float], issued_at: Optional[float] = None):
+        data = self._read_all()
+        data[key] = {"token": token, "expires_at": expires_at, "issued_at": issued_at}
+        try:
+            self._write_all(data)
+        except Exception as e:
+            # Kesh ishlamasa ham integratsiya to'xtamasligi kerak
+            logger.warning(f"Не удалось сохранить токен в кэш: {e}")
+
+    def invalidate(self, key: str):
+        data = self._read_all()
+        if data.pop(key, None) is not None:
+            try:
+                self._write_all(data)
+            except Exception as e:
+                logger.warning(f"Не удалось очистить кэш токенов: {e}")
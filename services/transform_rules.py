@@ -0,0 +1,99 @@
+import os
+import json
+import fnmatch
+from typing import Callable, Dict, List, Union
+from core.logger import logger
+from services.mapping_cache import load_mapping_file
+
+
+class TransformRule:
+    """
+    Bitta almashtirish qoidasi: qaysi fayllarda (nom shabloni), qaysi element/atribut,
+    qaysi jadval bo'yicha almashtiriladi.
+    """
+
+    def __init__(self, name: str, files: str, attribute: str, mapping: Dict[str, str], element: str = "*"):
+        self.name = name
+        self.files = files.lower()
+        self.element = element or "*"
+        self.attribute = attribute
+        self.mapping = mapping
+
+    def matches_file(self, file_name: str) -> bool:
+        return fnmatch.fnmatch(os.path.basename(file_name).lower(), self.files)
+
+
+class CompiledPlan:
+    """
+    Bitta fayl uchun qoidalar rejasi: element nomi bo'yicha indekslangan,
+    shuning uchun har bir element uchun faqat unga tegishli qoidalar tekshiriladi.
+    Qoidalar soni qancha bo'lmasin, fayl bitta o'tishda qayta ishlanadi.
+    """
+
+    def __init__(self, rules: List[TransformRule]):
+        self.rules = rules
+        self.by_element: Dict[str, list] = {}
+        self.any_element: list = []
+        for rule in rules:
+            entry = (rule.name, rule.attribute, rule.mapping)
+            if rule.element == "*":
+                self.any_element.append(entry)
+            else:
+                self.by_element.setdefault(rule.element, []).append(entry)
+        # Umumiy ("*") qoidalar har bir aniq element ro'yxatiga ham qo'shiladi
+        for entries in self.by_element.values():
+            entries.extend(self.any_element)
+
+    def make_remap(self, hits: Dict[str, int]) -> Callable[[str, dict], int]:
+        """stream_transform uchun remap funksiyasi; har bir qoida bo'yicha hit'lar `hits` ga yoziladi."""
+        by_element, any_element = self.by_element, self.any_element
+
+        def remap(name: str, attrs: dict) -> int:
+            changes = 0
+            for rule_name, attribute, mapping in by_element.get(name, any_element):
+                current = attrs.get(attribute)
+                if current is not None and current in mapping:
+                    attrs[attribute] = mapping[current]
+                    hits[rule_name] += 1
+                    changes += 1
+            return changes
+
+        return remap
+
+
+def _load_mapping(value: Union[str, dict], cache_dir: str = "") -> Dict[str, str]:
+    """Jadval qoidaning ichida (lug'at) yoki alohida JSON fayl yo'li sifatida berilishi mumkin."""
+    if isinstance(value, dict):
+        return {str(k): str(v) for k, v in value.items()}
+    return load_mapping_file(value, cache_dir)
+
+
+def load_rules(rules_file: str, cache_dir: str = "") -> List[TransformRule]:
+    """
+    Qoidalar faylini (JSON) o'qiydi. Format:
+    {"rules": [{"name": "area_id", "files": "Outlets.xml", "element": "*",
+                "attribute": "AREA_ID", "mapping": "data/area_mappings.json"}, ...]}
+    `mapping` - JSON fayl yo'li (joriy papkaga nisbatan) yoki to'g'ridan-to'g'ri lug'at.
+    cache_dir berilsa, fayldagi jadvallar kompilyatsiya qilingan keshdan o'qiladi.
+    Xato bo'lsa, bo'sh ro'yxat qaytadi (transformatsiya o'tkazib yuboriladi).
+    """
+    if not os.path.exists(rules_file):
+        logger.warning(f"Файл правил трансформации не найден: {rules_file}")
+        return []
+
+    try:
+        with open(rules_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        rules = []
+        for i, raw in enumerate(data.get("rules", [])):
+            element = raw.get("element", "*")
+            name = raw.get("name") or f"{element}@{raw['attribute']}"
+            mapping = _load_mapping(raw["mapping"], cache_dir)
+            rules.append(TransformRule(name, raw["files"], raw["attribute"], mapping, element))
+            logger.info(f"Правило трансформации '{name}': {raw['files']} / {element}@{raw['attribute']}, "
+                        f"{len(mapping)} значений.")
+        return rules
+    except Exception as e:
+        logger.error(f"Ошибка при чтении файла правил трансформации: {e}")
+        return []
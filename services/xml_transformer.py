@@ -1,38 +1,387 @@
 import os
-import json
+import re
+import time
+import mmap
+import codecs
+import tempfile
+import xml.sax
 import xml.etree.ElementTree as ET
+from xml.sax.saxutils import XMLGenerator
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Callable, Dict, List, Optional, Union
+from core.config import settings
 from core.logger import logger
+from services.mapping_cache import load_mapping_file
+from services.transform_rules import CompiledPlan, TransformRule, load_rules
+
+
+class _AttributeRewriter(XMLGenerator):
+    """
+    SAX handler: hodisalarni to'g'ridan-to'g'ri chiqish oqimiga yozadi,
+    yo'l-yo'lakay element atributlarini `remap` orqali o'zgartiradi.
+    Butun daraxt xotirada saqlanmaydi - xotira sarfi fayl hajmiga bog'liq emas.
+    """
+
+    def __init__(self, out: BinaryIO, remap: Callable[[str, dict], int]):
+        super().__init__(out, encoding='utf-8', short_empty_elements=True)
+        self.remap = remap
+        self.changes = 0
+
+    def startElement(self, name, attrs):
+        attrs = dict(attrs)
+        if attrs:
+            self.changes += self.remap(name, attrs)
+        super().startElement(name, attrs)
+
+
+def stream_transform(source: Union[str, BinaryIO], out: BinaryIO, remap: Callable[[str, dict], int]) -> int:
+    """
+    XML ni oqim rejimida o'qib, o'zgartirilgan holda `out` ga yozadi.
+    remap(element_nomi, atributlar) atributlarni joyida o'zgartiradi va o'zgarishlar sonini qaytaradi.
+    Qaytadi: jami o'zgarishlar soni.
+    """
+    handler = _AttributeRewriter(out, remap)
+    parser = xml.sax.make_parser()
+    parser.setFeature(xml.sax.handler.feature_external_ges, False)
+    parser.setContentHandler(handler)
+    parser.parse(source)
+    return handler.changes
+
+
+class _ByteSink:
+    """XMLGenerator chiqishi uchun bufer: yozilgan baytlar o'qib olinguncha saqlanadi."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        return len(data)
+
+
+class TransformingReader:
+    """
+    stream_transform ning "tortib olinadigan" varianti: manbadan bo'laklab o'qiydi, SAX parserga
+    (feed) beradi va read() orqali o'zgartirilgan baytlarni qaytaradi. putfo/storbinary uchun fayl-obyekt
+    sifatida ishlatiladi - butun fayl xotirada ham, diskda ham saqlanmaydi.
+    """
+
+    def __init__(self, source: BinaryIO, remap: Callable[[str, dict], int], hits: Dict[str, int] = None,
+                 chunk_size: int = 64 * 1024):
+        self.source = source
+        self.hits = hits if hits is not None else {}
+        self.chunk_size = chunk_size
+        self._sink = _ByteSink()
+        self.handler = _AttributeRewriter(self._sink, remap)
+        self._parser = xml.sax.make_parser()
+        self._parser.setFeature(xml.sax.handler.feature_external_ges, False)
+        self._parser.setContentHandler(self.handler)
+        self._finished = False
+
+    def read(self, size: int = -1) -> bytes:
+        buffer = self._sink.buffer
+        while not self._finished and (size < 0 or len(buffer) < size):
+            chunk = self.source.read(self.chunk_size)
+            if chunk:
+                self._parser.feed(chunk)
+            else:
+                self._parser.close()
+                self._finished = True
+
+        if size < 0 or size >= len(buffer):
+            data = bytes(buffer)
+            buffer.clear()
+        else:
+            data = bytes(buffer[:size])
+            del buffer[:size]
+        return data
+
+    def close(self):
+        self.source.close()
+
+
+class FastPathUnsupported(Exception):
+    """Bayt darajasidagi tezkor yo'l bu faylni xavfsiz qayta ishlay olmaydi (parserga o'tiladi)."""
+    pass
+
+
+# ASCII bilan mos kodirovkalar: teg/atribut belgilarining baytlari har doim bir xil
+_FAST_PATH_ENCODINGS = {"utf-8", "ascii", "latin-1", "iso8859-1", "iso8859-5", "cp1251", "cp1252", "koi8-r", "koi8-u"}
+_XML_DECL_ENCODING_RE = re.compile(rb'^<\?xml[^>]*?encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+
+
+def _fast_path_encoding(head: bytes) -> str:
+    """Fayl boshidan kodirovkani aniqlaydi; xavfsiz bo'lmasa FastPathUnsupported."""
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE, codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE)):
+        raise FastPathUnsupported("UTF-16/32")
+    if head.startswith(codecs.BOM_UTF8):
+        head = head[len(codecs.BOM_UTF8):]
+    if b"<!DOCTYPE" in head:
+        # DTD ichidagi entity'lar atribut qiymatlarini o'zgartirishi mumkin
+        raise FastPathUnsupported("DOCTYPE")
+
+    match = _XML_DECL_ENCODING_RE.match(head.lstrip())
+    encoding = match.group(1).decode('ascii') if match else "utf-8"
+    try:
+        name = codecs.lookup(encoding).name
+    except LookupError:
+        raise FastPathUnsupported(f"неизвестная кодировка {encoding}")
+    if name not in _FAST_PATH_ENCODINGS:
+        raise FastPathUnsupported(f"кодировка {encoding}")
+    return name
+
+
+def bytes_remap(file_path: str, out: BinaryIO, attr_maps: Dict[str, Dict[str, str]]) -> int:
+    """
+    Atribut qiymatlarini to'g'ridan-to'g'ri baytlar ustida almashtiradi (fayl mmap qilinadi).
+    Faqat mos kelgan qiymatlar o'zgaradi, qolgan barcha baytlar (formatlash, e'lon, kodirovka) aynan saqlanadi.
+    attr_maps: {atribut_nomi: {eski_qiymat: yangi_qiymat}}.
+    Xavfsiz bo'lmagan holatlarda FastPathUnsupported ko'tariladi (chaqiruvchi parserga o'tadi).
+    Qaytadi: almashtirishlar soni.
+    """
+    # Izoh, processing instruction va CDATA bloklari butunligicha o'tkazib yuboriladi:
+    # parser ularni atribut deb ko'rmaydi, shuning uchun ulardagi matn ham o'zgarmasligi kerak.
+    # Har bir nom="qiymat" juftligi to'liq o'qiladi (kerakmi-yo'qmi), shunda moslik boshqa
+    # atributning qiymati ichidan (NAME='x AREA_ID="1"') hech qachon boshlanmaydi.
+    token_re = re.compile(
+        rb'<!--.*?-->|<\?.*?\?>|<!\[CDATA\[.*?\]\]>|(?<=\s)([^\s=<>"\'/]+)\s*=\s*(?:"([^"<]*)"|\'([^\'<]*)\')',
+        re.DOTALL
+    )
+
+    with open(file_path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise FastPathUnsupported("пустой файл")
+
+        with mm:
+            encoding = _fast_path_encoding(mm[:4096])
+            changes = 0
+            pos = 0
+
+            for match in token_re.finditer(mm):
+                if match.group(1) is None:
+                    continue
+                mapping = attr_maps.get(match.group(1).decode(encoding, errors="replace"))
+                if mapping is None:
+                    continue
+
+                start = match.start()
+                # Atribut teg ichidami? (oxirgi '<' oxirgi '>' dan keyin bo'lishi kerak)
+                if mm.rfind(b'>', 0, start) > mm.rfind(b'<', 0, start):
+                    raise FastPathUnsupported("атрибут вне тега")
+
+                value_group = 2 if match.group(2) is not None else 3
+                raw_value = match.group(value_group)
+                if b'&' in raw_value:
+                    # Entity'lar bilan yozilgan qiymatni xavfsiz solishtirib bo'lmaydi
+                    raise FastPathUnsupported("сущности в значении атрибута")
+
+                new_value = mapping.get(raw_value.decode(encoding))
+                if new_value is None:
+                    continue
+
+                escaped = new_value.replace('&', '&amp;').replace('<', '&lt;')
+                escaped = escaped.replace('"', '&quot;') if value_group == 2 else escaped.replace("'", '&apos;')
+                try:
+                    new_bytes = escaped.encode(encoding)
+                except UnicodeEncodeError:
+                    raise FastPathUnsupported("значение не кодируется в кодировке файла")
+
+                out.write(mm[pos:match.start(value_group)])
+                out.write(new_bytes)
+                pos = match.end(value_group)
+                changes += 1
+
+            # Qolgan qismni bo'laklab yozamiz
+            while pos < len(mm):
+                out.write(mm[pos:pos + 1024 * 1024])
+                pos += 1024 * 1024
+
+    return changes
 
 
 class XMLTransformer:
     """
     XML fayllarni biznes qoidalar asosida o'zgartiruvchi servis.
-    Hozirda faqat AREA_ID larni almashtirish uchun moslashtirilgan.
+    XML_TRANSFORM_RULES_FILE berilmasa - faqat Outlets.xml dagi AREA_ID almashtiriladi.
     """
 
-    def __init__(self, mapping_file: str = "data/area_mappings.json"):
-        self.mapping_file = mapping_file
-        self.mappings = self._load_mappings()
+    def __init__(self, mapping_file: str = None, rules_file: str = None):
+        # Jadvallar birinchi murojaatda yuklanadi: transformatsiya o'chiq bo'lsa disk umuman o'qilmaydi
+        self._mapping_file = mapping_file
+        self._rules_file = rules_file
+        self._mappings: Optional[dict] = None
+        self._rules: Optional[List[TransformRule]] = None
+        self._plans: Dict[str, Optional[CompiledPlan]] = {}  # {fayl_nomi: reja} - har bir nom uchun bir marta
+
+    @property
+    def mapping_file(self) -> str:
+        return self._mapping_file or settings.XML_AREA_MAPPING_FILE
+
+    @property
+    def rules_file(self) -> str:
+        return self._rules_file if self._rules_file is not None else settings.XML_TRANSFORM_RULES_FILE
+
+    @property
+    def mappings(self) -> dict:
+        if self._mappings is None:
+            self._mappings = self._load_mappings()
+        return self._mappings
+
+    @property
+    def rules(self) -> List[TransformRule]:
+        if self._rules is None:
+            self._rules = load_rules(self.rules_file, settings.XML_MAPPING_CACHE_DIR) if self.rules_file else []
+        return self._rules
 
     def _load_mappings(self) -> dict:
-        """JSON fayldan ID lar lug'atini yuklaydi."""
+        """JSON fayldan ID lar lug'atini yuklaydi (kompilyatsiya qilingan kesh orqali)."""
         if not os.path.exists(self.mapping_file):
             logger.warning(f"Файл маппинга не найден: {self.mapping_file}")
             return {}
 
         try:
-            with open(self.mapping_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                logger.info(f"Маппинг загружен: {len(data)} правил.")
-                return data
+            data = load_mapping_file(self.mapping_file, settings.XML_MAPPING_CACHE_DIR)
+            logger.info(f"Маппинг загружен: {len(data)} правил.")
+            return data
         except Exception as e:
             logger.error(f"Ошибка при чтении файла маппинга: {e}")
             return {}
 
+    def plan_for(self, file_path: str) -> Optional[CompiledPlan]:
+        """Fayl nomiga mos qoidalardan tuzilgan reja (mos qoida bo'lmasa None)."""
+        file_name = os.path.basename(file_path).lower()
+        if file_name not in self._plans:
+            matched = [rule for rule in self.rules if rule.matches_file(file_name)]
+            self._plans[file_name] = CompiledPlan(matched) if matched else None
+        return self._plans[file_name]
+
+    def process_file(self, file_path: str) -> Dict[str, int]:
+        """
+        Faylga mos barcha qoidalarni bitta oqimli o'tishda qo'llaydi.
+        O'zgarish bo'lsa fayl atomar almashtiriladi.
+        Qaytadi: {qoida_nomi: almashtirishlar_soni} (mos qoida bo'lmasa - bo'sh lug'at).
+        """
+        plan = self.plan_for(file_path)
+        if plan is None:
+            return {}
+
+        hits = {rule.name: 0 for rule in plan.rules}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                changes_count = stream_transform(file_path, out, plan.make_remap(hits))
+
+            if changes_count > 0:
+                os.replace(tmp_path, file_path)
+            return hits
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def wants(self, file_name: str) -> bool:
+        """Bu nomdagi fayl transformatsiyaga tushadimi (ZIP dan ochish bosqichida tekshiriladi)."""
+        if self.rules:
+            return self.plan_for(file_name) is not None
+        return os.path.basename(file_name).lower() == "outlets.xml" and bool(self.mappings)
+
+    def transform_stream(self, file_name: str, source: BinaryIO, out: BinaryIO) -> Dict[str, int]:
+        """
+        Oqimdan o'qib, o'zgartirilgan XML ni `out` ga yozadi (fayl tizimiga murojaat yo'q).
+        ZIP a'zolari ochilish paytida shu orqali o'tadi. Har doim SAX (oqimli) dvigatel ishlatiladi.
+        Qaytadi: {qoida_nomi: almashtirishlar_soni}.
+        """
+        if self.rules:
+            plan = self.plan_for(file_name)
+            hits = {rule.name: 0 for rule in plan.rules}
+            stream_transform(source, out, plan.make_remap(hits))
+            return hits
+        return {"AREA_ID": stream_transform(source, out, self._remap_area_id)}
+
+    def open_stream(self, file_name: str, source: BinaryIO) -> TransformingReader:
+        """
+        transform_stream ning o'qiladigan varianti (ZIP dan to'g'ridan-to'g'ri yuklash uchun).
+        Oqim oxirigacha o'qilgach `reader.hits` da {qoida_nomi: almashtirishlar_soni} bo'ladi.
+        """
+        if self.rules:
+            plan = self.plan_for(file_name)
+            hits = {rule.name: 0 for rule in plan.rules}
+            return TransformingReader(source, plan.make_remap(hits), hits)
+
+        hits = {"AREA_ID": 0}
+
+        def remap(name: str, attrs: dict) -> int:
+            changes = self._remap_area_id(name, attrs)
+            hits["AREA_ID"] += changes
+            return changes
+
+        return TransformingReader(source, remap, hits)
+
+    def transform_one(self, file_path: str) -> dict:
+        """
+        Bitta faylni qayta ishlaydi (qoidalar bo'lsa - process_file, aks holda - process_outlets).
+        Xato istisno sifatida emas, natija ichida qaytadi.
+        Qaytadi: {"file", "changed", "hits", "error", "seconds", "bytes_read", "bytes_written"}.
+        """
+        started = time.perf_counter()
+        result = {"file": file_path, "changed": False, "hits": {}, "error": None, "seconds": 0.0,
+                  "bytes_read": 0, "bytes_written": 0}
+        try:
+            result["bytes_read"] = os.path.getsize(file_path)
+            if self.rules:
+                result["hits"] = self.process_file(file_path)
+                result["changed"] = any(result["hits"].values())
+            else:
+                result["changed"] = self.process_outlets(file_path)
+            if result["changed"]:
+                result["bytes_written"] = os.path.getsize(file_path)
+        except Exception as e:
+            result["error"] = str(e)
+        result["seconds"] = time.perf_counter() - started
+        return result
+
+    def transform_files(self, file_paths: List[str], workers: int = 1) -> List[dict]:
+        """
+        Fayllarni jarayonlar puli (ProcessPoolExecutor) da parallel o'zgartiradi.
+        workers=0 - protsessor yadrolari soni; 1 yoki bitta fayl - joriy jarayonda ketma-ket.
+        Natijalar file_paths tartibida qaytadi (har biri transform_one formatida).
+        """
+        workers = workers or os.cpu_count() or 1
+        workers = max(1, min(workers, len(file_paths)))
+        if workers == 1:
+            return [self.transform_one(path) for path in file_paths]
+
+        # Har bir ishchi jarayon o'zining transformer nusxasini yaratadi (jadvallar kesh orqali yuklanadi)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self._mapping_file, self._rules_file)) as pool:
+            futures = [pool.submit(_transform_in_worker, path) for path in file_paths]
+            results = []
+            for path, future in zip(file_paths, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # Ishchi jarayon qulagan bo'lsa ham qolgan fayllar natijasi yo'qolmaydi
+                    results.append({"file": path, "changed": False, "hits": {}, "error": str(e), "seconds": 0.0,
+                                    "bytes_read": 0, "bytes_written": 0})
+            return results
+
+    def _remap_area_id(self, name: str, attrs: dict) -> int:
+        current_id = attrs.get('AREA_ID')
+        if current_id and current_id in self.mappings:
+            attrs['AREA_ID'] = self.mappings[current_id]
+            return 1
+        return 0
+
     def process_outlets(self, file_path: str) -> bool:
         if not self.mappings:
             return False
 
+        if settings.XML_TRANSFORM_ENGINE == "stream":
+            return self._process_outlets_stream(file_path)
+        if settings.XML_TRANSFORM_ENGINE == "bytes":
+            return self._process_outlets_bytes(file_path)
+
         try:
             logger.info(f"Анализ Outlets.xml: {file_path}")
 
@@ -64,6 +413,79 @@ class XMLTransformer:
             logger.error(f"Ошибка трансформации XML: {e}")
             return False
 
+    def _process_outlets_stream(self, file_path: str) -> bool:
+        """
+        Oqimli dvigatel: fayl o'qilishi bilan bir vaqtda vaqtinchalik faylga yoziladi,
+        o'zgarish bo'lsa asl fayl atomar almashtiriladi. Xotira sarfi doimiy.
+        """
+        logger.info(f"Анализ Outlets.xml (потоковый режим): {file_path}")
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                changes_count = stream_transform(file_path, out, self._remap_area_id)
+
+            if changes_count > 0:
+                os.replace(tmp_path, file_path)
+                logger.info(f"✅ Успешно заменено {changes_count} AREA_ID.")
+                return True
+
+            logger.info("ℹ️ AREA_ID для замены не найдены.")
+            return False
+
+        except xml.sax.SAXParseException:
+            logger.error("Ошибка чтения XML-файла (поврежденный формат).")
+            return False
+        except Exception as e:
+            logger.error(f"Ошибка трансформации XML: {e}")
+            return False
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _process_outlets_bytes(self, file_path: str) -> bool:
+        """
+        Tezkor yo'l: AREA_ID qiymatlari xom baytlar ustida almashtiriladi, parse/serialize yo'q.
+        Fayl tezkor yo'l uchun xavfsiz bo'lmasa (UTF-16, DOCTYPE, entity'lar) - oqimli parserga o'tiladi.
+        """
+        logger.info(f"Анализ Outlets.xml (байтовый режим): {file_path}")
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), suffix=".tmp")
+        try:
+            try:
+                with os.fdopen(fd, 'wb') as out:
+                    changes_count = bytes_remap(file_path, out, {'AREA_ID': self.mappings})
+            except FastPathUnsupported as reason:
+                logger.info(f"Байтовый режим неприменим ({reason}), используется потоковый парсер.")
+                return self._process_outlets_stream(file_path)
+
+            if changes_count > 0:
+                os.replace(tmp_path, file_path)
+                logger.info(f"✅ Успешно заменено {changes_count} AREA_ID.")
+                return True
+
+            logger.info("ℹ️ AREA_ID для замены не найдены.")
+            return False
+
+        except Exception as e:
+            logger.error(f"Ошибка трансформации XML: {e}")
+            return False
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+_worker_transformer: Optional[XMLTransformer] = None
+
+
+def _init_worker(mapping_file: Optional[str], rules_file: Optional[str]):
+    global _worker_transformer
+    _worker_transformer = XMLTransformer(mapping_file=mapping_file, rules_file=rules_file)
+
+
+def _transform_in_worker(file_path: str) -> dict:
+    return _worker_transformer.transform_one(file_path)
+
 
 # Singleton
 xml_transformer = XMLTransformer()
\ No newline at end of file
@@ -0,0 +1,269 @@
+"""
+Testlar uchun minimal lokal FTP server (pyftpdlib o'rniga, faqat standart kutubxona).
+Fayllar vaqtinchalik papkaga yoziladi. Passiv (PASV) va aktiv (PORT) rejimlar, STOR/APPE/REST,
+SIZE, NLST, RNFR/RNTO, DELE qo'llab-quvvatlanadi. `drop_after_bytes` berilsa, qabul qilingan baytlar
+shu chegaraga yetganda ulanish bir marta uziladi (tarmoq uzilishini taqlid qilish uchun). Statistika: loginlar soni, bir vaqtdagi eng ko'p
+ma'lumot ulanishlari, yozilgan fayllar ro'yxati.
+"""
+import os
+import socket
+import socketserver
+import threading
+
+
+class _Session(socketserver.StreamRequestHandler):
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode('utf-8'))
+
+    def handle(self):
+        stub = self.server.stub
+        self.cwd = ""
+        self.user = None
+        self.logged_in = False
+        self.pasv_sock = None
+        self.port_addr = None
+        self.rest = 0
+        self.rename_from = None
+        self.dropped = False
+        self.reply("220 stub ftp ready")
+
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode('utf-8').rstrip("\r\n")
+            cmd, _, arg = line.partition(" ")
+            cmd = cmd.upper()
+            stub.commands.append((cmd, arg))
+
+            if self.dropped:
+                return
+            if cmd == "QUIT":
+                self.reply("221 bye")
+                return
+            handler = getattr(self, f"cmd_{cmd}", None)
+            if handler is None:
+                self.reply("502 not implemented")
+            elif cmd not in ("USER", "PASS") and not self.logged_in:
+                self.reply("530 not logged in")
+            else:
+                handler(arg)
+            if self.dropped:
+                return
+
+    def _local(self, name: str) -> str:
+        rel = name.lstrip("/") if name.startswith("/") else os.path.join(self.cwd, name)
+        return os.path.join(self.server.stub.root, os.path.normpath(rel or "."))
+
+    # --- Autentifikatsiya va papkalar ---
+
+    def cmd_USER(self, arg):
+        self.user = arg
+        self.reply("331 password required")
+
+    def cmd_PASS(self, arg):
+        stub = self.server.stub
+        if (self.user, arg) == (stub.username, stub.password):
+            self.logged_in = True
+            with stub.lock:
+                stub.logins += 1
+            self.reply("230 logged in")
+        else:
+            self.reply("530 login incorrect")
+
+    def cmd_TYPE(self, arg):
+        self.reply("200 type set")
+
+    def cmd_NOOP(self, arg):
+        self.reply("200 ok")
+
+    def cmd_PWD(self, arg):
+        self.reply(f'257 "/{self.cwd}"')
+
+    def cmd_CWD(self, arg):
+        path = self._local(arg)
+        if os.path.isdir(path):
+            rel = os.path.relpath(path, self.server.stub.root)
+            self.cwd = "" if rel == "." else rel
+            self.reply("250 ok")
+        else:
+            self.reply("550 no such directory")
+
+    # --- Ma'lumot ulanishi ---
+
+    def cmd_PASV(self, arg):
+        self.pasv_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.pasv_sock.bind(("127.0.0.1", 0))
+        self.pasv_sock.listen(1)
+        port = self.pasv_sock.getsockname()[1]
+        self.port_addr = None
+        self.reply(f"227 Entering Passive Mode (127,0,0,1,{port >> 8},{port & 0xFF})")
+
+    def cmd_PORT(self, arg):
+        parts = [int(x) for x in arg.split(",")]
+        self.port_addr = (".".join(map(str, parts[:4])), (parts[4] << 8) + parts[5])
+        self.pasv_sock = None
+        self.reply("200 port ok")
+
+    def _data_connection(self):
+        if self.pasv_sock is not None:
+            conn, _ = self.pasv_sock.accept()
+            self.pasv_sock.close()
+            self.pasv_sock = None
+            return conn
+        if self.port_addr is not None:
+            return socket.create_connection(self.port_addr)
+        return None
+
+    def _receive(self, arg: str, append: bool):
+        stub = self.server.stub
+        name = os.path.basename(arg)
+        if stub.fail_names.get(name):
+            stub.fail_names[name] -= 1
+            self.reply("550 write failed")
+            return
+
+        offset, self.rest = self.rest, 0
+        conn = self._data_connection()
+        if conn is None:
+            self.reply("425 use PASV or PORT first")
+            return
+        self.reply("150 opening data connection")
+
+        with stub.lock:
+            stub.active += 1
+            stub.max_active = max(stub.max_active, stub.active)
+        received = 0
+        try:
+            path = self._local(arg)
+            with open(path, "ab" if append else ("r+b" if offset else "wb")) as f:
+                if offset:
+                    f.seek(offset)
+                    f.truncate()
+                while True:
+                    data = conn.recv(65536)
+                    if not data:
+                        break
+                    if stub.delay:
+                        threading.Event().wait(stub.delay)
+                    limit = stub.drop_after_bytes
+                    if limit is not None and stub.bytes_received + received + len(data) > limit:
+                        # Tarmoq uzilishi: chegaragacha yoziladi, keyin ikkala ulanish ham yopiladi
+                        f.write(data[:limit - stub.bytes_received - received])
+                        received = limit - stub.bytes_received
+                        stub.drop_after_bytes = None
+                        stub.drops += 1
+                        self.dropped = True
+                        self.connection.shutdown(socket.SHUT_RDWR)
+                        return
+                    f.write(data)
+                    received += len(data)
+        finally:
+            conn.close()
+            with stub.lock:
+                stub.active -= 1
+                stub.bytes_received += received
+        stub.stored.append((name, offset, received, append))
+        self.reply("226 transfer complete")
+
+    def cmd_NLST(self, arg):
+        conn = self._data_connection()
+        if conn is None:
+            self.reply("425 use PASV or PORT first")
+            return
+        self.reply("150 listing")
+        try:
+            names = sorted(os.listdir(self._local(arg or ".")))
+            conn.sendall("".join(f"{name}\r\n" for name in names).encode('utf-8'))
+        finally:
+            conn.close()
+        self.reply("226 listing complete")
+
+    def cmd_STOR(self, arg):
+        self._receive(arg, append=False)
+
+    def cmd_APPE(self, arg):
+        self._receive(arg, append=True)
+
+    def cmd_REST(self, arg):
+        if not self.server.stub.rest_supported:
+            self.reply("502 REST not implemented")
+            return
+        self.rest = int(arg)
+        self.reply(f"350 restarting at {self.rest}")
+
+    # --- Fayl amallari ---
+
+    def cmd_SIZE(self, arg):
+        path = self._local(arg)
+        if os.path.isfile(path):
+            self.reply(f"213 {os.path.getsize(path)}")
+        else:
+            self.reply("550 no such file")
+
+    def cmd_DELE(self, arg):
+        try:
+            os.remove(self._local(arg))
+            self.reply("250 deleted")
+        except OSError:
+            self.reply("550 no such file")
+
+    def cmd_RNFR(self, arg):
+        if os.path.exists(self._local(arg)):
+            self.rename_from = self._local(arg)
+            self.reply("350 ready for RNTO")
+        else:
+            self.reply("550 no such file")
+
+    def cmd_RNTO(self, arg):
+        if self.rename_from is None:
+            self.reply("503 RNFR required")
+            return
+        os.replace(self.rename_from, self._local(arg))
+        self.rename_from = None
+        self.reply("250 renamed")
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class StubFTPServer:
+    """
+    Foydalanish:
+        server = StubFTPServer(root_dir); server.start()
+        ... (server.port ga ulaning, login/parol: "user"/"pass")
+        server.stop()
+    """
+
+    def __init__(self, root: str, username: str = "user", password: str = "pass"):
+        self.root = root
+        self.username = username
+        self.password = password
+        self.lock = threading.Lock()
+        self.commands = []        # [(buyruq, argument)]
+        self.stored = []          # [(fayl_nomi, offset, baytlar, appe_bo'ldimi)]
+        self.fail_names = {}      # {fayl_nomi: necha_marta} - STOR shuncha marta 550 bilan rad etiladi
+        self.rest_supported = True
+        self.drop_after_bytes = None
+        self.bytes_received = 0
+        self.drops = 0
+        self.delay = 0.0          # Har bir qabul qilingan bo'lakdan keyin kutish (parallellikni ko'rish uchun)
+        self.logins = 0
+        self.active = 0
+        self.max_active = 0
+        self._server = None
+        self.port = None
+
+    def start(self):
+        self._server = _Server(("127.0.0.1", 0), _Session)
+        self._server.stub = self
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,212 @@
+"""
+Testlar uchun lokal SFTP server (paramiko asosida).
+Fayllar vaqtinchalik papkaga yoziladi; `drop_after_bytes` berilsa, yozilgan baytlar shu chegaradan
+oshadigan paytda server yozishni to'xtatib, ulanishni uzadi (tarmoq uzilishini taqlid qilish uchun).
+"""
+import os
+import socket
+import threading
+
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface, ServerInterface
+from paramiko.sftp import SFTP_FAILURE, SFTP_OK
+
+
+class _AuthServer(ServerInterface):
+    def __init__(self, stub):
+        self.stub = stub
+        self.transport = None
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        if (username, password) == (self.stub.username, self.stub.password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+
+class _Handle(SFTPHandle):
+    def __init__(self, stub, transport, flags=0):
+        super().__init__(flags)
+        self.stub = stub
+        self.transport = transport
+
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def write(self, offset, data):
+        if not self.stub.accept_write(len(data), self.transport):
+            return SFTP_FAILURE
+        self.stub.writes.append((os.path.basename(self.filename), offset, len(data)))
+        return super().write(offset, data)
+
+
+class _StubSFTPInterface(SFTPServerInterface):
+    def __init__(self, server, stub):
+        super().__init__(server)
+        self.stub = stub
+        self.transport = server.transport
+
+    def _local(self, path):
+        return os.path.join(self.stub.root, self.canonicalize(path).lstrip("/"))
+
+    def open(self, path, flags, attr):
+        local_path = self._local(path)
+        try:
+            fd = os.open(local_path, flags | getattr(os, "O_BINARY", 0), 0o644)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+        fobj = os.fdopen(fd, mode)
+
+        self.stub.opens.append((os.path.basename(local_path), bool(flags & os.O_TRUNC)))
+        handle = _Handle(self.stub, self.transport, flags)
+        handle.filename = local_path
+        handle.readfile = fobj
+        handle.writefile = fobj
+        return handle
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def list_folder(self, path):
+        local_path = self._local(path)
+        try:
+            return [SFTPAttributes.from_stat(os.stat(os.path.join(local_path, name)), name)
+                    for name in os.listdir(local_path)]
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def remove(self, path):
+        try:
+            os.remove(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.rename(self._local(oldpath), self._local(newpath))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        try:
+            os.replace(self._local(oldpath), self._local(newpath))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def chattr(self, path, attr):
+        return SFTP_OK
+
+
+class StubSFTPServer:
+    """
+    Foydalanish:
+        server = StubSFTPServer(root_dir); server.start()
+        ... (server.port ga ulaning, login/parol: "user"/"pass")
+        server.stop()
+    """
+
+    _host_key = None
+
+    def __init__(self, root: str, username: str = "user", password: str = "pass", drop_after_bytes: int = None):
+        self.root = root
+        self.username = username
+        self.password = password
+        self.drop_after_bytes = drop_after_bytes
+        self.bytes_written = 0
+        self.drops = 0
+        self.opens = []   # [(fayl_nomi, truncate_bo'ldimi)]
+        self.writes = []  # [(fayl_nomi, offset, uzunlik)]
+        self._lock = threading.Lock()
+        self._dropped = set()
+        self._transports = []
+        self._sock = None
+        self.port = None
+
+    @classmethod
+    def host_key(cls):
+        if cls._host_key is None:
+            cls._host_key = paramiko.RSAKey.generate(1024)
+        return cls._host_key
+
+    def accept_write(self, size: int, transport) -> bool:
+        """Yozishga ruxsat; chegaradan oshsa ulanish uziladi va bu ulanishdagi keyingi yozuvlar tashlanadi."""
+        with self._lock:
+            if id(transport) in self._dropped:
+                return False
+            if self.drop_after_bytes is not None and self.bytes_written + size > self.drop_after_bytes:
+                # Bir marta uziladi; keyingi ulanishlar odatdagidek ishlaydi
+                self.drop_after_bytes = None
+                self.drops += 1
+                self._dropped.add(id(transport))
+                threading.Thread(target=transport.close, daemon=True).start()
+                return False
+            self.bytes_written += size
+            return True
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(10)
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.host_key())
+            server = _AuthServer(self)
+            server.transport = transport
+            transport.set_subsystem_handler("sftp", SFTPServer, _StubSFTPInterface, stub=self)
+            self._transports.append(transport)
+            try:
+                transport.start_server(server=server)
+            except (paramiko.SSHException, EOFError, OSError):
+                transport.close()
+
+    def stop(self):
+        if self._sock:
+            self._sock.close()
+        for transport in self._transports:
+            transport.close()
@@ -2,13 +2,45 @@ import unittest
 from unittest.mock import patch, Mock
 import sys
 import os
+import io
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from urllib.parse import quote_plus
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
 sys.path.insert(0, project_root)
 os.environ["ENV_FILE_PATH"] = os.path.join(project_root, ".env.borjomi")
 
-from services.baltika_client import BaltikaClient
+from services.baltika_client import BaltikaClient, FormEncodedBody
+
+# Kirill, probel, qator oxiri, '~*+&=%' va XML belgilar - kodlash jadvalining barcha tarmoqlari
+SAMPLE_XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n<Root a="1&amp;2">\r\n'
+    + ''.join(f'<Row NAME="Магазин №{i} ~*+&=%" NOTE="a b\tc/d?e#f"/>' for i in range(300))
+    + '</Root>'
+)
+
+
+def legacy_body(xml_text: str) -> bytes:
+    """Eski yo'l: requests lug'atni o'zi kodlaganda tarmoqqa chiqadigan tana."""
+    prepared = requests.Request('POST', 'http://x', data={"XMLData": xml_text}).prepare()
+    return prepared.body.encode('ascii')
+
+
+class _CaptureHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.server.captured.append((dict(self.headers), self.rfile.read(length)))
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b"OK")
+
+    def log_message(self, *args):
+        pass
 
 
 class TestBaltikaClient(unittest.TestCase):
@@ -17,7 +49,7 @@ class TestBaltikaClient(unittest.TestCase):
         self.client = BaltikaClient()
         self.client.url = "http://fake-baltika-api.com"
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_send_xml_success(self, mock_post):
         """Baltika API ga XML muvaffaqiyatli ketishini tekshirish"""
         mock_response = Mock()
@@ -35,7 +67,7 @@ class TestBaltikaClient(unittest.TestCase):
         kwargs = mock_post.call_args[1]
         self.assertEqual(kwargs['data']['XMLData'], "<Root>Data</Root>")
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_send_xml_failure(self, mock_post):
         """API xato qaytarsa (masalan 500 Error)"""
         mock_response = Mock()
@@ -47,5 +79,59 @@ class TestBaltikaClient(unittest.TestCase):
         self.assertFalse(result)
 
 
+    def test_form_body_matches_requests_encoding(self):
+        """Oqimli tana requests kodlashi bilan bayt-ma-bayt bir xil (turli bo'lak hajmlarida)"""
+        expected = legacy_body(SAMPLE_XML)
+        for chunk_size in (1, 7, 64, 1024 * 1024):
+            for source in (SAMPLE_XML.encode('utf-8'), SAMPLE_XML, io.BytesIO(SAMPLE_XML.encode('utf-8'))):
+                body = FormEncodedBody("XMLData", source, chunk_size=chunk_size)
+                self.assertEqual(len(body), len(expected))
+                self.assertEqual(b"".join(body), expected)
+
+        # read(n) - urllib3 o'qiydigan usul
+        body = FormEncodedBody("XMLData", SAMPLE_XML.encode('utf-8'), chunk_size=100)
+        parts = iter(lambda: body.read(333), b"")
+        self.assertEqual(b"".join(parts), expected)
+        self.assertEqual(FormEncodedBody("XMLData", b"").read(), b"XMLData=")
+
+        # Barcha 256 bayt qiymati (noto'g'ri UTF-8 ham) quote_plus bilan bir xil kodlanadi
+        every_byte = bytes(range(256))
+        self.assertEqual(FormEncodedBody("XMLData", every_byte).read(), b"XMLData=" + quote_plus(every_byte).encode('ascii'))
+
+    def test_streaming_upload_wire_bytes(self):
+        """BALTIKA_STREAMING_UPLOAD: serverga eski yo'l bilan bir xil baytlar va sarlavhalar yetib boradi"""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _CaptureHandler)
+        server.captured = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.client.url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+        tmp_dir = tempfile.mkdtemp()
+        xml_path = os.path.join(tmp_dir, "monolit.xml")
+        with open(xml_path, 'wb') as f:
+            f.write(SAMPLE_XML.encode('utf-8'))
+        try:
+            with patch('services.baltika_client.settings.BALTIKA_STREAMING_UPLOAD', False):
+                self.assertTrue(self.client.send_xml(SAMPLE_XML.encode('utf-8'), "Test_Report"))
+            with patch('services.baltika_client.settings.BALTIKA_STREAMING_UPLOAD', True):
+                self.assertTrue(self.client.send_xml(SAMPLE_XML.encode('utf-8'), "Test_Report"))
+            self.assertTrue(self.client.send_xml_file(xml_path, "Test_Report"))
+            self.assertFalse(self.client.send_xml_file(os.path.join(tmp_dir, "missing.xml"), "Test_Report"))
+        finally:
+            server.shutdown()
+            server.server_close()
+            self.client.session.close()
+            os.remove(xml_path)
+            os.rmdir(tmp_dir)
+
+        self.assertEqual(len(server.captured), 3)
+        (legacy_headers, legacy), *streamed = server.captured
+        self.assertEqual(legacy, legacy_body(SAMPLE_XML))
+        for headers, body in streamed:
+            self.assertEqual(body, legacy)
+            self.assertEqual(headers["Content-Type"], legacy_headers["Content-Type"])
+            self.assertEqual(headers["Content-Length"], legacy_headers["Content-Length"])
+            self.assertNotIn("Transfer-Encoding", headers)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.insert(0, project_root)
+os.environ["ENV_FILE_PATH"] = os.path.join(project_root, ".env.borjomi")
+
+from utils.baltika_outbox import BaltikaOutbox
+
+
+@patch.multiple('utils.baltika_outbox.settings', BALTIKA_OUTBOX_BASE_WAIT=60.0,
+                BALTIKA_OUTBOX_MAX_WAIT=600.0, BALTIKA_OUTBOX_MAX_ATTEMPTS=0)
+class TestBaltikaOutbox(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.outbox = BaltikaOutbox(self.test_dir)
+        self.sent = []
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _sender(self, result=True):
+        def send(path, report_type):
+            with open(path, 'rb') as f:
+                self.sent.append((report_type, f.read()))
+            return result
+        return send
+
+    def test_enqueue_and_drain(self):
+        """Navbatga qo'yilgan hisobot kutish vaqti kelgach yuboriladi va o'chiriladi"""
+        self.outbox.enqueue("$export_balance", b"<xml>1</xml>")
+        self.outbox.enqueue("$export_stock", b"<xml>2</xml>")
+        self.assertEqual([r[1] for r in self.outbox.pending()], ["$export_balance", "$export_stock"])
+
+        # Kutish vaqti hali kelmagan
+        self.assertEqual(self.outbox.drain(self._sender()), (0, 0))
+        self.assertEqual(self.sent, [])
+
+        with patch('utils.baltika_outbox.time.time', return_value=time.time() + 61):
+            self.assertEqual(self.outbox.drain(self._sender()), (2, 0))
+        self.assertEqual(self.sent, [("$export_balance", b"<xml>1</xml>"), ("$export_stock", b"<xml>2</xml>")])
+        self.assertEqual(self.outbox.pending(), [])
+        self.assertEqual(os.listdir(self.outbox.payload_dir), [])
+        print("✅ Baltika navbati (qo'yish va yuborish) testi o'tdi.")
+
+    def test_failure_backoff(self):
+        """Muvaffaqiyatsiz yuborishdan keyin kutish ikki baravar oshadi, birinchi xatoda to'xtaydi"""
+        self.outbox.enqueue("A", b"<a/>")
+        self.outbox.enqueue("B", b"<b/>")
+
+        self.assertEqual(self.outbox.drain(self._sender(False), force=True), (0, 1))
+        self.assertEqual([r[0] for r in self.sent], ["A"])
+        self.assertEqual([(r[1], r[2]) for r in self.outbox.pending()], [("A", 2), ("B", 1)])
+
+        # A endi 120 soniyadan keyin, B esa 60 soniyadan keyin navbatda
+        self.sent.clear()
+        with patch('utils.baltika_outbox.time.time', return_value=time.time() + 90):
+            self.assertEqual(self.outbox.drain(self._sender()), (1, 0))
+        self.assertEqual([r[0] for r in self.sent], ["B"])
+        self.assertEqual(BaltikaOutbox.backoff(10), 600.0)
+        print("✅ Baltika navbati (eksponensial kutish) testi o'tdi.")
+
+    def test_max_attempts_and_lease(self):
+        """Urinishlar tugasa yozuv navbatdan chiqadi; yuborilayotgan yozuvni boshqa drain olmaydi"""
+        self.outbox.enqueue("A", b"<a/>")
+
+        # Birinchi drain yozuvni band qilgan paytda ikkinchisi uni ko'rmaydi
+        def nested_sender(path, report_type):
+            self.assertEqual(BaltikaOutbox(self.test_dir).drain(self._sender()), (0, 0))
+            return False
+
+        with patch('utils.baltika_outbox.time.time', return_value=time.time() + 3600):
+            self.outbox.drain(nested_sender)
+
+        with patch('utils.baltika_outbox.settings.BALTIKA_OUTBOX_MAX_ATTEMPTS', 3):
+            self.assertEqual(self.outbox.drain(self._sender(False), force=True), (0, 1))
+        self.assertEqual(self.outbox.pending(), [])
+        self.assertEqual(self.outbox.drain(self._sender(), force=True), (0, 0))
+        # Fayl qo'lda ko'rib chiqish uchun saqlanadi
+        self.assertEqual(len(os.listdir(self.outbox.payload_dir)), 1)
+        print("✅ Baltika navbati (urinishlar chegarasi) testi o'tdi.")
+
+    def test_force_drain_respects_lease(self):
+        """--force kutish vaqtiga qaramaydi, lekin boshqa drain yuborayotgan yozuvni olmaydi"""
+        self.outbox.enqueue("A", b"<a/>")
+
+        def nested_sender(path, report_type):
+            self.assertEqual(BaltikaOutbox(self.test_dir).drain(self._sender(), force=True), (0, 0))
+            return True
+
+        self.assertEqual(self.outbox.drain(nested_sender, force=True), (1, 0))
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.outbox.pending(), [])
+        print("✅ Baltika navbati (--force va band qilish) testi o'tdi.")
+
+
+if __name__ == '__main__':
+    unittest.main()
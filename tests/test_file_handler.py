@@ -1,4 +1,5 @@
 import unittest
+from unittest.mock import patch
 import os
 import shutil
 import tempfile
@@ -26,6 +27,8 @@ except ImportError:
         print(f"\n❌ XATOLIK: 'file_handler.py' fayli 'utils' papkasida ekanligiga ishonch hosil qiling.")
         raise e
 
+from core.exceptions import InvalidZipFileError, StreamTransformError
+
 
 class TestFileHandler(unittest.TestCase):
 
@@ -48,6 +51,37 @@ class TestFileHandler(unittest.TestCase):
         self.assertIn("backups", file_path)
         print("✅ Backup saqlash testi o'tdi.")
 
+    def test_new_backup_zip_path_unique(self):
+        """Bir xil vaqt belgisida ham har bir chaqiruv alohida (yaratilgan) fayl oladi"""
+        from datetime import datetime
+
+        with patch('utils.file_handler.datetime') as mock_datetime:
+            mock_datetime.now.return_value = datetime(2026, 1, 1, 12, 0, 0)
+            paths = [self.handler.new_backup_zip_path() for _ in range(5)]
+
+        self.assertEqual(len(set(paths)), 5)
+        for path in paths:
+            self.assertTrue(os.path.exists(path))
+        print("✅ Backup fayl nomi noyobligi testi o'tdi.")
+
+    def test_add_stats_thread_safe(self):
+        """Parallel oqimlardan yangilangan hisoblagichlar yo'qolmaydi"""
+        import threading
+
+        def worker():
+            for _ in range(10000):
+                self.handler.add_stats(unzipped=1, disk_written=2)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.handler.stats["unzipped"], 80000)
+        self.assertEqual(self.handler.stats["disk_written"], 160000)
+        print("✅ Hisoblagichlar (parallel) testi o'tdi.")
+
     def test_extract_zip_success(self):
         """ZIP faylni ochish va XML larni topish"""
         zip_buffer = io.BytesIO()
@@ -62,6 +96,160 @@ class TestFileHandler(unittest.TestCase):
         self.assertTrue(xml_files[0].endswith('test_data.xml'))
         print("✅ ZIP Extract testi o'tdi.")
 
+    def test_extract_zip_from_path(self):
+        """Diskdagi ZIP faylni (yo'l orqali) ochish"""
+        zip_path = os.path.join(self.test_dir, "report.zip")
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            zf.writestr('Outlets.xml', '<root/>')
+
+        xml_files = self.handler.extract_zip(zip_path)
+
+        self.assertEqual(len(xml_files), 1)
+        self.assertTrue(os.path.exists(xml_files[0]))
+        print("✅ ZIP Extract (fayl yo'li) testi o'tdi.")
+
+    def test_extract_validated_rejects_corrupt_zip(self):
+        """Bir o'tishli tekshiruv: CRC xato bo'lsa hech qanday fayl qolmaydi"""
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_STORED) as zf:
+            zf.writestr('Outlets.xml', '<root>Outlets</root>')
+            zf.writestr('Sales.xml', '<root>Sales data</root>')
+        zip_content = bytearray(zip_buffer.getvalue())
+
+        # Sales.xml ma'lumotidagi bitta baytni buzamiz (CRC mos kelmaydi)
+        pos = zip_content.index(b'Sales data')
+        zip_content[pos] ^= 0xFF
+
+        with patch('utils.file_handler.settings') as mock_settings:
+            mock_settings.ZIP_VALIDATE_ON_EXTRACT = True
+            with self.assertRaises(InvalidZipFileError):
+                self.handler.extract_zip(bytes(zip_content))
+
+        self.assertEqual(os.listdir(self.handler.temp_dir), [])
+        self.assertEqual([n for n in os.listdir(self.test_dir) if "staging" in n], [])
+        print("✅ Buzilgan CRC (bir o'tishli tekshiruv) testi o'tdi.")
+
+    def test_extract_validated_success(self):
+        """Bir o'tishli tekshiruv: to'g'ri arxiv odatdagidek ochiladi"""
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('sub/Outlets.xml', '<root/>')
+
+        with patch('utils.file_handler.settings') as mock_settings:
+            mock_settings.ZIP_VALIDATE_ON_EXTRACT = True
+            xml_files = self.handler.extract_zip(zip_buffer.getvalue())
+
+        self.assertEqual(len(xml_files), 1)
+        self.assertTrue(os.path.exists(xml_files[0]))
+        print("✅ Bir o'tishli ZIP Extract testi o'tdi.")
+
+    def test_extract_with_transformer(self):
+        """Ochish + transformatsiya bitta oqimda: Outlets.xml o'zgartirilib yoziladi, hisoblagichlar to'ladi"""
+        from services.xml_transformer import XMLTransformer
+
+        mapping_path = os.path.join(self.test_dir, "mapping.json")
+        with open(mapping_path, 'w', encoding='utf-8') as f:
+            f.write('{"101": "202"}')
+        transformer = XMLTransformer(mapping_file=mapping_path, rules_file="")
+
+        outlets = '<Root><Outlet AREA_ID="101"/></Root>'
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('Outlets.xml', outlets)
+            zf.writestr('Sales.xml', '<Root><Sale AREA_ID="101"/></Root>')
+
+        with patch('services.xml_transformer.settings.XML_MAPPING_CACHE_DIR', ""):
+            xml_files = self.handler.extract_zip(zip_buffer.getvalue(), transformer=transformer)
+
+        files = {os.path.basename(p): p for p in xml_files}
+        with open(files["Outlets.xml"], encoding='utf-8') as f:
+            self.assertIn('AREA_ID="202"', f.read())
+        with open(files["Sales.xml"], encoding='utf-8') as f:
+            self.assertIn('AREA_ID="101"', f.read())  # Transformatsiyaga tushmaydigan fayl o'zgarmaydi
+
+        stats = self.handler.stats
+        self.assertEqual(stats["transformed_files"], 1)
+        self.assertEqual(stats["transform_in"], len(outlets))
+        self.assertEqual(stats["unzipped"], len(outlets) + len('<Root><Sale AREA_ID="101"/></Root>'))
+        self.assertEqual(stats["disk_written"], sum(os.path.getsize(p) for p in xml_files))
+        self.assertEqual(stats["transform_disk_read"], 0)
+        # Qoidalar natijasi main.py hisobotiga qaytariladi
+        self.assertEqual(self.handler.transform_results(), [("Outlets.xml", {"AREA_ID": 1})])
+        print("✅ Ochish va transformatsiya (bitta oqim) testi o'tdi.")
+
+    def test_zip_upload_sources(self):
+        """Diskka ochmasdan: a'zolar oqim sifatida o'qiladi, kerakli fayl yo'l-yo'lakay o'zgartiriladi"""
+        from services.xml_transformer import XMLTransformer
+
+        mapping_path = os.path.join(self.test_dir, "mapping.json")
+        with open(mapping_path, 'w', encoding='utf-8') as f:
+            f.write('{"101": "202"}')
+        transformer = XMLTransformer(mapping_file=mapping_path, rules_file="")
+
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('sub/Outlets.xml', '<Root><Outlet AREA_ID="101"/></Root>')
+            zf.writestr('Sales.xml', '<Root><Sale AREA_ID="101"/></Root>')
+            zf.writestr('readme.txt', 'Read me')
+
+        with patch('services.xml_transformer.settings.XML_MAPPING_CACHE_DIR', ""):
+            sources = self.handler.zip_upload_sources(zip_buffer.getvalue(), transformer=transformer)
+            contents = {}
+            for source in sources:
+                with source.open() as stream:
+                    contents[source.name] = stream.read()
+
+            self.assertEqual(sorted(contents), ["Outlets.xml", "Sales.xml"])
+            self.assertIn(b'AREA_ID="202"', contents["Outlets.xml"])
+            self.assertEqual(contents["Sales.xml"], b'<Root><Sale AREA_ID="101"/></Root>')
+            self.assertFalse(os.path.exists(self.handler.temp_dir))
+            self.assertEqual(self.handler.stats["disk_written"], 0)
+            self.assertEqual(self.handler.stats["transformed_files"], 1)
+
+            with sources[0].open() as stream:  # Qayta urinish - oqim boshidan o'qiladi
+                self.assertEqual(stream.read(), contents[sources[0].name])
+            # Qayta yuborilgan manba natijasi takrorlanmaydi
+            self.assertEqual(self.handler.transform_results(), [("Outlets.xml", {"AREA_ID": 1})])
+        print("✅ ZIP dan diskka ochmasdan yuklash manbalari testi o'tdi.")
+
+    def test_zip_upload_source_invalid_xml_aborts(self):
+        """Oqimda transformatsiya xato bersa - StreamTransformError (IOError emas: qayta urinilmaydi)"""
+        from services.xml_transformer import XMLTransformer
+
+        mapping_path = os.path.join(self.test_dir, "mapping.json")
+        with open(mapping_path, 'w', encoding='utf-8') as f:
+            f.write('{"101": "202"}')
+        transformer = XMLTransformer(mapping_file=mapping_path, rules_file="")
+
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w') as zf:
+            zf.writestr('Outlets.xml', '<Root><Outlet AREA_ID="101"><Broken></Root>')
+
+        with patch('services.xml_transformer.settings.XML_MAPPING_CACHE_DIR', ""):
+            source = self.handler.zip_upload_sources(zip_buffer.getvalue(), transformer=transformer)[0]
+            for _ in range(2):  # O'zgartirilmagan holda ham yuborilmaydi
+                with self.assertRaises(StreamTransformError) as cm:
+                    with source.open() as stream:
+                        stream.read()
+                self.assertNotIsInstance(cm.exception, IOError)
+        print("✅ ZIP manbasi (buzilgan XML - yuklash to'xtatiladi) testi o'tdi.")
+
+    def test_zip_upload_sources_rejects_corrupt_zip(self):
+        """ZIP_VALIDATE_ON_EXTRACT: oqim rejimida ham CRC yuklashdan oldin tekshiriladi"""
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_STORED) as zf:
+            zf.writestr('Outlets.xml', '<root>Outlets</root>')
+            zf.writestr('Sales.xml', '<root>Sales data</root>')
+        zip_content = bytearray(zip_buffer.getvalue())
+        zip_content[zip_content.index(b'Sales data')] ^= 0xFF
+
+        with patch('utils.file_handler.settings.ZIP_VALIDATE_ON_EXTRACT', True):
+            with self.assertRaises(InvalidZipFileError):
+                self.handler.zip_upload_sources(bytes(zip_content))
+        with patch('utils.file_handler.settings.ZIP_VALIDATE_ON_EXTRACT', False):
+            self.assertEqual(len(self.handler.zip_upload_sources(bytes(zip_content))), 2)
+        print("✅ ZIP manbalari (buzilgan CRC) testi o'tdi.")
+
     def test_extract_invalid_zip(self):
         """Buzilgan ZIP fayl kelsa"""
         bad_content = b"Men ZIP fayl emasman"
@@ -1,7 +1,11 @@
 import unittest
 from unittest.mock import patch, mock_open
+from ftplib import error_perm
+import io
+import shutil
 import sys
 import os
+import tempfile
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
@@ -18,6 +22,12 @@ try:
 except ImportError:
     from sales_integration.services.ftp_manager import FTPManager
 
+from ftplib import FTP
+from tests.ftp_stub_server import StubFTPServer
+from utils.upload_manifest import staged_file_name
+from utils.upload_source import UploadSource
+from core.exceptions import StreamTransformError
+
 
 class TestFTPManager(unittest.TestCase):
 
@@ -48,15 +58,18 @@ class TestFTPManager(unittest.TestCase):
         mock_ftp.quit.assert_called()
         print("✅ FTP Upload (Oddiy) testi o'tdi.")
 
+    @patch('services.ftp_manager.time.sleep')
     @patch('services.ftp_manager.FTP')
-    def test_connection_error(self, mock_ftp_class):
-        """Ulanish xatosi testi"""
+    def test_connection_error(self, mock_ftp_class, mock_sleep):
+        """Ulanish xatosi testi: qayta urinishlardan keyin False"""
         mock_ftp = mock_ftp_class.return_value
-        mock_ftp.connect.side_effect = Exception("Connection Refused")
+        mock_ftp.connect.side_effect = ConnectionRefusedError("Connection Refused")
 
         result = self.manager.upload_files(["file.xml"])
 
         self.assertFalse(result)
+        self.assertEqual(mock_ftp.connect.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
         print("✅ FTP Connection Error testi o'tdi.")
 
     @patch('services.ftp_manager.FTP')
@@ -73,11 +86,248 @@ class TestFTPManager(unittest.TestCase):
         self.assertTrue(mock_ftp.storbinary.called)
         print("✅ FTP Papka xatosi (Ignore) testi o'tdi.")
 
+    @patch.multiple('services.ftp_manager.settings', UPLOAD_ATOMIC=True)
+    @patch('services.ftp_manager.FTP')
+    def test_atomic_upload(self, mock_ftp_class):
+        """Atomar rejim: STOR vaqtinchalik nomga, oxirida RNFR/RNTO; tayyor staged fayl qayta yuborilmaydi"""
+        mock_ftp = mock_ftp_class.return_value
+
+        with patch('services.ftp_manager.staged_file_name', side_effect=lambda p: f"{os.path.basename(p)}.h.part"), \
+                patch('os.path.getsize', return_value=4), \
+                patch("builtins.open", mock_open(read_data=b"data")):
+            # a.xml allaqachon to'liq staged, b.xml yo'q
+            mock_ftp.size.side_effect = lambda name: 4 if name == "a.xml.h.part" else (_ for _ in ()).throw(
+                error_perm("550 No such file"))
+            result = self.manager.upload_files(["/tmp/a.xml", "/tmp/b.xml"])
+
+        self.assertTrue(result)
+        stored = [c.args[0] for c in mock_ftp.storbinary.call_args_list]
+        self.assertEqual(stored, ["STOR b.xml.h.part"])
+        renames = [c.args for c in mock_ftp.rename.call_args_list]
+        self.assertEqual(renames, [("a.xml.h.part", "a.xml"), ("b.xml.h.part", "b.xml")])
+        print("✅ FTP atomar yuklash testi o'tdi.")
+
+    @patch.multiple('services.ftp_manager.settings', UPLOAD_ATOMIC=True, UPLOAD_TEMP_SUFFIX=".part")
+    @patch('services.ftp_manager.FTP')
+    def test_upload_stream_source(self, mock_ftp_class):
+        """Oqim manbasi: fayl ochilmaydi, STOR manbaning oqimidan o'qiydi; atomar nom shu ishga tushirish uchun noyob"""
+        mock_ftp = mock_ftp_class.return_value
+        sent = []
+        mock_ftp.storbinary.side_effect = lambda cmd, fp, blocksize=8192, callback=None: sent.append((cmd, fp.read()))
+
+        source = UploadSource("Sales.xml", lambda: io.BytesIO(b"<Root/>"))
+        result = self.manager.upload_files([source])
+
+        self.assertTrue(result)
+        mock_ftp.size.assert_not_called()
+        self.assertEqual(len(sent), 1)
+        self.assertRegex(sent[0][0], r"^STOR Sales\.xml\.[0-9a-f]{16}\.part$")
+        self.assertEqual(sent[0][1], b"<Root/>")
+        mock_ftp.rename.assert_called_once_with(sent[0][0][len("STOR "):], "Sales.xml")
+        print("✅ FTP oqim manbasini yuklash testi o'tdi.")
+
     def test_empty_files(self):
         result = self.manager.upload_files([])
         self.assertFalse(result)
         print("✅ FTP Bo'sh ro'yxat testi o'tdi.")
 
 
+class TestFTPManagerParallel(unittest.TestCase):
+    """Lokal FTP server bilan: parallel ulanishlar, blok hajmi, passiv/aktiv rejim"""
+
+    def setUp(self):
+        self.remote_root = tempfile.mkdtemp()
+        self.local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.remote_root)
+        self.addCleanup(shutil.rmtree, self.local_dir)
+        os.makedirs(os.path.join(self.remote_root, "Import"))
+
+        self.paths = []
+        for i, size in enumerate([5, 300, 40, 120]):
+            self.paths.append(os.path.join(self.local_dir, f"file_{i}.xml"))
+            with open(self.paths[-1], 'wb') as f:
+                f.write(os.urandom(size * 1024))
+
+        self.server = StubFTPServer(self.remote_root)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+        self.manager = FTPManager()
+        self.manager.host = "127.0.0.1"
+        self.manager.port = self.server.port
+        self.manager.username = "user"
+        self.manager.password = "pass"
+        self.manager.remote_path = "/Import"
+
+    def _assert_remote_equals_local(self):
+        for path in self.paths:
+            with open(path, 'rb') as local, open(os.path.join(self.remote_root, "Import", os.path.basename(path)), 'rb') as remote:
+                self.assertEqual(local.read(), remote.read())
+
+    @patch.multiple('services.ftp_manager.settings',
+                    FTP_PARALLEL_CONNECTIONS=3, FTP_BLOCK_SIZE=64 * 1024, FTP_PASSIVE=True, UPLOAD_ATOMIC=False)
+    def test_parallel_connections(self):
+        """3 ta ulanish bitta navbatdan oladi: fayllar bir vaqtda yuboriladi, eng kattasi birinchi"""
+        self.server.delay = 0.01
+
+        self.assertTrue(self.manager.upload_files(self.paths))
+
+        self._assert_remote_equals_local()
+        self.assertEqual(self.server.logins, 3)
+        self.assertGreater(self.server.max_active, 1)
+        # Eng kichik fayl navbatda oxirgi: uni faqat bo'shagan ulanish oladi
+        stor_order = [arg for cmd, arg in self.server.commands if cmd == "STOR"]
+        self.assertEqual(stor_order[-1], "file_0.xml")
+        self.assertIn(("PASV", ""), self.server.commands)
+        print("✅ FTP parallel ulanishlar testi o'tdi.")
+
+    @patch.multiple('services.ftp_manager.settings',
+                    FTP_PARALLEL_CONNECTIONS=1, FTP_BLOCK_SIZE=8192, FTP_PASSIVE=True, UPLOAD_ATOMIC=True,
+                    UPLOAD_TEMP_SUFFIX=".tmp.part")
+    def test_atomic_removes_stale_staged(self):
+        """Atomar rejim: oldingi ishga tushirishlardan qolgan vaqtinchalik fayllar nashrdan oldin o'chiriladi"""
+        import_dir = os.path.join(self.remote_root, "Import")
+        leftovers = ["file_1.xml.0123456789abcdef.tmp.part", "file_2.xml.fedcba9876543210.tmp.part"]
+        for name in leftovers + ["other.xml.0123456789abcdef.tmp.part", "file_3.xml.bak"]:
+            with open(os.path.join(import_dir, name), 'wb') as f:
+                f.write(b"eski")
+
+        self.assertTrue(self.manager.upload_files(self.paths))
+
+        self._assert_remote_equals_local()
+        self.assertEqual(sorted(os.listdir(import_dir)),
+                         sorted([os.path.basename(p) for p in self.paths]
+                                + ["file_3.xml.bak", "other.xml.0123456789abcdef.tmp.part"]))
+        deleted = [arg for cmd, arg in self.server.commands if cmd == "DELE"]
+        self.assertEqual(sorted(deleted), leftovers)
+        print("✅ FTP eskirgan vaqtinchalik fayllarni tozalash testi o'tdi.")
+
+    @patch('services.ftp_manager.time.sleep')
+    @patch.multiple('services.ftp_manager.settings',
+                    FTP_PARALLEL_CONNECTIONS=1, FTP_BLOCK_SIZE=8192, FTP_PASSIVE=True, UPLOAD_ATOMIC=False)
+    def test_stream_transform_error_not_retried(self, mock_sleep):
+        """Oqimdagi transformatsiya xatosi: qayta urinish yo'q, qisman yozilgan fayl serverdan o'chiriladi"""
+
+        class BrokenReader(io.BytesIO):
+            def read(self, size=-1):
+                if self.tell():
+                    raise StreamTransformError("Ошибка трансформации Outlets.xml")
+                return super().read(1000)
+
+        source = UploadSource("Outlets.xml", lambda: BrokenReader(b"<Root>" + b"x" * 5000), 5006)
+        self.assertFalse(self.manager.upload_files(self.paths[:1] + [source]))
+
+        mock_sleep.assert_not_called()
+        self.assertEqual(os.listdir(os.path.join(self.remote_root, "Import")), ["file_0.xml"])
+        self.assertIn(("DELE", "Outlets.xml"), self.server.commands)
+        print("✅ FTP oqim transformatsiya xatosi (qayta urinishsiz) testi o'tdi.")
+
+    @patch('services.ftp_manager.time.sleep')
+    @patch.multiple('services.ftp_manager.settings',
+                    FTP_PARALLEL_CONNECTIONS=2, FTP_BLOCK_SIZE=8192, FTP_PASSIVE=True, UPLOAD_ATOMIC=True,
+                    UPLOAD_TEMP_SUFFIX=".part")
+    def test_parallel_all_or_nothing(self, mock_sleep):
+        """Bitta fayl har safar rad etilsa natija False, atomar rejimda hech narsa nashr qilinmaydi"""
+        self.server.fail_names[staged_file_name(self.paths[2])] = 3
+
+        self.assertFalse(self.manager.upload_files(self.paths))
+
+        published = [n for n in os.listdir(os.path.join(self.remote_root, "Import")) if n.endswith(".xml")]
+        self.assertEqual(published, [])
+        self.assertNotIn("RNFR", [cmd for cmd, _ in self.server.commands])
+        # Qayta urinishlarda faqat rad etilgan fayl yuboriladi
+        stored = [name for name, _, _, _ in self.server.stored]
+        self.assertEqual(sorted(stored), sorted(staged_file_name(p) for p in self.paths if p != self.paths[2]))
+        self.assertEqual(mock_sleep.call_count, 2)
+        print("✅ FTP parallel (hammasi yoki hech narsa) testi o'tdi.")
+
+    @patch.multiple('services.ftp_manager.settings',
+                    FTP_PARALLEL_CONNECTIONS=1, FTP_BLOCK_SIZE=32 * 1024, FTP_PASSIVE=False, UPLOAD_ATOMIC=False)
+    def test_active_mode_block_size(self):
+        """Aktiv rejim (PORT) va sozlangan blok hajmi"""
+        with patch.object(FTP, 'storbinary', autospec=True, side_effect=FTP.storbinary) as spy:
+            self.assertTrue(self.manager.upload_files(self.paths))
+
+        self._assert_remote_equals_local()
+        self.assertTrue(all(c.kwargs["blocksize"] == 32 * 1024 for c in spy.call_args_list))
+        commands = [cmd for cmd, _ in self.server.commands]
+        self.assertIn("PORT", commands)
+        self.assertNotIn("PASV", commands)
+        print("✅ FTP aktiv rejim va blok hajmi testi o'tdi.")
+
+
+    @patch('services.ftp_manager.time.sleep')
+    @patch.multiple('services.ftp_manager.settings', FTP_PARALLEL_CONNECTIONS=1, UPLOAD_ATOMIC=False)
+    def test_retry_sends_only_failed(self, mock_sleep):
+        """Vaqtinchalik xato: qayta ulanib faqat yuborilmagan fayllar yuboriladi"""
+        self.server.fail_names["file_2.xml"] = 1
+
+        self.assertTrue(self.manager.upload_files(self.paths))
+
+        self._assert_remote_equals_local()
+        self.assertEqual([name for name, _, _, _ in self.server.stored],
+                         ["file_0.xml", "file_1.xml", "file_2.xml", "file_3.xml"])
+        self.assertEqual(self.server.logins, 2)
+        self.assertEqual(mock_sleep.call_count, 1)
+        print("✅ FTP qayta urinish (faqat xato fayllar) testi o'tdi.")
+
+    @patch('services.ftp_manager.time.sleep')
+    @patch.multiple('services.ftp_manager.settings', FTP_PARALLEL_CONNECTIONS=1, UPLOAD_ATOMIC=False)
+    def test_stale_remote_file_not_trusted(self, mock_sleep):
+        """STOR gacha yetmagan fayl uchun serverdagi eski fayl tasdiq yoki REST/APPE nuqtasi bo'lmaydi"""
+        import_dir = os.path.join(self.remote_root, "Import")
+        # Oldingi ishga tushirishdan: file_1 aynan shu hajmda, file_2 kichikroq (boshqa kontent)
+        with open(os.path.join(import_dir, "file_1.xml"), 'wb') as f:
+            f.write(b"e" * os.path.getsize(self.paths[1]))
+        with open(os.path.join(import_dir, "file_2.xml"), 'wb') as f:
+            f.write(b"e" * 1024)
+        self.server.fail_names["file_1.xml"] = 1  # 1-urinish: STOR rad etiladi, hech narsa yozilmaydi
+        self.server.fail_names["file_2.xml"] = 1  # 2-urinish: xuddi shunday
+
+        self.assertTrue(self.manager.upload_files(self.paths))
+
+        self._assert_remote_equals_local()
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual([(name, offset, append) for name, offset, _, append in self.server.stored],
+                         [("file_0.xml", 0, False), ("file_1.xml", 0, False),
+                          ("file_2.xml", 0, False), ("file_3.xml", 0, False)])
+        self.assertNotIn("REST", [cmd for cmd, _ in self.server.commands])
+        print("✅ FTP eskirgan serverdagi faylga ishonmaslik testi o'tdi.")
+
+    def _upload_with_disconnect(self):
+        # file_0 (5 KB) va file_1 (300 KB) to'liq, file_2 ning 20 KB idan keyin ulanish uziladi
+        self.server.drop_after_bytes = (5 + 300 + 20) * 1024
+        with patch('services.ftp_manager.time.sleep') as mock_sleep:
+            self.assertTrue(self.manager.upload_files(self.paths))
+        self.assertEqual(self.server.drops, 1)
+        self.assertEqual(mock_sleep.call_count, 1)
+        self._assert_remote_equals_local()
+
+        names = [name for name, _, _, _ in self.server.stored]
+        self.assertEqual(names, ["file_0.xml", "file_1.xml", "file_2.xml", "file_3.xml"])
+        self.assertEqual(self.server.bytes_received, sum(os.path.getsize(p) for p in self.paths))
+        return {name: (offset, append) for name, offset, _, append in self.server.stored}
+
+    @patch.multiple('services.ftp_manager.settings', FTP_PARALLEL_CONNECTIONS=1, FTP_BLOCK_SIZE=8192,
+                    UPLOAD_ATOMIC=False)
+    def test_resume_with_rest(self):
+        """Uzilgan fayl SIZE bo'yicha REST+STOR bilan davom ettiriladi, tayyor fayllar qayta yuborilmaydi"""
+        transfers = self._upload_with_disconnect()
+        self.assertEqual(transfers["file_2.xml"], (20 * 1024, False))
+        self.assertEqual(transfers["file_3.xml"], (0, False))
+        self.assertIn(("REST", str(20 * 1024)), self.server.commands)
+        print("✅ FTP uzilishdan keyin REST bilan davom ettirish testi o'tdi.")
+
+    @patch.multiple('services.ftp_manager.settings', FTP_PARALLEL_CONNECTIONS=1, FTP_BLOCK_SIZE=8192,
+                    UPLOAD_ATOMIC=False)
+    def test_resume_with_appe_fallback(self):
+        """Server REST ni qo'llamasa uzilgan fayl APPE bilan davom ettiriladi"""
+        self.server.rest_supported = False
+        transfers = self._upload_with_disconnect()
+        self.assertEqual(transfers["file_2.xml"], (0, True))
+        self.assertFalse(self.manager.rest_supported)
+        print("✅ FTP uzilishdan keyin APPE bilan davom ettirish testi o'tdi.")
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
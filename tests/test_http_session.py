@@ -0,0 +1,58 @@
+import unittest
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.insert(0, project_root)
+os.environ["ENV_FILE_PATH"] = os.path.join(project_root, ".env.borjomi")
+
+from services.http_session import create_session, get_pool_stats
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        body = b"OK"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpSession(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reused(self):
+        """Ketma-ket so'rovlar bitta keep-alive ulanish orqali ketadi"""
+        session = create_session()
+        for _ in range(3):
+            response = session.post(self.url, json={"a": 1}, timeout=5)
+            self.assertEqual(response.status_code, 200)
+
+        stats = get_pool_stats(session)
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["connections"], 1)
+        self.assertEqual(stats["reused"], 2)
+        session.close()
+        print("✅ HTTP keep-alive (ulanishni qayta ishlatish) testi o'tdi.")
+
+
+if __name__ == '__main__':
+    unittest.main()
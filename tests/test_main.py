@@ -2,6 +2,7 @@ import unittest
 from unittest.mock import patch
 import sys
 import os
+from datetime import datetime
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
@@ -30,6 +31,13 @@ class TestMainIntegration(unittest.TestCase):
         mock_settings.get_template_ids = [902]
         mock_settings.ENABLE_MONOLIT_REPORT = False
         mock_settings.PROTOCOL = "SFTP"
+        mock_settings.SALESWORK_DOWNLOAD_TO_DISK = False
+        mock_settings.SALESWORK_DOWNLOAD_WORKERS = 1
+        mock_settings.SALESWORK_INCREMENTAL = False
+        mock_settings.SALESWORK_SPLIT_PARTS = 1
+        mock_settings.UPLOAD_SKIP_UNCHANGED = False
+        mock_settings.UPLOAD_STREAM_FROM_ZIP = False
+        mock_smartup.get_sales_period.return_value = (datetime(2026, 1, 1), datetime(2026, 3, 31))
 
         mock_smartup.download_sales_report.return_value = b"zip_bytes"
         mock_file_handler.extract_zip.return_value = ["outlets.xml"]
@@ -44,6 +52,162 @@ class TestMainIntegration(unittest.TestCase):
         mock_baltika.send_xml.assert_not_called()
         mock_mail.send_report.assert_called()
 
+    @patch('main.settings')
+    @patch('main.smartup_client')
+    @patch('main.file_handler')
+    @patch('main.sftp_manager')
+    @patch('main.mail_service')
+    @patch('main.xml_transformer')
+    @patch('main.baltika_client')
+    def test_run_integration_saleswork_to_disk(self, mock_baltika, mock_transformer, mock_mail, mock_sftp, mock_file_handler, mock_smartup, mock_settings):
+        """Disk rejimi: ZIP backup faylga yoziladi va fayl yo'li orqali ochiladi"""
+        mock_settings.COMPANY_NAME = "TestCompany"
+        mock_settings.get_template_ids = [902]
+        mock_settings.ENABLE_MONOLIT_REPORT = False
+        mock_settings.ENABLE_XML_TRANSFORMATION = False
+        mock_settings.PROTOCOL = "SFTP"
+        mock_settings.SALESWORK_DOWNLOAD_TO_DISK = True
+        mock_settings.SALESWORK_DOWNLOAD_WORKERS = 1
+        mock_settings.SALESWORK_INCREMENTAL = False
+        mock_settings.SALESWORK_SPLIT_PARTS = 1
+        mock_settings.UPLOAD_SKIP_UNCHANGED = False
+        mock_settings.UPLOAD_STREAM_FROM_ZIP = False
+        mock_smartup.get_sales_period.return_value = (datetime(2026, 1, 1), datetime(2026, 3, 31))
+
+        mock_file_handler.new_backup_zip_path.return_value = "/tmp/backups/report.zip"
+        mock_smartup.download_sales_report_to_file.return_value = "/tmp/backups/report.zip"
+        mock_file_handler.extract_zip.return_value = ["Sales.xml"]
+        mock_sftp.upload_files.return_value = True
+
+        with patch('os.remove'), patch('os.path.exists', return_value=True):
+            run_integration("saleswork")
+
+        mock_smartup.download_sales_report.assert_not_called()
+        mock_file_handler.save_zip_to_backup.assert_not_called()
+        mock_file_handler.extract_zip.assert_called_once_with("/tmp/backups/report.zip")
+        mock_sftp.upload_files.assert_called_once_with(["Sales.xml"])
+
+    @patch('main.settings')
+    @patch('main.smartup_client')
+    @patch('main.file_handler')
+    @patch('main.sftp_manager')
+    @patch('main.mail_service')
+    @patch('main.xml_transformer')
+    @patch('main.baltika_client')
+    def test_run_integration_saleswork_parallel(self, mock_baltika, mock_transformer, mock_mail, mock_sftp, mock_file_handler, mock_smartup, mock_settings):
+        """Parallel yuklash: bitta shablon xatosi qolganlarini to'xtatmaydi"""
+        mock_settings.COMPANY_NAME = "TestCompany"
+        mock_settings.get_template_ids = [901, 902, 903]
+        mock_settings.ENABLE_MONOLIT_REPORT = False
+        mock_settings.ENABLE_XML_TRANSFORMATION = False
+        mock_settings.PROTOCOL = "SFTP"
+        mock_settings.SALESWORK_DOWNLOAD_TO_DISK = False
+        mock_settings.SALESWORK_DOWNLOAD_WORKERS = 4
+        mock_settings.SALESWORK_INCREMENTAL = False
+        mock_settings.SALESWORK_SPLIT_PARTS = 1
+        mock_settings.UPLOAD_SKIP_UNCHANGED = False
+        mock_settings.UPLOAD_STREAM_FROM_ZIP = False
+        mock_smartup.get_sales_period.return_value = (datetime(2026, 1, 1), datetime(2026, 3, 31))
+
+        def fake_download(template_id, begin_date, end_date):
+            if template_id == 902:
+                raise Exception("Timeout")
+            return f"zip_{template_id}".encode()
+
+        mock_smartup.download_sales_report.side_effect = fake_download
+        mock_file_handler.extract_zip.side_effect = lambda content: [f"{content.decode()}.xml"]
+        mock_sftp.upload_files.return_value = True
+
+        with patch('os.remove'), patch('os.path.exists', return_value=True):
+            run_integration("saleswork")
+
+        self.assertEqual(mock_smartup.download_sales_report.call_count, 3)
+        uploaded = mock_sftp.upload_files.call_args[0][0]
+        self.assertEqual(sorted(uploaded), ["zip_901.xml", "zip_903.xml"])
+
+        # Xato shablon haqida xabar email logiga tushishi kerak
+        logs = mock_mail.send_report.call_args[1]['logs']
+        self.assertTrue(any("902" in line and "Timeout" in line for line in logs))
+
+    @patch('main.upload_manifest')
+    @patch('main.settings')
+    @patch('main.smartup_client')
+    @patch('main.file_handler')
+    @patch('main.sftp_manager')
+    @patch('main.mail_service')
+    @patch('main.xml_transformer')
+    @patch('main.baltika_client')
+    def test_run_integration_skip_unchanged(self, mock_baltika, mock_transformer, mock_mail, mock_sftp, mock_file_handler, mock_smartup, mock_settings, mock_manifest):
+        """Manifest: faqat o'zgargan fayllar yuboriladi, sonlar email logida ko'rinadi"""
+        mock_settings.COMPANY_NAME = "TestCompany"
+        mock_settings.get_template_ids = [902]
+        mock_settings.ENABLE_MONOLIT_REPORT = False
+        mock_settings.ENABLE_XML_TRANSFORMATION = False
+        mock_settings.PROTOCOL = "SFTP"
+        mock_settings.SALESWORK_DOWNLOAD_TO_DISK = False
+        mock_settings.SALESWORK_DOWNLOAD_WORKERS = 1
+        mock_settings.SALESWORK_INCREMENTAL = False
+        mock_settings.SALESWORK_SPLIT_PARTS = 1
+        mock_settings.UPLOAD_SKIP_UNCHANGED = True
+        mock_settings.UPLOAD_STREAM_FROM_ZIP = False
+        mock_smartup.get_sales_period.return_value = (datetime(2026, 1, 1), datetime(2026, 3, 31))
+
+        mock_file_handler.extract_zip.return_value = ["Sales.xml", "Outlets.xml"]
+        mock_manifest.filter_changed.return_value = (["Sales.xml"], ["Outlets.xml"], {"Sales.xml": "h1", "Outlets.xml": "h2"})
+        mock_sftp.upload_files.return_value = True
+
+        with patch('os.remove'), patch('os.path.exists', return_value=True):
+            run_integration("saleswork")
+
+        mock_sftp.upload_files.assert_called_once_with(["Sales.xml"])
+        mock_manifest.record.assert_called_once()
+        self.assertEqual(mock_manifest.record.call_args[0][2], {"Sales.xml": "h1"})
+        logs = mock_mail.send_report.call_args[1]['logs']
+        self.assertTrue(any("к отправке 1" in line and "пропущено без изменений 1" in line for line in logs))
+
+    @patch('main.settings')
+    @patch('main.smartup_client')
+    @patch('main.file_handler')
+    @patch('main.sftp_manager')
+    @patch('main.mail_service')
+    @patch('main.xml_transformer')
+    @patch('main.baltika_client')
+    def test_run_integration_stream_from_zip(self, mock_baltika, mock_transformer, mock_mail, mock_sftp, mock_file_handler, mock_smartup, mock_settings):
+        """Diskka ochmasdan yuklash: ZIP a'zolari manba sifatida to'g'ridan-to'g'ri SFTP ga beriladi"""
+        from utils.upload_source import UploadSource
+
+        mock_settings.COMPANY_NAME = "TestCompany"
+        mock_settings.get_template_ids = [902]
+        mock_settings.ENABLE_MONOLIT_REPORT = False
+        mock_settings.ENABLE_XML_TRANSFORMATION = True
+        mock_settings.PROTOCOL = "SFTP"
+        mock_settings.SALESWORK_DOWNLOAD_TO_DISK = False
+        mock_settings.SALESWORK_DOWNLOAD_WORKERS = 1
+        mock_settings.SALESWORK_INCREMENTAL = False
+        mock_settings.SALESWORK_SPLIT_PARTS = 1
+        mock_settings.UPLOAD_SKIP_UNCHANGED = False
+        mock_settings.UPLOAD_STREAM_FROM_ZIP = True
+        mock_smartup.get_sales_period.return_value = (datetime(2026, 1, 1), datetime(2026, 3, 31))
+
+        sources = [UploadSource("Sales.xml", lambda: None), UploadSource("Outlets.xml", lambda: None)]
+        mock_smartup.download_sales_report.return_value = b"zip_bytes"
+        mock_file_handler.zip_upload_sources.return_value = sources
+        mock_file_handler.transform_results.return_value = [("Outlets.xml", {"AREA_ID": 2})]
+        mock_sftp.upload_files.return_value = True
+
+        with patch('os.remove'), patch('os.path.exists', return_value=True):
+            run_integration("saleswork")
+
+        mock_file_handler.zip_upload_sources.assert_called_once_with(b"zip_bytes", transformer=mock_transformer)
+        mock_file_handler.extract_zip.assert_not_called()
+        mock_transformer.transform_files.assert_not_called()
+        uploaded = mock_sftp.upload_files.call_args[0][0]
+        self.assertEqual(sorted(s.name for s in uploaded), ["Outlets.xml", "Sales.xml"])
+        # Yuborish paytidagi qoidalar natijasi hisobot xatiga tushadi
+        logs = mock_mail.send_report.call_args[1]['logs']
+        self.assertTrue(any("Outlets.xml обновлен (AREA_ID: 2)" in line for line in logs))
+        self.assertTrue(any("Правило 'AREA_ID': заменено 2." in line for line in logs))
+
     @patch('main.settings')
     @patch('main.smartup_client')
     @patch('main.file_handler')
@@ -56,6 +220,7 @@ class TestMainIntegration(unittest.TestCase):
         mock_settings.get_template_ids = []
         mock_settings.ENABLE_MONOLIT_REPORT = True
         mock_settings.get_monolit_report_types = ["$export_balance"]
+        mock_settings.BALTIKA_OUTBOX_ENABLED = False
 
         mock_smartup.download_monolit_report.return_value = b"<xml>data</xml>"
         mock_file_handler.save_monolit_to_backup.return_value = "/tmp/backup.xml"
@@ -69,5 +234,31 @@ class TestMainIntegration(unittest.TestCase):
         mock_sftp.upload_files.assert_not_called()
         mock_mail.send_report.assert_called()
 
+    @patch('main.settings')
+    @patch('main.smartup_client')
+    @patch('main.file_handler')
+    @patch('main.mail_service')
+    @patch('main.baltika_client')
+    @patch('main.baltika_outbox')
+    def test_run_integration_monolit_outbox(self, mock_outbox, mock_baltika, mock_mail, mock_file_handler, mock_smartup, mock_settings):
+        """Yuborilmagan Monolit navbatga qo'yiladi, oldingi navbat esa yangi hisobotlardan oldin yuboriladi"""
+        mock_settings.COMPANY_NAME = "TestCompany"
+        mock_settings.get_template_ids = []
+        mock_settings.ENABLE_MONOLIT_REPORT = True
+        mock_settings.get_monolit_report_types = ["$export_balance"]
+        mock_settings.BALTIKA_OUTBOX_ENABLED = True
+
+        mock_outbox.drain.return_value = (1, 0)
+        mock_smartup.download_monolit_report.return_value = b"<xml>data</xml>"
+        mock_file_handler.save_monolit_to_backup.return_value = "/tmp/backup.xml"
+        mock_baltika.send_xml.return_value = False
+
+        with patch('os.remove'), patch('os.path.exists', return_value=True):
+            run_integration("monolit")
+
+        mock_outbox.drain.assert_called_once_with(mock_baltika.send_xml_file)
+        mock_outbox.enqueue.assert_called_once_with("$export_balance", b"<xml>data</xml>", error="Отправка не удалась")
+        print("✅ Monolit navbati (main) testi o'tdi.")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,108 @@
+import unittest
+import os
+import sys
+import io
+import shutil
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.insert(0, project_root)
+os.environ["ENV_FILE_PATH"] = os.path.join(project_root, ".env.borjomi")
+
+from services.range_splitter import extract_and_merge, merge_xml_files, split_date_range
+from utils.file_handler import FileHandler
+
+
+class TestRangeSplitter(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_split_date_range(self):
+        """Davr kesishmaydigan va bo'shliqsiz bo'laklarga bo'linadi"""
+        begin, end = datetime(2026, 1, 1), datetime(2026, 3, 31)  # 90 kun
+        ranges = split_date_range(begin, end, 4)
+
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(ranges[0][0], begin)
+        self.assertEqual(ranges[-1][1], end)
+        for (_, prev_end), (next_begin, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(next_begin - prev_end, timedelta(days=1))
+
+        # Kunlardan ko'p bo'lak so'ralsa - har kun alohida
+        self.assertEqual(len(split_date_range(begin, begin + timedelta(days=1), 5)), 2)
+        print("✅ Davrni bo'lish testi o'tdi.")
+
+    def test_merge_deduplicates_across_parts(self):
+        """Bir nechta bo'lakda uchragan entity bir marta, bo'lak ichidagi takrorlar esa saqlanadi"""
+        part1 = os.path.join(self.test_dir, "p1.xml")
+        part2 = os.path.join(self.test_dir, "p2.xml")
+        with open(part1, 'w', encoding='utf-8') as f:
+            f.write('<Outlets><Outlet ID="1" NAME="A"/><Sale QTY="1"/><Sale QTY="1"/></Outlets>')
+        with open(part2, 'w', encoding='utf-8') as f:
+            f.write('<Outlets><Outlet NAME="A" ID="1"/><Outlet ID="2" NAME="B"/></Outlets>')
+
+        target = os.path.join(self.test_dir, "merged.xml")
+        rows = merge_xml_files([part1, part2], target)
+
+        self.assertEqual(rows, 4)
+        root = ET.parse(target).getroot()
+        self.assertEqual([r.get("ID") for r in root.findall("Outlet")], ["1", "2"])
+        self.assertEqual(len(root.findall("Sale")), 2)
+        print("✅ Bo'laklarni birlashtirish (dedup) testi o'tdi.")
+
+    def test_merge_reference_rows_by_key(self):
+        """Bir ID li entity bo'laklarda farq qilsa ham bir marta (oxirgi bo'lak versiyasi), ildiz atributlari butun davrni qoplaydi"""
+        part1 = os.path.join(self.test_dir, "p1.xml")
+        part2 = os.path.join(self.test_dir, "p2.xml")
+        with open(part1, 'w', encoding='utf-8') as f:
+            f.write('<Outlets BEGIN_DATE="01.01.2026" END_DATE="15.01.2026" COMPANY="X">'
+                    '<Outlet ID="1" NAME="Eski"/><Outlet ID="2" NAME="B"/>'
+                    '<Sale ID="7" DATE="2026-01-03" QTY="1"/></Outlets>')
+        with open(part2, 'w', encoding='utf-8') as f:
+            f.write('<Outlets BEGIN_DATE="16.01.2026" END_DATE="31.01.2026" COMPANY="X">'
+                    '<Outlet ID="1" NAME="Yangi" PHONE="123"/>'
+                    '<Sale ID="7" DATE="2026-01-20" QTY="2"/></Outlets>')
+
+        target = os.path.join(self.test_dir, "merged.xml")
+        rows = merge_xml_files([part1, part2], target, key_attr="ID", date_attrs=["DATE"])
+
+        root = ET.parse(target).getroot()
+        self.assertEqual(rows, 4)
+        outlets = root.findall("Outlet")
+        self.assertEqual([(o.get("ID"), o.get("NAME")) for o in outlets], [("1", "Yangi"), ("2", "B")])
+        self.assertEqual(outlets[0].get("PHONE"), "123")
+        # Sanasi bor qatorlar kalit bo'yicha birlashtirilmaydi
+        self.assertEqual([s.get("QTY") for s in root.findall("Sale")], ["1", "2"])
+        self.assertEqual(root.attrib, {"BEGIN_DATE": "01.01.2026", "END_DATE": "31.01.2026", "COMPANY": "X"})
+        print("✅ Ma'lumotnoma qatorlarini ID bo'yicha birlashtirish testi o'tdi.")
+
+    def test_extract_and_merge(self):
+        """Bo'lak ZIP lar bitta so'rov bilan bir xil fayllar to'plamiga birlashtiriladi"""
+        zips = []
+        for sales in ('<Sales><S D="1"/></Sales>', '<Sales><S D="2"/></Sales>'):
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, 'w') as zf:
+                zf.writestr('Sales.xml', sales)
+                zf.writestr('Outlets.xml', '<Outlets><Outlet ID="1"/></Outlets>')
+            zips.append(buffer.getvalue())
+
+        handler = FileHandler(base_path=self.test_dir)
+        merged = extract_and_merge(zips, handler)
+
+        self.assertEqual(sorted(os.path.basename(p) for p in merged), ["Outlets.xml", "Sales.xml"])
+        self.assertEqual(len(ET.parse(os.path.join(handler.temp_dir, "Sales.xml")).getroot()), 2)
+        self.assertEqual(len(ET.parse(os.path.join(handler.temp_dir, "Outlets.xml")).getroot()), 1)
+        self.assertFalse(os.path.exists(os.path.join(handler.temp_dir, ".parts")))
+        print("✅ Extract + birlashtirish testi o'tdi.")
+
+
+if __name__ == '__main__':
+    unittest.main()
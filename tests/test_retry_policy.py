@@ -0,0 +1,98 @@
+import unittest
+from unittest.mock import patch, Mock
+import sys
+import os
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.insert(0, project_root)
+os.environ["ENV_FILE_PATH"] = os.path.join(project_root, ".env.borjomi")
+
+import requests
+from core.exceptions import SmartupAuthError, SmartupCredentialsError, SmartupHTTPError
+from services.retry_policy import AUTH, FATAL, PERMANENT, TRANSIENT, classify_exception, parse_retry_after
+from services.smartup_client import SmartupClient
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_classify(self):
+        """Status kodlari va istisnolar to'g'ri turga ajratiladi"""
+        self.assertEqual(classify_exception(SmartupHTTPError("x", 404)), PERMANENT)
+        self.assertEqual(classify_exception(SmartupHTTPError("x", 400)), PERMANENT)
+        self.assertEqual(classify_exception(SmartupHTTPError("x", 503)), TRANSIENT)
+        self.assertEqual(classify_exception(SmartupHTTPError("x", 429)), TRANSIENT)
+        self.assertEqual(classify_exception(SmartupAuthError("x", 401)), AUTH)
+        self.assertEqual(classify_exception(SmartupCredentialsError("x", 401)), FATAL)
+        self.assertEqual(classify_exception(requests.exceptions.ReadTimeout()), TRANSIENT)
+        print("✅ Xatolarni tasniflash testi o'tdi.")
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("120"), 120.0)
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertIsNone(parse_retry_after(None))
+        print("✅ Retry-After o'qish testi o'tdi.")
+
+    @patch('requests.Session.post')
+    def test_permanent_error_not_retried(self, mock_post):
+        """404 kabi doimiy xatoda qayta urinish bo'lmaydi"""
+        client = SmartupClient()
+        client.token = "Bearer token"
+
+        mock_response = Mock()
+        mock_response.status_code = 404
+        mock_response.text = "Template not found"
+        mock_response.headers = {}
+        mock_post.return_value = mock_response
+
+        with self.assertRaises(SmartupHTTPError):
+            client.download_sales_report(template_id=1)
+
+        self.assertEqual(mock_post.call_count, 1)
+        print("✅ Doimiy xato (404) qayta urinilmasligi testi o'tdi.")
+
+    @patch('requests.Session.post')
+    def test_token_endpoint_401_not_retried(self, mock_post):
+        """Token endpoint'idan 401 - darhol to'xtaydi (data endpoint'idagi 401 dan farqli)"""
+        client = SmartupClient()
+        client.token = None
+        client.token_cache = None
+
+        mock_response = Mock()
+        mock_response.status_code = 401
+        mock_response.text = "invalid_client"
+        mock_response.headers = {}
+        mock_post.return_value = mock_response
+
+        with self.assertRaises(SmartupCredentialsError):
+            client.download_sales_report(template_id=1)
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertIn("/security/oauth/token", mock_post.call_args[0][0])
+        print("✅ Token endpoint 401 qayta urinilmasligi testi o'tdi.")
+
+    @patch('requests.Session.post')
+    def test_transient_error_honors_retry_after(self, mock_post):
+        """503 da Retry-After bo'yicha kutib, qayta urinadi"""
+        client = SmartupClient()
+        client.token = "Bearer token"
+
+        mock_response = Mock()
+        mock_response.status_code = 503
+        mock_response.text = "Service Unavailable"
+        mock_response.headers = {"Retry-After": "7"}
+        mock_post.return_value = mock_response
+
+        sleeps = []
+        retrying = client.download_monolit_report.retry
+        with patch.object(retrying, 'sleep', side_effect=sleeps.append):
+            with self.assertRaises(SmartupHTTPError):
+                client.download_monolit_report(report_type="$export_balance")
+
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(sleeps, [7.0, 7.0])
+        print("✅ Retry-After bo'yicha kutish testi o'tdi.")
+
+
+if __name__ == '__main__':
+    unittest.main()
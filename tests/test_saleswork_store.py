@@ -0,0 +1,139 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.insert(0, project_root)
+os.environ["ENV_FILE_PATH"] = os.path.join(project_root, ".env.borjomi")
+
+from core.exceptions import IncrementalStoreError
+from utils.saleswork_store import SalesworkStore
+
+
+class TestSalesworkStore(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.store = SalesworkStore(base_dir=os.path.join(self.test_dir, "store"), date_attrs=["DATE"])
+        self.extract_dir = os.path.join(self.test_dir, "extract")
+        os.makedirs(self.extract_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.extract_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_incremental_rebuild(self):
+        """Oxirgi kunlar yangilanadi, qolgan kunlar ombordan olinadi"""
+        begin, end = datetime(2026, 3, 1), datetime(2026, 3, 5)
+
+        # 1. Birinchi (to'liq) yuklash
+        sales = self._write("Sales.xml", '<Sales>'
+                                         '<Row DATE="2026-03-01" QTY="1"/>'
+                                         '<Row DATE="2026-03-04" QTY="4"/>'
+                                         '<Row DATE="2026-03-05" QTY="5"/>'
+                                         '</Sales>')
+        outlets = self._write("Outlets.xml", '<Outlets><Outlet ID="1"/></Outlets>')
+
+        with patch('utils.saleswork_store.settings') as mock_settings:
+            mock_settings.SALESWORK_INCREMENTAL_DAYS = 2
+            self.assertEqual(self.store.get_fetch_begin(902, begin, end), begin)
+
+            self.store.ingest(902, [sales, outlets], begin, end)
+
+            # Ombor to'ldi - endi faqat oxirgi 2 kun so'raladi
+            fetch_begin = self.store.get_fetch_begin(902, begin, end)
+            self.assertEqual(fetch_begin, datetime(2026, 3, 4))
+
+        # 2. Inkremental yuklash: 04.03 tuzatildi, 05.03 o'chirildi
+        self._write("Sales.xml", '<Sales><Row DATE="04.03.2026" QTY="40"/></Sales>')
+        self._write("Outlets.xml", '<Outlets><Outlet ID="1"/><Outlet ID="2"/></Outlets>')
+
+        self.store.ingest(902, [sales, outlets], fetch_begin, end, period_begin=begin)
+        rebuilt = self.store.rebuild(902, [sales, outlets], begin, end)
+
+        self.assertEqual(rebuilt, [sales])
+        rows = ET.parse(sales).getroot()
+        self.assertEqual([r.get("QTY") for r in rows], ["1", "40"])
+
+        # Ma'lumotnoma fayli o'zgarishsiz (yangi holida) qoladi
+        self.assertEqual(len(ET.parse(outlets).getroot()), 2)
+        print("✅ Inkremental ombor (rebuild) testi o'tdi.")
+
+    def test_prune_old_days(self):
+        """Davrdan chiqib ketgan kunlar o'chiriladi"""
+        sales = self._write("Sales.xml", '<Sales><Row DATE="2026-03-01"/><Row DATE="2026-03-02"/></Sales>')
+        self.store.ingest(902, [sales], datetime(2026, 3, 1), datetime(2026, 3, 2))
+
+        self.store.rebuild(902, [sales], datetime(2026, 3, 2), datetime(2026, 3, 2))
+
+        self.assertEqual(len(ET.parse(sales).getroot()), 1)
+        self.assertFalse(os.path.exists(self.store._day_dir(902, datetime(2026, 3, 1).date())))
+        print("✅ Eski kunlarni tozalash testi o'tdi.")
+
+    @patch('utils.saleswork_store.settings.SALESWORK_INCREMENTAL_DAYS', 2)
+    def test_totals_and_out_of_window_rows(self):
+        """Jami (sanasiz) qator va oynadan tashqari sanali qator yo'qolmaydi; ichma-ich qatorlar ham ishlaydi"""
+        begin, end = datetime(2026, 2, 15), datetime(2026, 3, 5)
+        sales = self._write("Sales.xml", '<Sales><Header NAME="h"/><Rows>'
+                                         '<Row DATE="2026-03-01" QTY="1"/>'
+                                         '<Row DATE="2026-03-02" QTY="2"/>'
+                                         '<Row DATE="2026-03-05" QTY="5"/>'
+                                         '<Total QTY="8"/>'
+                                         '</Rows></Sales>')
+        self.store.ingest(902, [sales], begin, end)
+        self.assertIn("Sales.xml", self.store._load_meta(902)["dated_files"])
+
+        fetch_begin = self.store.get_fetch_begin(902, begin, end)
+        self.assertEqual(fetch_begin, datetime(2026, 3, 4))
+
+        # Oxirgi kunlar so'raladi, server esa 20.02 sanali kechikkan qatorni ham qaytaradi
+        self._write("Sales.xml", '<Sales><Header NAME="h2"/><Rows>'
+                                 '<Row DATE="2026-03-05" QTY="50"/>'
+                                 '<Row DATE="2026-02-20" QTY="-1"/>'
+                                 '<Total QTY="49"/>'
+                                 '</Rows></Sales>')
+        for _ in range(2):  # Takroriy ishga tushirish qatorni ikki marta qo'shmaydi
+            self.store.ingest(902, [sales], fetch_begin, end, period_begin=begin)
+        self.store.rebuild(902, [sales], begin, end)
+
+        root = ET.parse(sales).getroot()
+        self.assertEqual(root.find("Header").get("NAME"), "h2")
+        self.assertEqual([r.get("QTY") for r in root.find("Rows")], ["-1", "1", "2", "50", "49"])
+        print("✅ Inkremental ombor (jami va kechikkan qatorlar) testi o'tdi.")
+
+    @patch('utils.saleswork_store.settings.SALESWORK_INCREMENTAL_DAYS', 2)
+    def test_fewer_files_on_second_run(self):
+        """Qisqartirilgan yuklashda sanali fayl yo'qolsa - xato, keyingi safar to'liq davr so'raladi"""
+        begin, end = datetime(2026, 3, 1), datetime(2026, 3, 5)
+        sales = self._write("Sales.xml", '<Sales><Row DATE="2026-03-01" QTY="1"/></Sales>')
+        orders = self._write("Orders.xml", '<Orders><Order DATE="2026-03-02" ID="7"/></Orders>')
+        self.store.ingest(902, [sales, orders], begin, end)
+        fetch_begin = self.store.get_fetch_begin(902, begin, end)
+        self.assertEqual(fetch_begin, datetime(2026, 3, 4))
+
+        self._write("Sales.xml", '<Sales><Row DATE="2026-03-05" QTY="5"/></Sales>')
+        os.remove(orders)
+        with self.assertRaises(IncrementalStoreError):
+            self.store.ingest(902, [sales], fetch_begin, end, period_begin=begin)
+        self.assertEqual(self.store.get_fetch_begin(902, begin, end), begin)
+
+        # Fayllar umuman sanali deb tasniflanmagan bo'lsa, davr qisqartirilmaydi
+        outlets = self._write("Outlets.xml", '<Outlets><Outlet ID="1"/></Outlets>')
+        self.store.ingest(903, [outlets], begin, end)
+        self.assertEqual(self.store.get_fetch_begin(903, begin, end), begin)
+        print("✅ Inkremental ombor (kamaygan fayllar) testi o'tdi.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,14 @@
 import unittest
 from unittest.mock import MagicMock, patch
 import sys
+import io
 import os
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import time
 import paramiko
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -20,6 +27,11 @@ try:
 except ImportError:
     from sales_integration.services.sftp_manager import SFTPManager
 
+from tests.sftp_stub_server import StubSFTPServer
+from utils.upload_manifest import staged_file_name
+from core.exceptions import StreamTransformError
+from utils.upload_source import UploadSource
+
 
 class TestSFTPManager(unittest.TestCase):
 
@@ -31,6 +43,12 @@ class TestSFTPManager(unittest.TestCase):
         self.manager.password = "pass"
         self.manager.remote_path = "/upload"
 
+        # Lokal kalibrovka profili testlarga ta'sir qilmasligi uchun
+        profile_patch = patch('services.sftp_manager.settings.SFTP_PROFILE_FILE',
+                              os.path.join(tempfile.gettempdir(), "sftp_profile_absent.json"))
+        profile_patch.start()
+        self.addCleanup(profile_patch.stop)
+
     @patch('paramiko.SSHClient')
     def test_upload_success(self, mock_ssh_class):
         """Muvaffaqiyatli yuklash testi"""
@@ -106,5 +124,261 @@ class TestSFTPManager(unittest.TestCase):
         print("✅ SFTP Auth Error testi o'tdi.")
 
 
+    def _make_files(self, sizes):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        paths = []
+        for i, size in enumerate(sizes):
+            paths.append(os.path.join(tmp_dir, f"file_{i}.xml"))
+            with open(paths[-1], 'wb') as f:
+                f.write(b"x" * size)
+        return paths
+
+    @patch.multiple('services.sftp_manager.settings',
+                    SFTP_PARALLEL_CHANNELS=2, SFTP_PARALLEL_TRANSPORTS=False, SFTP_VERIFY_CHECKSUM=False, UPLOAD_ATOMIC=False)
+    @patch('paramiko.SSHClient')
+    def test_parallel_upload_largest_first(self, mock_ssh_class):
+        """Parallel rejim: bitta transportda 2 kanal, eng katta fayllar birinchi yuboriladi"""
+
+        started = []
+        lock = threading.Lock()
+
+        def fake_put(local_path, remote_path, callback=None):
+            with lock:
+                started.append(local_path)
+            time.sleep(0.05)
+
+        channels = [MagicMock(), MagicMock()]
+        for channel in channels:
+            channel.put.side_effect = fake_put
+        mock_ssh_class.return_value.open_sftp.side_effect = channels
+
+        paths = self._make_files([10, 500, 30, 2000])
+        self.assertTrue(self.manager.upload_files(paths))
+
+        self.assertEqual(mock_ssh_class.return_value.connect.call_count, 1)
+        self.assertEqual(sorted(started), sorted(paths))
+        self.assertEqual(set(started[:2]), {paths[3], paths[1]})
+        self.assertTrue(all(channel.put.called for channel in channels))
+        self.assertTrue(all(channel.close.called for channel in channels))
+        print("✅ SFTP parallel yuklash (eng kattasi birinchi) testi o'tdi.")
+
+    @patch('services.sftp_manager.time.sleep')
+    @patch.multiple('services.sftp_manager.settings',
+                    SFTP_PARALLEL_CHANNELS=3, SFTP_PARALLEL_TRANSPORTS=True, SFTP_VERIFY_CHECKSUM=False, UPLOAD_ATOMIC=False)
+    @patch('paramiko.SSHClient')
+    def test_parallel_upload_all_or_nothing(self, mock_ssh_class, mock_sleep):
+        """Parallel rejim (alohida transportlar): bitta kanal xatosi butun yuklashni muvaffaqiyatsiz qiladi"""
+
+        mock_sftp = MagicMock()
+
+        def fake_put(local_path, remote_path, callback=None):
+            if local_path.endswith("file_1.xml"):
+                threading.Event().wait(0.05)  # Boshqa kanallar o'z fayllarini olib ulgursin
+                raise IOError("Write failed")
+
+        mock_sftp.put.side_effect = fake_put
+        mock_sftp.stat.side_effect = IOError("No such file")
+        mock_ssh_class.return_value.open_sftp.return_value = mock_sftp
+
+        paths = self._make_files([10, 20, 30])
+        result = self.manager.upload_files(paths)
+
+        self.assertFalse(result)
+        # 1-urinishda 3 ta alohida SSH ulanish; keyingilarida faqat xato fayl qoladi - bitta ulanish
+        self.assertEqual(mock_ssh_class.return_value.connect.call_count, 5)
+        put_files = [c.args[0] for c in mock_sftp.put.call_args_list]
+        self.assertEqual(put_files.count(paths[0]), 1)
+        self.assertEqual(put_files.count(paths[1]), 3)
+        self.assertEqual(mock_sleep.call_count, 3)
+        print("✅ SFTP parallel yuklash (hammasi yoki hech narsa) testi o'tdi.")
+
+    @patch('services.sftp_manager.time.sleep')
+    @patch.multiple('services.sftp_manager.settings',
+                    SFTP_PARALLEL_CHANNELS=1, SFTP_VERIFY_CHECKSUM=False, UPLOAD_ATOMIC=False)
+    @patch('paramiko.SSHClient')
+    def test_stale_remote_file_not_trusted(self, mock_ssh_class, mock_sleep):
+        """Yozish boshlanmasdan uzilgan fayl uchun serverdagi eski (kechagi) fayl tasdiq yoki davom nuqtasi bo'lmaydi"""
+        paths = self._make_files([100, 200])
+        sizes = {os.path.basename(p): os.path.getsize(p) for p in paths}
+        # Serverda kechagi fayllar: biri aynan shu hajmda, ikkinchisi kichikroq
+        stale_sizes = {"file_0.xml": sizes["file_0.xml"], "file_1.xml": sizes["file_1.xml"] - 50}
+        calls = []
+
+        def fake_put(local_path, remote_path, callback=None):
+            calls.append(local_path)
+            if len(calls) in (1, 3):
+                raise IOError("Connection lost")  # Fayl ochilishidan oldin - hech narsa yozilmadi
+            stale_sizes[os.path.basename(remote_path)] = sizes[os.path.basename(local_path)]
+            callback(sizes[os.path.basename(local_path)], sizes[os.path.basename(local_path)])
+
+        mock_sftp = MagicMock()
+        mock_sftp.put.side_effect = fake_put
+        mock_sftp.stat.side_effect = lambda path: MagicMock(st_size=stale_sizes[os.path.basename(path)])
+        mock_ssh_class.return_value.open_sftp.return_value = mock_sftp
+
+        self.assertTrue(self.manager.upload_files(paths))
+
+        # Ikkala fayl ham boshidan (put) qayta yuborildi, "r+" bilan davom ettirilmadi
+        self.assertEqual(calls, [paths[0], paths[0], paths[1], paths[1]])
+        mock_sftp.open.assert_not_called()
+        print("✅ SFTP eskirgan serverdagi faylga ishonmaslik testi o'tdi.")
+
+    @patch.multiple('services.sftp_manager.settings',
+                    SFTP_COMPRESS=False, SFTP_WINDOW_SIZE=8 * 1024 * 1024, SFTP_MAX_PACKET_SIZE=0,
+                    SFTP_CIPHERS="aes128-ctr, no-such-cipher")
+    @patch('paramiko.SSHClient')
+    def test_transport_tuning(self, mock_ssh_class):
+        """Transport sozlamalari: oyna hajmi va shifrlar tartibi transport_factory orqali beriladi"""
+        self.manager._open_ssh()
+
+        kwargs = mock_ssh_class.return_value.connect.call_args.kwargs
+        self.assertFalse(kwargs["compress"])
+        factory = kwargs["transport_factory"]
+
+        sock, peer = socket.socketpair()
+        self.addCleanup(peer.close)
+        transport = factory(sock, gss_kex=False, gss_deleg_creds=True, disabled_algorithms=None)
+        self.addCleanup(transport.close)
+        self.assertEqual(transport.default_window_size, 8 * 1024 * 1024)
+        ciphers = transport.get_security_options().ciphers
+        self.assertEqual(ciphers[0], "aes128-ctr")
+        self.assertNotIn("no-such-cipher", ciphers)
+        print("✅ SFTP transport sozlamalari testi o'tdi.")
+
+
+
+class TestSFTPManagerResume(unittest.TestCase):
+    """Haqiqiy (lokal) SFTP server bilan: uzilishdan keyin faqat qolgan fayllar yuboriladi"""
+
+    def setUp(self):
+        self.remote_root = tempfile.mkdtemp()
+        self.local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.remote_root)
+        self.addCleanup(shutil.rmtree, self.local_dir)
+
+        self.paths = []
+        for i in range(4):
+            self.paths.append(os.path.join(self.local_dir, f"file_{i}.xml"))
+            with open(self.paths[-1], 'wb') as f:
+                f.write(os.urandom(48 * 1024))
+
+        # 3-faylning birinchi 32 KB bo'lagidan keyin ulanish uziladi.
+        # Fayllar 64 KB dan kichik: paramiko'ning server tomonidagi check-file katta fayllarda osilib qoladi.
+        self.server = StubSFTPServer(self.remote_root, drop_after_bytes=2 * 48 * 1024 + 40 * 1024)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+        self.manager = SFTPManager()
+        self.manager.host = "127.0.0.1"
+        self.manager.port = self.server.port
+        self.manager.username = "user"
+        self.manager.password = "pass"
+        self.manager.remote_path = ""
+
+        profile_patch = patch('services.sftp_manager.settings.SFTP_PROFILE_FILE',
+                              os.path.join(self.local_dir, "sftp_profile_absent.json"))
+        profile_patch.start()
+        self.addCleanup(profile_patch.stop)
+
+    @patch('services.sftp_manager.time.sleep')
+    @patch.multiple('services.sftp_manager.settings',
+                    SFTP_PARALLEL_CHANNELS=1, SFTP_VERIFY_CHECKSUM=True, UPLOAD_ATOMIC=False)
+    def test_resume_after_disconnect(self, mock_sleep):
+        self.assertTrue(self.manager.upload_files(self.paths))
+        self.assertEqual(self.server.drops, 1)
+        self.assertEqual(mock_sleep.call_count, 1)
+
+        for path in self.paths:
+            with open(path, 'rb') as local, open(os.path.join(self.remote_root, os.path.basename(path)), 'rb') as remote:
+                self.assertEqual(local.read(), remote.read())
+
+        # Tasdiqlangan fayllar qayta ochilmaydi; uzilgan fayl truncate qilinmasdan davom ettiriladi
+        truncating_opens = [name for name, truncate in self.server.opens if truncate]
+        self.assertEqual(sorted(truncating_opens), ["file_0.xml", "file_1.xml", "file_2.xml", "file_3.xml"])
+        self.assertIn(("file_2.xml", False), self.server.opens)
+        file_2_offsets = [offset for name, offset, _ in self.server.writes if name == "file_2.xml"]
+        self.assertEqual(file_2_offsets, [0, 32 * 1024])  # Boshidan faqat bir marta, keyin davomidan
+        self.assertEqual(self.server.bytes_written, 4 * 48 * 1024)
+        print("✅ SFTP uzilishdan keyin davom ettirish testi o'tdi.")
+
+    @patch.multiple('services.sftp_manager.settings',
+                    SFTP_PARALLEL_CHANNELS=1, SFTP_VERIFY_CHECKSUM=False, UPLOAD_ATOMIC=True, UPLOAD_TEMP_SUFFIX=".part")
+    def test_atomic_publish_reuses_staged(self):
+        """Atomar rejim: vaqtinchalik nom bilan yuklanadi, oxirida qayta nomlanadi; tayyor staged fayl qayta yuborilmaydi"""
+        self.server.drop_after_bytes = None
+
+        # Oldingi muvaffaqiyatsiz ishga tushirishdan: file_0 to'liq staged, file_1 uchun eskirgan (boshqa kontent) qoldiq
+        shutil.copyfile(self.paths[0], os.path.join(self.remote_root, staged_file_name(self.paths[0])))
+        with open(os.path.join(self.remote_root, "file_1.xml.0123456789abcdef.part"), 'wb') as f:
+            f.write(b"eski")
+
+        self.assertTrue(self.manager.upload_files(self.paths))
+
+        self.assertEqual(sorted(os.listdir(self.remote_root)), [f"file_{i}.xml" for i in range(4)])
+        for path in self.paths:
+            with open(path, 'rb') as local, open(os.path.join(self.remote_root, os.path.basename(path)), 'rb') as remote:
+                self.assertEqual(local.read(), remote.read())
+        written = {name for name, _, _ in self.server.writes}
+        self.assertNotIn(staged_file_name(self.paths[0]), written)
+        self.assertEqual(written, {staged_file_name(p) for p in self.paths[1:]})
+        print("✅ SFTP atomar nashr (staged fayllarni qayta ishlatish) testi o'tdi.")
+
+    @patch.multiple('services.sftp_manager.settings',
+                    SFTP_PARALLEL_CHANNELS=2, SFTP_VERIFY_CHECKSUM=True, UPLOAD_ATOMIC=True, UPLOAD_TEMP_SUFFIX=".part")
+    def test_upload_sources_without_temp_files(self):
+        """Oqim manbalari (UploadSource) putfo orqali yuboriladi, lokal fayllar bilan birga atomar nashr qilinadi"""
+        self.server.drop_after_bytes = None
+        payloads = {"Sales.xml": os.urandom(40 * 1024), "Outlets.xml": b"<Root>" + b"<Outlet/>" * 200 + b"</Root>"}
+        sources = [UploadSource(name, lambda data=data: io.BytesIO(data), len(data)) for name, data in payloads.items()]
+
+        self.assertTrue(self.manager.upload_files(sources + self.paths[:1]))
+
+        self.assertEqual(sorted(os.listdir(self.remote_root)), ["Outlets.xml", "Sales.xml", "file_0.xml"])
+        for name, data in payloads.items():
+            with open(os.path.join(self.remote_root, name), 'rb') as remote:
+                self.assertEqual(remote.read(), data)
+        self.assertTrue(self.manager.checksum_supported)
+        print("✅ SFTP oqim manbalarini yuklash testi o'tdi.")
+
+    def test_stream_transform_error_not_retried(self):
+        """Oqim manbasidagi transformatsiya xatosi yuklashni darhol to'xtatadi (qayta ulanishsiz)"""
+        self.server.drop_after_bytes = None
+
+        class BrokenReader(io.BytesIO):
+            def read(self, size=-1):
+                raise StreamTransformError("Ошибка трансформации Outlets.xml")
+
+        sources = [UploadSource("Outlets.xml", lambda: BrokenReader(b""), 10)]
+        with patch('services.sftp_manager.time.sleep') as mock_sleep:
+            self.assertFalse(self.manager.upload_files(self.paths[:1] + sources))
+        mock_sleep.assert_not_called()
+        self.assertNotIn("Outlets.xml", os.listdir(self.remote_root))
+        print("✅ SFTP oqim transformatsiya xatosi (qayta urinishsiz) testi o'tdi.")
+
+    def test_calibrate_records_fastest_profile(self):
+        """Kalibrovka: har bir profil sinaladi, eng tezi klient/server kaliti bilan faylga yoziladi"""
+        self.server.drop_after_bytes = None
+        profile_file = os.path.join(self.local_dir, "sftp_profile.json")
+
+        with patch('services.sftp_manager.settings.SFTP_PROFILE_FILE', profile_file):
+            profile = self.manager.calibrate(payload_mb=1)
+            self.assertIsNotNone(profile)
+            self.assertGreater(profile["mbps"], 0)
+
+            with open(profile_file, encoding='utf-8') as f:
+                saved = json.load(f)
+            self.assertEqual(list(saved.values()), [profile])
+            self.assertTrue(list(saved)[0].endswith(f"|127.0.0.1:{self.server.port}"))
+
+            # Keyingi ulanishlar saqlangan profilni ishlatadi
+            options = self.manager._get_transport_options()
+            self.assertEqual(options, {k: profile[k] for k in options})
+
+        self.assertEqual(len(self.server.opens), len(SFTPManager.CALIBRATION_PROFILES))
+        self.assertEqual(os.listdir(self.remote_root), [])  # Sinov fayli o'chiriladi
+        print("✅ SFTP kalibrovka testi o'tdi.")
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
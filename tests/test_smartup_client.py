@@ -3,6 +3,12 @@ from unittest.mock import patch, Mock
 import sys
 import os
 import io
+import gzip
+import random
+import socket
+import tempfile
+import threading
+import time
 import zipfile
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -19,6 +25,66 @@ try:
     from services.smartup_client import SmartupClient
 except ImportError:
     from services.smartup_client import SmartupClient
+from services.token_cache import TokenCache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _FlakyReportHandler(BaseHTTPRequestHandler):
+    """ZIP ni beradigan, lekin ulanishni tasodifiy joyda uzadigan lokal Smartup o'rinbosari."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+
+        if server.versions:
+            # Smartup har bir so'rovda hisobotni qayta yig'adi: yangi tarkib va yangi ETag
+            server.payload, server.etag = server.versions.pop(0)
+
+        start = 0
+        range_header = self.headers.get("Range")
+        server.range_headers.append(range_header)
+        server.if_range_headers.append(self.headers.get("If-Range"))
+        if_range_ok = server.etag is not None and self.headers.get("If-Range") == server.etag
+        if range_header and server.support_range and if_range_ok:
+            start = int(range_header[len("bytes="):-1])
+            shown = 0 if server.bad_range_start else start
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {shown}-{len(server.payload) - 1}/{len(server.payload)}")
+            if server.bad_range_start:
+                server.bad_range_start = False
+                start = 0
+        else:
+            self.send_response(200)
+        if server.etag:
+            self.send_header("ETag", server.etag)
+
+        body = server.payload
+        accept = self.headers.get("Accept-Encoding", "")
+        server.accept_encodings.append(accept)
+        if server.gzip == "always" or (server.gzip == "negotiate" and "gzip" in accept):
+            # Range kodlangan (gzip) baytlar bo'yicha hisoblanadi
+            body = gzip.compress(body, mtime=0)
+            self.send_header("Content-Encoding", "gzip")
+
+        remaining = body[start:]
+        self.send_header("Content-Length", str(len(remaining)))
+        self.end_headers()
+
+        if server.drops_left > 0:
+            server.drops_left -= 1
+            # Ulanishni tasodifiy joyda keskin uzamiz
+            cut = server.rng.randint(1, len(remaining) - 1)
+            self.wfile.write(remaining[:cut])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+
+        self.wfile.write(remaining)
+
+    def log_message(self, *args):
+        pass
 
 
 class TestSmartupClient(unittest.TestCase):
@@ -27,7 +93,7 @@ class TestSmartupClient(unittest.TestCase):
         self.client = SmartupClient()
         self.client.base_url = "http://test-api.smartup.uz"
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_get_oauth_token_success(self, mock_post):
         """Tokenni muvaffaqiyatli olish"""
         mock_response = Mock()
@@ -41,7 +107,7 @@ class TestSmartupClient(unittest.TestCase):
         self.assertIn("/security/oauth/token", mock_post.call_args[0][0])
         print("✅ Token olish (Success) testi o'tdi.")
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_get_oauth_token_fail(self, mock_post):
         """Token olishda xatolik bo'lsa"""
         mock_response = Mock()
@@ -55,7 +121,73 @@ class TestSmartupClient(unittest.TestCase):
 
         print("✅ Token xatoligi (Fail) testi o'tdi.")
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
+    def test_token_cache_shared_between_clients(self, mock_post):
+        """Token fayl keshi orqali boshqa jarayon (client) da qayta ishlatiladi"""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"access_token": "cached_token", "expires_in": 3600}
+        mock_post.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = TokenCache(os.path.join(tmp_dir, "token_cache.json"))
+            self.client.token_cache = cache
+            self.client._ensure_token()
+
+            other = SmartupClient()
+            other.base_url = self.client.base_url
+            other.token_cache = cache
+            other._ensure_token()
+
+        self.assertEqual(other.token, "Bearer cached_token")
+        self.assertEqual(mock_post.call_count, 1)
+        print("✅ Token keshi testi o'tdi.")
+
+    @patch('requests.Session.post')
+    def test_short_lived_token_reused(self, mock_post):
+        """expires_in <= SMARTUP_TOKEN_REFRESH_MARGIN bo'lsa ham token (xotirada va keshda) qayta ishlatiladi"""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"access_token": "short_token", "expires_in": 60}
+        mock_post.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                patch('services.smartup_client.settings.SMARTUP_TOKEN_REFRESH_MARGIN', 120):
+            cache = TokenCache(os.path.join(tmp_dir, "token_cache.json"))
+            self.client.token_cache = cache
+            self.client._ensure_token()
+            self.client._ensure_token()
+
+            other = SmartupClient()
+            other.base_url = self.client.base_url
+            other.token_cache = cache
+            other._ensure_token()
+
+            # Umrining yarmidan keyin esa yangilanadi
+            with patch('time.time', return_value=self.client.token_issued_at + 31):
+                self.client._ensure_token()
+
+        self.assertEqual(other.token, "Bearer short_token")
+        self.assertEqual(mock_post.call_count, 2)
+        print("✅ Qisqa muddatli token keshi testi o'tdi.")
+
+    @patch('requests.Session.post')
+    def test_token_refreshed_before_expiry(self, mock_post):
+        """Muddati tugayotgan token oldindan yangilanadi"""
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"access_token": "new_token", "expires_in": 3600}
+        mock_post.return_value = mock_response
+
+        self.client.token = "Bearer old_token"
+        self.client.token_expires_at = time.time() + 5  # Deyarli tugagan
+        self.client._ensure_token()
+
+        self.assertEqual(self.client.token, "Bearer new_token")
+        self.assertGreater(self.client.token_expires_at, time.time() + 3000)
+        print("✅ Tokenni oldindan yangilash testi o'tdi.")
+
+    @patch('requests.Session.post')
     def test_download_sales_report_success(self, mock_post):
         """Hisobotni muvaffaqiyatli yuklash"""
         self.client.token = "Bearer old_token"
@@ -76,7 +208,175 @@ class TestSmartupClient(unittest.TestCase):
         self.assertIn("/trade/rep/integration/saleswork", mock_post.call_args[0][0])
         print("✅ Hisobot yuklash (ZIP Success) testi o'tdi.")
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
+    def test_download_sales_report_to_file(self, mock_post):
+        """Hisobot RAM ga emas, to'g'ridan-to'g'ri faylga yoziladi"""
+        self.client.token = "Bearer token"
+
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w') as zf:
+            zf.writestr('Sales.xml', '<Root/>')
+        valid_zip_content = zip_buffer.getvalue()
+
+        mock_response = Mock()
+        mock_response.status_code = 200
+        # Oqimni bir necha bo'lakka bo'lib beramiz
+        mock_response.iter_content.return_value = [valid_zip_content[:10], valid_zip_content[10:]]
+        mock_post.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            target = os.path.join(tmp_dir, "report.zip")
+            result = self.client.download_sales_report_to_file(template_id=902, file_path=target)
+
+            self.assertEqual(result, target)
+            with open(target, 'rb') as f:
+                self.assertEqual(f.read(), valid_zip_content)
+        print("✅ Hisobotni faylga yuklash testi o'tdi.")
+
+    def _start_flaky_server(self, payload, support_range, drops, etag='"v1"'):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _FlakyReportHandler)
+        server.payload = payload
+        server.etag = etag
+        server.versions = []
+        server.bad_range_start = False
+        server.if_range_headers = []
+        server.support_range = support_range
+        server.drops_left = drops
+        server.rng = random.Random(42)
+        server.range_headers = []
+        server.gzip = None  # "negotiate" - Accept-Encoding bo'yicha, "always" - har doim gzip
+        server.accept_encodings = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.client.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        self.client.token = "Bearer token"
+        return server
+
+    def _small_zip(self):
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w') as zf:
+            zf.writestr('Sales.xml', random.Random(2).randbytes(256 * 1024))
+        return zip_buffer.getvalue()
+
+    def _big_zip(self):
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w') as zf:
+            zf.writestr('Sales.xml', random.Random(1).randbytes(2 * 1024 * 1024))
+        return zip_buffer.getvalue()
+
+    def test_download_resumes_with_range(self):
+        """Oqim uzilganda yuklash Range bilan davom ettiriladi"""
+        payload = self._big_zip()
+        server = self._start_flaky_server(payload, support_range=True, drops=3)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            target = os.path.join(tmp_dir, "report.zip")
+            self.client.download_sales_report_to_file(template_id=902, file_path=target)
+            with open(target, 'rb') as f:
+                self.assertEqual(f.read(), payload)
+
+        # Birinchi so'rov Range'siz, keyingilari - yozilgan joydan davom ettirish
+        self.assertIsNone(server.range_headers[0])
+        self.assertEqual(len(server.range_headers), 4)
+        self.assertTrue(any(server.range_headers[1:]))
+        self.assertTrue(all(h == '"v1"' for r, h in zip(server.range_headers, server.if_range_headers) if r))
+        print("✅ Range bilan davom ettirish testi o'tdi.")
+
+    def test_download_without_validator_restarts(self):
+        """Javobda ETag/Last-Modified bo'lmasa, Range yuborilmaydi - yuklash boshidan qayta boshlanadi"""
+        payload = self._big_zip()
+        server = self._start_flaky_server(payload, support_range=True, drops=2, etag=None)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            target = os.path.join(tmp_dir, "report.zip")
+            self.client.download_sales_report_to_file(template_id=902, file_path=target)
+            with open(target, 'rb') as f:
+                self.assertEqual(f.read(), payload)
+        self.assertEqual(server.range_headers, [None, None, None])
+        print("✅ Validatorsiz qayta yuklash testi o'tdi.")
+
+    def test_download_changed_report_not_spliced(self):
+        """Hisobot qayta yig'ilgan (ETag boshqa) yoki 206 boshqa joydan boshlangan bo'lsa, fayl qo'shib yozilmaydi"""
+        first, second = self._big_zip(), self._small_zip()
+        server = self._start_flaky_server(first, support_range=True, drops=2)
+        server.versions = [(first, '"v1"'), (second, '"v2"')]
+        server.bad_range_start = True
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            target = os.path.join(tmp_dir, "report.zip")
+            self.client.download_sales_report_to_file(template_id=902, file_path=target)
+            with open(target, 'rb') as f:
+                self.assertEqual(f.read(), second)
+        print("✅ O'zgargan hisobotni qo'shib yozmaslik testi o'tdi.")
+
+    def test_download_resume_not_compressed(self):
+        """Davom ettiriladigan so'rovlar siqilmasdan (identity) so'raladi; server baribir gzip yuborsa - boshidan"""
+        payload = self._big_zip()
+        server = self._start_flaky_server(payload, support_range=True, drops=2)
+        server.gzip = "negotiate"
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            target = os.path.join(tmp_dir, "report.zip")
+            self.client.download_sales_report_to_file(template_id=902, file_path=target)
+            with open(target, 'rb') as f:
+                self.assertEqual(f.read(), payload)
+        self.assertEqual(server.accept_encodings, ["identity"] * 3)
+        self.assertTrue(any(server.range_headers[1:]))
+
+        server = self._start_flaky_server(payload, support_range=True, drops=2)
+        server.gzip = "always"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            target = os.path.join(tmp_dir, "report.zip")
+            self.client.download_sales_report_to_file(template_id=902, file_path=target)
+            with open(target, 'rb') as f:
+                self.assertEqual(f.read(), payload)
+        self.assertEqual(server.range_headers, [None, None, None])
+        print("✅ Siqilgan javobni davom ettirmaslik testi o'tdi.")
+
+    def test_download_restarts_without_range_support(self):
+        """Server Range'ni qo'llamasa, yuklash boshidan qayta boshlanadi"""
+        payload = self._big_zip()
+        self._start_flaky_server(payload, support_range=False, drops=2)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            target = os.path.join(tmp_dir, "report.zip")
+            self.client.download_sales_report_to_file(template_id=902, file_path=target)
+            with open(target, 'rb') as f:
+                self.assertEqual(f.read(), payload)
+        print("✅ Range'siz qayta yuklash testi o'tdi.")
+
+    @patch('requests.Session.post')
+    def test_download_to_file_not_zip_removes_file(self, mock_post):
+        """ZIP bo'lmagan javob diskda qolmasligi kerak"""
+        self.client.token = "Bearer token"
+
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [b"<html>Error</html>"]
+        mock_post.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            target = os.path.join(tmp_dir, "report.zip")
+            # Qayta urinishlar orasidagi kutish testni sekinlashtirmasin
+            retrying = self.client.download_sales_report_to_file.retry
+            with patch.object(retrying, 'sleep') as mock_sleep, self.assertRaises(Exception) as cm:
+                self.client.download_sales_report_to_file(template_id=902, file_path=target)
+            mock_sleep.assert_called()
+
+            self.assertIn("Сервер не вернул ZIP-файл", str(cm.exception))
+            self.assertFalse(os.path.exists(target))
+        print("✅ Faylga yuklash (Not ZIP) testi o'tdi.")
+
+    def test_host_slot_shared_per_host(self):
+        """Bitta host uchun bitta umumiy semafor ishlatiladi"""
+        other = SmartupClient()
+        other.base_url = "http://test-api.smartup.uz/"
+
+        self.assertIs(self.client._host_slot(), other._host_slot())
+        print("✅ Host limiti (semafor) testi o'tdi.")
+
+    @patch('requests.Session.post')
     def test_download_not_zip_error(self, mock_post):
         """Agar server ZIP emas, HTML xato qaytarsa"""
         self.client.token = "Bearer token"
@@ -87,15 +387,16 @@ class TestSmartupClient(unittest.TestCase):
         mock_response.iter_content.return_value = [b"<html>Error</html>"]
         mock_post.return_value = mock_response
 
-        # Exception kutamiz
-        with self.assertRaises(Exception) as cm:
+        # Exception kutamiz (qayta urinishlar orasida kutmasdan)
+        retrying = self.client.download_sales_report.retry
+        with patch.object(retrying, 'sleep'), self.assertRaises(Exception) as cm:
             self.client.download_sales_report(template_id=902)
 
         self.assertIn("Сервер не вернул ZIP-файл", str(cm.exception))
 
         print("✅ Noto'g'ri format (Not ZIP) testi o'tdi.")
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_retry_logic_on_401(self, mock_post):
         """Retry logikasini tekshirish"""
         self.client.token = "Bearer eskirgan_token"
@@ -110,7 +411,7 @@ class TestSmartupClient(unittest.TestCase):
 
         print("✅ Retry logikasi (401 Unauthorized) testi o'tdi.")
 
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_download_monolit_report_success(self, mock_post):
         """Monolit hisobotni yuklash va 5 kunlik oraliqni tekshirish"""
         self.client.token = "Bearer token"
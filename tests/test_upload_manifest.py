@@ -0,0 +1,72 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+sys.path.insert(0, project_root)
+os.environ["ENV_FILE_PATH"] = os.path.join(project_root, ".env.borjomi")
+
+from unittest.mock import patch
+from utils.upload_manifest import UploadManifest, staged_base_name
+
+
+class TestUploadManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.manifest = UploadManifest(os.path.join(self.test_dir, "manifest.json"))
+        self.dest = "SFTP://sftp.test:22/upload"
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.test_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_skip_unchanged(self):
+        """Oldingi yuklash bilan bir xil fayl o'tkazib yuboriladi, o'zgargani yuboriladi"""
+        outlets = self._write("Outlets.xml", "<Outlets/>")
+        sales = self._write("Sales.xml", "<Sales>1</Sales>")
+
+        to_send, skipped, hashes = self.manifest.filter_changed("TEST", self.dest, [outlets, sales])
+        self.assertEqual((len(to_send), len(skipped)), (2, 0))
+        self.manifest.record("TEST", self.dest, hashes)
+
+        self._write("Sales.xml", "<Sales>2</Sales>")
+        to_send, skipped, _ = self.manifest.filter_changed("TEST", self.dest, [outlets, sales])
+        self.assertEqual(to_send, [sales])
+        self.assertEqual(skipped, [outlets])
+
+        # Boshqa manzil uchun manifest alohida
+        to_send, _, _ = self.manifest.filter_changed("TEST", "FTP://other:21/", [outlets])
+        self.assertEqual(to_send, [outlets])
+        print("✅ Manifest (o'zgarmagan fayllar) testi o'tdi.")
+
+    def test_force(self):
+        """--force bo'lsa hammasi yuboriladi"""
+        outlets = self._write("Outlets.xml", "<Outlets/>")
+        _, _, hashes = self.manifest.filter_changed("TEST", self.dest, [outlets])
+        self.manifest.record("TEST", self.dest, hashes)
+
+        to_send, skipped, _ = self.manifest.filter_changed("TEST", self.dest, [outlets], force=True)
+        self.assertEqual((to_send, skipped), ([outlets], []))
+        print("✅ Manifest --force testi o'tdi.")
+
+    def test_staged_base_name(self):
+        """Vaqtinchalik nomdan asl nom: suffiksdagi nuqtalar soniga bog'liq emas"""
+        for suffix in (".part", "_tmp", ".tmp.part"):
+            with patch('utils.upload_manifest.settings.UPLOAD_TEMP_SUFFIX', suffix):
+                self.assertEqual(staged_base_name(f"Sales.xml.0123456789abcdef{suffix}"), "Sales.xml")
+                self.assertIsNone(staged_base_name("Sales.xml"))
+                self.assertIsNone(staged_base_name(f"Sales{suffix}"))
+        print("✅ Vaqtinchalik nomdan asl nom testi o'tdi.")
+
+
+if __name__ == '__main__':
+    unittest.main()
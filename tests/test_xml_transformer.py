@@ -1,4 +1,5 @@
 import unittest
+from unittest.mock import patch
 import os
 import json
 import tempfile
@@ -18,9 +19,11 @@ os.environ["ENV_FILE_PATH"] = os.path.join(project_root, ".env.borjomi")
 
 # Import
 try:
-    from services.xml_transformer import XMLTransformer
+    from core.config import settings
+    from services.xml_transformer import XMLTransformer, stream_transform
 except ImportError:
-    from sales_integration.services.xml_transformer import XMLTransformer
+    from sales_integration.core.config import settings
+    from sales_integration.services.xml_transformer import XMLTransformer, stream_transform
 
 
 class TestXMLTransformer(unittest.TestCase):
@@ -38,6 +41,11 @@ class TestXMLTransformer(unittest.TestCase):
         with open(self.mapping_path, 'w', encoding='utf-8') as f:
             json.dump(self.mapping_data, f)
 
+        # Kompilyatsiya keshi loyiha papkasiga emas, vaqtinchalik papkaga yozilsin
+        cache_patch = patch.object(settings, 'XML_MAPPING_CACHE_DIR', os.path.join(self.test_dir, ".cache"))
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+
         # Classni shu fake mapping bilan ishga tushiramiz
         self.transformer = XMLTransformer(mapping_file=self.mapping_path)
 
@@ -121,6 +129,291 @@ class TestXMLTransformer(unittest.TestCase):
         self.assertFalse(result)
         print("✅ Buzilgan XML (Invalid) testi o'tdi.")
 
+    @patch('services.xml_transformer.settings')
+    def test_process_outlets_stream_engine(self, mock_settings):
+        """Oqimli dvigatel etree bilan bir xil natija beradi"""
+        mock_settings.XML_TRANSFORM_ENGINE = "stream"
+        mock_settings.XML_MAPPING_CACHE_DIR = ""
+
+        xml_content = """<?xml version="1.0" encoding="utf-8"?>
+        <Root>
+            <Outlet AREA_ID="101" Name="Shop &amp; Co" />
+            <Outlet AREA_ID="999" Name="Shop B" />
+            <Outlet AREA_ID="555" Name="Shop C">Matn</Outlet>
+        </Root>"""
+        xml_path = os.path.join(self.test_dir, "outlets.xml")
+        with open(xml_path, 'w', encoding='utf-8') as f:
+            f.write(xml_content)
+
+        self.assertTrue(self.transformer.process_outlets(xml_path))
+
+        root = ET.parse(xml_path).getroot()
+        self.assertEqual([o.get('AREA_ID') for o in root], ["202", "999", "777"])
+        self.assertEqual(root[0].get('Name'), "Shop & Co")
+        self.assertEqual(root[2].text, "Matn")
+        # Vaqtinchalik fayl qolmasligi kerak
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ["mapping.json", "outlets.xml"])
+        print("✅ Oqimli transformatsiya testi o'tdi.")
+
+    @patch('services.xml_transformer.settings')
+    def test_process_outlets_stream_invalid_xml(self, mock_settings):
+        """Oqimli dvigatel: buzilgan XML asl faylni o'zgartirmaydi"""
+        mock_settings.XML_TRANSFORM_ENGINE = "stream"
+        mock_settings.XML_MAPPING_CACHE_DIR = ""
+
+        xml_path = os.path.join(self.test_dir, "broken.xml")
+        broken = '<Root><Outlet AREA_ID="101"/><Tag>Yopilmagan teg'
+        with open(xml_path, 'w') as f:
+            f.write(broken)
+
+        self.assertFalse(self.transformer.process_outlets(xml_path))
+        with open(xml_path) as f:
+            self.assertEqual(f.read(), broken)
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ["broken.xml", "mapping.json"])
+        print("✅ Oqimli transformatsiya (Invalid) testi o'tdi.")
+
+    @patch('services.xml_transformer.settings')
+    def test_process_outlets_bytes_engine_preserves_bytes(self, mock_settings):
+        """Bayt rejimi: faqat AREA_ID qiymatlari o'zgaradi, qolgan baytlar aynan saqlanadi"""
+        mock_settings.XML_TRANSFORM_ENGINE = "bytes"
+        mock_settings.XML_MAPPING_CACHE_DIR = ""
+
+        original = ("<?xml version='1.0' encoding='windows-1251'?>\r\n"
+                    "<Root>\r\n"
+                    "  <!-- <Outlet AREA_ID=\"101\"/> -->\r\n"
+                    "  <Outlet  AREA_ID = '101' Name=\"Магазин\"/>\r\n"
+                    "  <Outlet XAREA_ID=\"555\" AREA_ID=\"555\"></Outlet>\r\n"
+                    "</Root>").encode('cp1251')
+        xml_path = os.path.join(self.test_dir, "outlets.xml")
+        with open(xml_path, 'wb') as f:
+            f.write(original)
+
+        self.assertTrue(self.transformer.process_outlets(xml_path))
+
+        expected = (original
+                    .replace(b"AREA_ID = '101'", b"AREA_ID = '202'")
+                    .replace(b' AREA_ID="555"', b' AREA_ID="777"'))
+        with open(xml_path, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+        print("✅ Bayt rejimi (baytlar saqlanishi) testi o'tdi.")
+
+    @patch('services.xml_transformer.settings')
+    def test_engines_skip_pi_and_comments(self, mock_settings):
+        """Uchala dvigatel bir xil natija beradi: PI va izoh ichidagi AREA_ID o'zgarmaydi"""
+        mock_settings.XML_MAPPING_CACHE_DIR = ""
+
+        original = ('<?xml version="1.0" encoding="utf-8"?>\n'
+                    '<?app AREA_ID="101"?>\n'
+                    '<Root>\n'
+                    '  <!-- <Outlet AREA_ID="101"/> -->\n'
+                    '  <?marker AREA_ID="555" ?>\n'
+                    '  <Outlet AREA_ID="101" Name="A"/>\n'
+                    '  <Outlet AREA_ID="555">Matn</Outlet>\n'
+                    '</Root>')
+        results = {}
+        for engine in ("etree", "stream", "bytes"):
+            mock_settings.XML_TRANSFORM_ENGINE = engine
+            xml_path = os.path.join(self.test_dir, f"outlets_{engine}.xml")
+            with open(xml_path, 'w', encoding='utf-8') as f:
+                f.write(original)
+
+            self.assertTrue(self.transformer.process_outlets(xml_path))
+            with open(xml_path, encoding='utf-8') as f:
+                results[engine] = f.read()
+
+        def elements(text):
+            return [(e.tag, e.attrib, e.text) for e in ET.fromstring(text.encode('utf-8')).iter()]
+
+        self.assertEqual(elements(results["stream"]), elements(results["etree"]))
+        self.assertEqual(elements(results["bytes"]), elements(results["etree"]))
+        self.assertEqual([e.get('AREA_ID') for e in ET.fromstring(results["bytes"].encode('utf-8'))], ["202", "777"])
+        # PI'larni saqlaydigan dvigatellarda ularning matni aynan qoladi
+        for engine in ("stream", "bytes"):
+            self.assertIn('<?app AREA_ID="101"?>', results[engine])
+            self.assertIn('<?marker AREA_ID="555" ?>', results[engine])
+        self.assertIn('<!-- <Outlet AREA_ID="101"/> -->', results["bytes"])
+        print("✅ Dvigatellar (PI va izohlar) mosligi testi o'tdi.")
+
+    @patch('services.xml_transformer.settings')
+    def test_bytes_engine_ignores_attribute_text_in_values(self, mock_settings):
+        """Bayt rejimi: boshqa atribut qiymati ichidagi 'AREA_ID="..."' matni o'zgarmaydi"""
+        mock_settings.XML_TRANSFORM_ENGINE = "bytes"
+        mock_settings.XML_MAPPING_CACHE_DIR = ""
+
+        original = ('<Root>\n'
+                    '  <O NAME=\'x AREA_ID="101"\' AREA_ID="555"/>\n'
+                    '  <O NOTE="y AREA_ID=\'555\'" AREA_ID=\'101\'/>\n'
+                    '</Root>').encode('utf-8')
+        xml_path = os.path.join(self.test_dir, "outlets.xml")
+        with open(xml_path, 'wb') as f:
+            f.write(original)
+
+        self.assertTrue(self.transformer.process_outlets(xml_path))
+
+        expected = (original
+                    .replace(b'\' AREA_ID="555"', b'\' AREA_ID="777"')
+                    .replace(b'" AREA_ID=\'101\'', b'" AREA_ID=\'202\''))
+        with open(xml_path, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+        root = ET.parse(xml_path).getroot()
+        self.assertEqual([o.get('NAME') or o.get('NOTE') for o in root], ['x AREA_ID="101"', "y AREA_ID='555'"])
+        print("✅ Bayt rejimi (qiymat ichidagi atribut matni) testi o'tdi.")
+
+    @patch('services.xml_transformer.settings')
+    def test_process_outlets_bytes_engine_fallback(self, mock_settings):
+        """Bayt rejimi: UTF-16 fayl oqimli parser orqali qayta ishlanadi"""
+        mock_settings.XML_TRANSFORM_ENGINE = "bytes"
+        mock_settings.XML_MAPPING_CACHE_DIR = ""
+
+        xml_path = os.path.join(self.test_dir, "outlets.xml")
+        with open(xml_path, 'w', encoding='utf-16') as f:
+            f.write('<?xml version="1.0" encoding="utf-16"?><Root><Outlet AREA_ID="101"/></Root>')
+
+        self.assertTrue(self.transformer.process_outlets(xml_path))
+        self.assertEqual(ET.parse(xml_path).getroot()[0].get('AREA_ID'), "202")
+        print("✅ Bayt rejimi (parserga o'tish) testi o'tdi.")
+
+    def test_mappings_lazy(self):
+        """Konstruktor diskka murojaat qilmaydi, jadval birinchi foydalanishda yuklanadi"""
+        with patch('services.xml_transformer.load_mapping_file') as loader, \
+                patch('services.xml_transformer.load_rules') as rules_loader:
+            transformer = XMLTransformer(mapping_file=self.mapping_path)
+            loader.assert_not_called()
+            rules_loader.assert_not_called()
+
+            loader.return_value = {"1": "2"}
+            self.assertEqual(transformer.mappings, {"1": "2"})
+            self.assertEqual(transformer.mappings, {"1": "2"})
+            loader.assert_called_once()
+        print("✅ Mapping lazy yuklash testi o'tdi.")
+
+    def test_mapping_cache_invalidation(self):
+        """Kesh: o'zgarmagan manba JSON qayta parse qilinmaydi, kontent o'zgarsa yangilanadi"""
+        from services.mapping_cache import MappingCache
+
+        cache = MappingCache(os.path.join(self.test_dir, ".cache"))
+        self.assertEqual(cache.load(self.mapping_path), self.mapping_data)
+
+        with patch.object(MappingCache, '_parse', side_effect=AssertionError("parse qilinmasligi kerak")):
+            self.assertEqual(cache.load(self.mapping_path), self.mapping_data)
+
+            # Faqat mtime o'zgardi (kontent bir xil) - xesh mos, parse yo'q
+            stat = os.stat(self.mapping_path)
+            os.utime(self.mapping_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            self.assertEqual(cache.load(self.mapping_path), self.mapping_data)
+
+        with open(self.mapping_path, 'w', encoding='utf-8') as f:
+            json.dump({"101": "303"}, f)
+        stat = os.stat(self.mapping_path)
+        os.utime(self.mapping_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+        self.assertEqual(cache.load(self.mapping_path), {"101": "303"})
+        print("✅ Mapping kesh (mtime/xesh) testi o'tdi.")
+
+    def _write_rules(self, rules):
+        rules_path = os.path.join(self.test_dir, "rules.json")
+        with open(rules_path, 'w', encoding='utf-8') as f:
+            json.dump({"rules": rules}, f)
+        return rules_path
+
+    def test_process_file_multiple_rules(self):
+        """Qoidalar fayli: bir faylga bir nechta qoida bitta o'tishda qo'llanadi, hit'lar qoida bo'yicha"""
+        rules_path = self._write_rules([
+            {"name": "area", "files": "Outlets.xml", "attribute": "AREA_ID", "mapping": self.mapping_path},
+            {"name": "agent", "files": "*.xml", "element": "Agent", "attribute": "AGENT_ID", "mapping": {"7": "70"}},
+            {"name": "warehouse", "files": "Stocks.xml", "attribute": "WH_ID", "mapping": {"1": "10"}},
+        ])
+        transformer = XMLTransformer(mapping_file=self.mapping_path, rules_file=rules_path)
+        self.assertEqual(len(transformer.rules), 3)
+
+        xml_path = os.path.join(self.test_dir, "Outlets.xml")
+        with open(xml_path, 'w', encoding='utf-8') as f:
+            f.write('<Root><Outlet AREA_ID="101" AGENT_ID="7"/>'
+                    '<Agent AGENT_ID="7" AREA_ID="555"/><Agent AGENT_ID="8"/></Root>')
+
+        with patch('services.xml_transformer.stream_transform', wraps=stream_transform) as spy:
+            hits = transformer.process_file(xml_path)
+        self.assertEqual(spy.call_count, 1)
+        self.assertEqual(hits, {"area": 2, "agent": 1})
+
+        root = ET.parse(xml_path).getroot()
+        self.assertEqual(root[0].get('AREA_ID'), "202")
+        self.assertEqual(root[0].get('AGENT_ID'), "7")  # Agent qoidasi faqat <Agent> uchun
+        self.assertEqual(root[1].get('AGENT_ID'), "70")
+        self.assertEqual(root[1].get('AREA_ID'), "777")
+        self.assertEqual(root[2].get('AGENT_ID'), "8")
+        print("✅ Qoidalar fayli (bir o'tishda bir nechta qoida) testi o'tdi.")
+
+    def test_transform_files_process_pool(self):
+        """Jarayonlar puli: natijalar tartibda qaytadi, bitta buzilgan fayl qolganlariga ta'sir qilmaydi"""
+        rules_path = self._write_rules([
+            {"name": "area", "files": "Outlets.xml", "attribute": "AREA_ID", "mapping": self.mapping_path},
+        ])
+        transformer = XMLTransformer(mapping_file=self.mapping_path, rules_file=rules_path)
+
+        paths = []
+        for i, content in enumerate(['<Root><Outlet AREA_ID="101"/></Root>',
+                                     '<Root><Outlet AREA_ID="555"/><Broken></Root>',
+                                     '<Root><Outlet AREA_ID="999"/></Root>']):
+            folder = os.path.join(self.test_dir, str(i))
+            os.makedirs(folder)
+            paths.append(os.path.join(folder, "Outlets.xml"))
+            with open(paths[-1], 'w', encoding='utf-8') as f:
+                f.write(content)
+
+        results = transformer.transform_files(paths, workers=2)
+
+        self.assertEqual([r["file"] for r in results], paths)
+        self.assertEqual([r["changed"] for r in results], [True, False, False])
+        self.assertEqual(results[0]["hits"], {"area": 1})
+        self.assertIsNone(results[0]["error"])
+        self.assertIsNotNone(results[1]["error"])
+        self.assertIsNone(results[2]["error"])
+        self.assertTrue(all(r["seconds"] >= 0 for r in results))
+        self.assertEqual(ET.parse(paths[0]).getroot()[0].get('AREA_ID'), "202")
+        print("✅ Parallel transformatsiya (jarayonlar puli) testi o'tdi.")
+
+    def test_open_stream_matches_transform_stream(self):
+        """O'qiladigan oqim (feed): kichik bo'laklarda ham natija transform_stream bilan bir xil"""
+        import io
+        content = ('<?xml version="1.0" encoding="utf-8"?><Root>'
+                   + ''.join(f'<Outlet AREA_ID="{101 if i % 2 else 555}" NAME="Do\'kon {i}"/>' for i in range(200))
+                   + '</Root>').encode('utf-8')
+
+        expected = io.BytesIO()
+        expected_hits = self.transformer.transform_stream("Outlets.xml", io.BytesIO(content), expected)
+
+        reader = self.transformer.open_stream("Outlets.xml", io.BytesIO(content))
+        reader.chunk_size = 37
+        parts = []
+        while True:
+            part = reader.read(100)
+            if not part:
+                break
+            self.assertLessEqual(len(part), 100)
+            parts.append(part)
+
+        self.assertEqual(b"".join(parts), expected.getvalue())
+        self.assertEqual(reader.hits, expected_hits)
+        self.assertEqual(reader.hits, {"AREA_ID": 200})
+        print("✅ O'qiladigan transformatsiya oqimi testi o'tdi.")
+
+    def test_process_file_no_matching_rules(self):
+        """Fayl nomiga mos qoida bo'lmasa fayl o'qilmaydi va o'zgarmaydi"""
+        rules_path = self._write_rules([
+            {"files": "Stocks.xml", "attribute": "WH_ID", "mapping": {"1": "10"}},
+        ])
+        transformer = XMLTransformer(mapping_file=self.mapping_path, rules_file=rules_path)
+        self.assertEqual(transformer.rules[0].name, "*@WH_ID")
+
+        xml_path = os.path.join(self.test_dir, "Sales.xml")
+        with open(xml_path, 'w', encoding='utf-8') as f:
+            f.write('<Root><Sale WH_ID="1"/></Root>')
+
+        with patch('services.xml_transformer.stream_transform') as spy:
+            self.assertEqual(transformer.process_file(xml_path), {})
+        spy.assert_not_called()
+        print("✅ Qoidalar fayli (mos qoida yo'q) testi o'tdi.")
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,177 @@
+import os
+import time
+import uuid
+import sqlite3
+from contextlib import closing
+from typing import Callable, List, Tuple
+from core.config import settings
+from core.logger import logger
+
+PENDING = "pending"
+DEAD = "dead"  # BALTIKA_OUTBOX_MAX_ATTEMPTS tugadi - qo'lda ko'rib chiqish uchun saqlanadi
+
+# Yuborish davomida yozuv band qilinadi: parallel ishga tushgan drain uni qayta olmaydi.
+# Jarayon yiqilsa, shu vaqtdan keyin yozuv yana navbatga qaytadi.
+SEND_LEASE_SECONDS = 600
+
+
+class BaltikaOutbox:
+    """
+    Baltika API'ga yuborilmagan Monolit hisobotlarining lokal navbati (SQLite + XML fayllar).
+
+    Yuborish muvaffaqiyatsiz bo'lsa, XML payloads/ ga yoziladi va navbatga qo'yiladi.
+    Keyingi ishga tushirishda (yoki `main.py drain-outbox` bilan) eksponensial kutish
+    asosida qayta yuboriladi - og'ir hisobotni Smartup'dan qayta so'rash shart emas.
+    """
+
+    def __init__(self, base_dir: str = None):
+        self.base_dir = base_dir or os.path.join(settings.BALTIKA_OUTBOX_DIR, settings.COMPANY_NAME)
+        self.payload_dir = os.path.join(self.base_dir, "payloads")
+        self.db_path = os.path.join(self.base_dir, "outbox.db")
+
+    # === YORDAMCHI FUNKSIYALAR ===
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self.payload_dir, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " report_type TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " last_error TEXT,"
+            " leased_until REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+        if "leased_until" not in columns:
+            # Avvalgi sxema bilan yaratilgan baza
+            conn.execute("ALTER TABLE outbox ADD COLUMN leased_until REAL NOT NULL DEFAULT 0")
+        return conn
+
+    @staticmethod
+    def backoff(attempts: int) -> float:
+        """attempts-marta muvaffaqiyatsiz bo'lgandan keyingi kutish (soniya)."""
+        wait = settings.BALTIKA_OUTBOX_BASE_WAIT * (2 ** max(0, attempts - 1))
+        return min(wait, settings.BALTIKA_OUTBOX_MAX_WAIT)
+
+    def _claim(self, now: float, force: bool):
+        """
+        Navbatdagi vaqti kelgan yozuvni oladi va SEND_LEASE_SECONDS ga band qiladi.
+        force faqat kutish vaqtini (next_attempt_at) e'tiborsiz qoldiradi - band qilingan yozuv hech qachon olinmaydi.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            query = "SELECT id, report_type, payload, attempts FROM outbox WHERE status = ? AND leased_until <= ?"
+            params = [PENDING, now]
+            if not force:
+                query += " AND next_attempt_at <= ?"
+                params.append(now)
+            row = conn.execute(query + " ORDER BY id LIMIT 1", params).fetchone()
+            if row:
+                conn.execute("UPDATE outbox SET leased_until = ? WHERE id = ?",
+                             (now + SEND_LEASE_SECONDS, row[0]))
+            conn.commit()
+            return row
+
+    # === ASOSIY FUNKSIYALAR ===
+
+    def enqueue(self, report_type: str, content: bytes, error: str = "") -> int:
+        """Hisobotni navbatga qo'yadi. Birinchi qayta urinish BALTIKA_OUTBOX_BASE_WAIT dan keyin."""
+        with closing(self._connect()) as conn:
+            payload = f"{uuid.uuid4().hex}.xml"
+            payload_path = os.path.join(self.payload_dir, payload)
+            tmp_path = payload_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, payload_path)
+
+            now = time.time()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO outbox (report_type, payload, size, created_at, attempts, next_attempt_at, last_error)"
+                    " VALUES (?, ?, ?, ?, 1, ?, ?)",
+                    (report_type, payload, len(content), now, now + self.backoff(1), error),
+                )
+            logger.info(f"📮 Отчет {report_type} поставлен в очередь повторной отправки (#{cursor.lastrowid}).")
+            return cursor.lastrowid
+
+    def pending(self) -> List[Tuple[int, str, int]]:
+        """Navbatdagi yozuvlar: [(id, report_type, attempts)]."""
+        if not os.path.exists(self.db_path):
+            return []
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT id, report_type, attempts FROM outbox WHERE status = ? ORDER BY id", (PENDING,)
+            ).fetchall()
+
+    def drain(self, sender: Callable[[str, str], bool], force: bool = False) -> Tuple[int, int]:
+        """
+        Vaqti kelgan yozuvlarni eskisidan boshlab sender(fayl_yo'li, report_type) orqali yuboradi.
+        Muvaffaqiyatli bo'lsa yozuv va fayl o'chiriladi, aks holda keyingi urinish kechiktiriladi.
+        Birinchi muvaffaqiyatsizlikda to'xtaydi (server ishlamayotgan bo'lsa qolganlarini urinmaslik uchun).
+        force=True - kutish vaqtiga qaramaslik. Qaytadi: (yuborilgan, muvaffaqiyatsiz).
+        """
+        if not os.path.exists(self.db_path):
+            return 0, 0
+
+        sent = failed = 0
+        while True:
+            row = self._claim(time.time(), force)
+            if row is None:
+                break
+            entry_id, report_type, payload, attempts = row
+            payload_path = os.path.join(self.payload_dir, payload)
+
+            logger.info(f"📮 Повторная отправка из очереди: {report_type} (#{entry_id}, попытка {attempts + 1})")
+            missing = not os.path.exists(payload_path)
+            if not missing:
+                try:
+                    ok = sender(payload_path, report_type)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка повторной отправки #{entry_id}: {e}")
+                    ok = False
+                error = "" if ok else "Отправка не удалась"
+            else:
+                ok, error = False, "Файл очереди не найден"
+
+            with closing(self._connect()) as conn, conn:
+                if ok:
+                    conn.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+                else:
+                    attempts += 1
+                    max_attempts = settings.BALTIKA_OUTBOX_MAX_ATTEMPTS
+                    status = DEAD if missing or (max_attempts and attempts >= max_attempts) else PENDING
+                    conn.execute(
+                        "UPDATE outbox SET attempts = ?, next_attempt_at = ?, status = ?, last_error = ?,"
+                        " leased_until = 0 WHERE id = ?",
+                        (attempts, time.time() + self.backoff(attempts), status, error, entry_id),
+                    )
+                    if status == DEAD:
+                        logger.warning(f"⚠️ Отчет {report_type} (#{entry_id}) исключен из очереди после {attempts} попыток: {error}")
+
+            if ok:
+                sent += 1
+                try:
+                    os.remove(payload_path)
+                except OSError:
+                    pass
+            else:
+                failed += 1
+                if not missing:
+                    break
+
+        left = len(self.pending())
+        if sent or failed or left:
+            logger.info(f"📮 Очередь Baltika: отправлено {sent}, ошибок {failed}, осталось {left}.")
+        return sent, failed
+
+
+# Singleton instance
+baltika_outbox = BaltikaOutbox()
@@ -2,9 +2,17 @@ import os
 import zipfile
 import io
 import shutil
-from typing import List
+import tempfile
+import zlib
+import xml.sax
+import uuid
+import threading
+from typing import Callable, Dict, List, Tuple, Union
 from datetime import datetime
+from core.config import settings
+from core.exceptions import InvalidZipFileError, StreamTransformError
 from core.logger import logger
+from utils.upload_source import UploadSource
 
 
 class FileHandler:
@@ -12,17 +20,77 @@ class FileHandler:
         self.base_path = base_path or os.getcwd()
         self.temp_dir = os.path.join(self.base_path, "temp_extract")
         self.backups_dir = os.path.join(self.base_path, "backups")
+        # Hisoblagichlar parallel yuklash/ochish/yuborish oqimlaridan yangilanadi
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Bosqichlar bo'yicha bayt hisoblagichlarini nolga tushiradi."""
+        with self._stats_lock:
+            self._reset_stats()
+
+    def _reset_stats(self):
+        self.stats = {
+            "zip_compressed": 0,    # Arxivdan o'qilgan siqilgan baytlar
+            "unzipped": 0,          # Ochilgan (decompress) baytlar
+            "transform_in": 0,      # Shundan transformatsiyadan o'tgan baytlar
+            "disk_written": 0,      # temp_extract ga yozilgan baytlar (transformatsiya qayta yozishi bilan)
+            "transform_disk_read": 0,  # Alohida transformatsiya bosqichida diskdan qayta o'qilgan baytlar
+            "transformed_files": 0,
+        }
+        # Ochish/yuborish paytidagi transformatsiya natijalari: {kalit: (fayl_nomi, {qoida: almashtirishlar})}
+        self.transform_hits = {}
+
+    def add_stats(self, **counters: int):
+        with self._stats_lock:
+            for name, value in counters.items():
+                self.stats[name] += value
+
+    def add_transform_hits(self, file_name: str, hits: Dict[str, int], key=None):
+        """
+        Fayl bo'yicha qoidalar natijasini yozadi (main.py ularni hisobotga chiqaradi).
+        Bir xil key bilan qayta yozilsa (masalan, oqim qayta yuborilganda) oldingisi almashtiriladi.
+        """
+        with self._stats_lock:
+            self.transform_hits[key if key is not None else object()] = (file_name, dict(hits))
+
+    def transform_results(self) -> List[Tuple[str, Dict[str, int]]]:
+        with self._stats_lock:
+            return list(self.transform_hits.values())
+
+    def stats_summary(self) -> str:
+        mb = 1024 * 1024
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return (f"ZIP {stats['zip_compressed'] / mb:.1f} МБ, "
+                f"распаковано {stats['unzipped'] / mb:.1f} МБ, "
+                f"преобразовано при распаковке {stats['transform_in'] / mb:.1f} МБ "
+                f"({stats['transformed_files']} файлов), "
+                f"повторно прочитано для трансформации {stats['transform_disk_read'] / mb:.1f} МБ, "
+                f"записано на диск {stats['disk_written'] / mb:.1f} МБ.")
 
     # === ESKI FUNKSIYALAR (SALESWORK ZIP UCHUN) ===
 
+    def new_backup_zip_path(self) -> str:
+        """
+        Возвращает новый (уникальный) путь для ZIP-файла в папке бэкапов.
+        Fayl shu yerning o'zida O_EXCL bilan yaratiladi: parallel yuklashlar bir xil nom ololmaydi.
+        """
+        os.makedirs(self.backups_dir, exist_ok=True)
+
+        while True:
+            # Fayl nomini yaratish (vaqt + tasodifiy qism)
+            timestamp_full = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            file_path = os.path.join(self.backups_dir, f'report_{timestamp_full}_{uuid.uuid4().hex[:8]}.zip')
+            try:
+                os.close(os.open(file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                return file_path
+            except FileExistsError:
+                continue
+
     def save_zip_to_backup(self, content: bytes) -> str:
         """Сохраняет полученные байты как ZIP-файл в папку резервного копирования."""
-        if not os.path.exists(self.backups_dir):
-            os.makedirs(self.backups_dir)
-
-        # Fayl nomini yaratish
-        timestamp_full = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-        file_path = os.path.join(self.backups_dir, f'report_{timestamp_full}.zip')
+        file_path = self.new_backup_zip_path()
 
         with open(file_path, 'wb') as f:
             f.write(content)
@@ -30,25 +98,34 @@ class FileHandler:
         logger.info(f"Резервная копия сохранена: {os.path.basename(file_path)}")
         return file_path
 
-    def extract_zip(self, zip_content: bytes) -> List[str]:
+    def extract_zip(self, zip_content: Union[bytes, str], target_dir: str = None, transformer=None) -> List[str]:
         """
-        Распаковывает ZIP-файл во временную папку.
+        Распаковывает ZIP-файл во временную папку (или в target_dir).
+        Принимает байты архива или путь к ZIP-файлу на диске.
+        Если передан transformer, нужные XML преобразуются прямо при распаковке.
         Возвращает список ТОЛЬКО тех файлов, которые были в этом архиве.
         """
-        if not os.path.exists(self.temp_dir):
-            os.makedirs(self.temp_dir)
+        target_dir = target_dir or self.temp_dir
+        if not os.path.exists(target_dir):
+            os.makedirs(target_dir)
 
         new_xml_files = []
 
         try:
-            with zipfile.ZipFile(io.BytesIO(zip_content)) as zf:
-                zf.extractall(self.temp_dir)
+            # Fayl yo'li berilsa, arxivni xotiraga o'qimasdan diskdan ochamiz
+            zip_source = zip_content if isinstance(zip_content, str) else io.BytesIO(zip_content)
+            with zipfile.ZipFile(zip_source) as zf:
+                if transformer is not None or settings.ZIP_VALIDATE_ON_EXTRACT:
+                    self._extract_validated(zf, target_dir, transformer)
+                else:
+                    zf.extractall(target_dir)
+                    self._count_plain(zf.infolist())
 
                 for file_name in zf.namelist():
                     # Faqat XML fayllarni olamiz
                     if file_name.lower().endswith('.xml'):
                         # To'liq yo'lni yasaymiz
-                        full_path = os.path.join(self.temp_dir, file_name)
+                        full_path = os.path.join(target_dir, file_name)
                         # Agar ZIP ichida papkalar bo'lsa, ularni to'g'ri slash bilan to'g'rilaymiz
                         full_path = os.path.normpath(full_path)
                         new_xml_files.append(full_path)
@@ -61,6 +138,118 @@ class FileHandler:
 
         return new_xml_files
 
+    def _count_plain(self, members: List[zipfile.ZipInfo]):
+        for member in members:
+            self.add_stats(zip_compressed=member.compress_size, unzipped=member.file_size,
+                           disk_written=member.file_size)
+
+    def _extract_validated(self, zf: zipfile.ZipFile, target_dir: str, transformer=None):
+        """
+        Arxivni bitta o'tishda tekshirib ochadi: har bir fayl ochilayotganda CRC solishtiriladi.
+        Avval alohida (staging) papkaga yoziladi; arxiv buzilgan bo'lsa, temp_extract ga
+        hech qanday fayl tushmaydi va InvalidZipFileError ko'tariladi.
+        transformer berilsa, unga kerakli a'zolar ochilish oqimidan to'g'ridan-to'g'ri o'zgartirilib yoziladi.
+        """
+        staging_dir = tempfile.mkdtemp(prefix="temp_extract_staging_", dir=self.base_path)
+        try:
+            try:
+                for member in zf.infolist():
+                    if transformer is not None and not member.is_dir() and transformer.wants(member.filename):
+                        self._extract_transformed(zf, member, staging_dir, transformer)
+                    else:
+                        zf.extract(member, staging_dir)
+                        self._count_plain([member])
+            except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                raise InvalidZipFileError(f"ZIP-файл поврежден (ошибка CRC/распаковки): {e}")
+
+            # Hammasi to'g'ri - fayllarni asosiy papkaga ko'chiramiz
+            for root, _, files in os.walk(staging_dir):
+                target_root = os.path.join(target_dir, os.path.relpath(root, staging_dir))
+                os.makedirs(target_root, exist_ok=True)
+                for file_name in files:
+                    os.replace(os.path.join(root, file_name), os.path.join(target_root, file_name))
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _extract_transformed(self, zf: zipfile.ZipFile, member: zipfile.ZipInfo, staging_dir: str, transformer):
+        """
+        A'zoni ochish va transformatsiyani bitta oqimda bajaradi: fayl diskka faqat bir marta,
+        allaqachon o'zgartirilgan holda yoziladi. XML buzilgan bo'lsa, a'zo o'zgarishsiz ochiladi.
+        """
+        target_path = os.path.normpath(os.path.join(staging_dir, member.filename))
+        if not target_path.startswith(os.path.abspath(staging_dir) + os.sep):
+            # Xavfli yo'l (../) - oddiy extract o'zi tozalab oladi
+            zf.extract(member, staging_dir)
+            self._count_plain([member])
+            return
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+        source = _CountingReader(zf.open(member))
+        try:
+            with open(target_path, 'wb') as out:
+                hits = transformer.transform_stream(member.filename, source, out)
+        except (zipfile.BadZipFile, zlib.error, EOFError):
+            raise
+        except Exception as e:
+            logger.warning(f"Ошибка трансформации {member.filename} при распаковке, файл сохранен без изменений: {e}")
+            zf.extract(member, staging_dir)
+            self._count_plain([member])
+            return
+        finally:
+            source.close()
+
+        self.add_stats(zip_compressed=member.compress_size, unzipped=source.bytes_read,
+                       transform_in=source.bytes_read, disk_written=os.path.getsize(target_path),
+                       transformed_files=1)
+        self.add_transform_hits(os.path.basename(member.filename), hits)
+        details = ", ".join(f"{name}: {count}" for name, count in hits.items())
+        logger.info(f"Преобразован при распаковке: {member.filename} ({details})")
+
+    @staticmethod
+    def _open_archive(zip_content: Union[bytes, str]) -> zipfile.ZipFile:
+        return zipfile.ZipFile(zip_content if isinstance(zip_content, str) else io.BytesIO(zip_content))
+
+    def zip_upload_sources(self, zip_content: Union[bytes, str], transformer=None) -> List[UploadSource]:
+        """
+        ZIP dagi XML fayllarni diskka ochmasdan, yuklash manbalari (UploadSource) sifatida qaytaradi.
+        Har bir manba o'qilganda a'zo arxivdan oqim bilan ochiladi; transformer berilsa, kerakli
+        a'zolar yo'l-yo'lakay o'zgartiriladi. Transformatsiya xatosi StreamTransformError bo'lib,
+        yuklashni to'xtatadi.
+        ZIP_VALIDATE_ON_EXTRACT yoqilgan bo'lsa (yuklab olishda testzip() o'tkazib yuborilgan), CRC shu yerda,
+        yuklashdan oldin tekshiriladi - buzilgan arxivdan serverga hech narsa yuborilmaydi.
+        """
+        try:
+            with self._open_archive(zip_content) as zf:
+                members = [m for m in zf.infolist() if not m.is_dir() and m.filename.lower().endswith('.xml')]
+                if settings.ZIP_VALIDATE_ON_EXTRACT:
+                    try:
+                        bad_member = zf.testzip()
+                    except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                        bad_member = f"{e}"
+                    if bad_member is not None:
+                        raise InvalidZipFileError(f"ZIP-файл поврежден (ошибка CRC/распаковки): {bad_member}")
+        except Exception as e:
+            logger.error(f"Ошибка при чтении ZIP: {e}")
+            raise e
+
+        sources = [UploadSource(os.path.basename(member.filename),
+                                self._member_opener(zip_content, member, transformer),
+                                member.file_size)
+                   for member in members]
+        logger.info(f"ZIP-файл подготовлен к потоковой отправке (без распаковки): {len(sources)} XML.")
+        return sources
+
+    def _member_opener(self, zip_content: Union[bytes, str], member: zipfile.ZipInfo, transformer) -> Callable:
+        if transformer is not None and not transformer.wants(member.filename):
+            transformer = None
+
+        hits_key = object()  # Qayta yuborishda natija takrorlanmasligi uchun manba bo'yicha kalit
+
+        def opener():
+            return _ZipMemberReader(self, self._open_archive(zip_content), member, transformer, hits_key)
+
+        return opener
+
     # === YANGI QO'SHILGAN FUNKSIYALAR (MONOLIT UCHUN) ===
 
     def save_monolit_to_backup(self, content: bytes, report_type: str) -> str:
@@ -116,5 +305,64 @@ class FileHandler:
             logger.info("Старые бэкапы и временная папка очищены.")
 
 
+class _CountingReader:
+    """Fayl-obyekt o'rami: o'qilgan baytlarni sanaydi."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def close(self):
+        self.raw.close()
+
+
+class _ZipMemberReader:
+    """
+    UploadSource oqimi: ZIP a'zosini (kerak bo'lsa transformatsiya bilan) o'qiydi.
+    Yopilganda arxiv yopiladi va FileHandler bayt hisoblagichlari yangilanadi.
+    """
+
+    def __init__(self, handler: FileHandler, zf: zipfile.ZipFile, member: zipfile.ZipInfo, transformer, hits_key=None):
+        self.handler = handler
+        self.zf = zf
+        self.member = member
+        self.hits_key = hits_key
+        self.raw = _CountingReader(zf.open(member))
+        self.stream = transformer.open_stream(member.filename, self.raw) if transformer else self.raw
+        self.transformed = transformer is not None
+        self.finished = False
+
+    def read(self, size: int = -1) -> bytes:
+        try:
+            data = self.stream.read(size)
+        except xml.sax.SAXException as e:
+            # IOError bo'lsa yuklash qayta urinardi - bu yerda qayta urinish yordam bermaydi
+            raise StreamTransformError(f"Ошибка трансформации {self.member.filename}, отправка остановлена: {e}")
+        if size is None or size < 0 or (not data and size != 0):
+            self.finished = True
+        return data
+
+    def close(self):
+        self.raw.close()
+        self.zf.close()
+        self.handler.add_stats(zip_compressed=self.member.compress_size, unzipped=self.raw.bytes_read)
+        if self.transformed and self.finished:
+            self.handler.add_stats(transform_in=self.raw.bytes_read, transformed_files=1)
+            self.handler.add_transform_hits(os.path.basename(self.member.filename), self.stream.hits, self.hits_key)
+            details = ", ".join(f"{name}: {count}" for name, count in self.stream.hits.items())
+            logger.info(f"Преобразован при отправке: {self.member.filename} ({details})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 # Singleton instance
 file_handler = FileHandler()
\ No newline at end of file
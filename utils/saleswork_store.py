@@ -0,0 +1,275 @@
+import os
+import json
+import shutil
+import xml.etree.ElementTree as ET
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from core.config import settings
+from core.logger import logger
+from core.exceptions import IncrementalStoreError
+
+
+class SalesworkStore:
+    """
+    Saleswork XML qatorlarining lokal ombori (shablon va kun bo'yicha).
+
+    Sanaga bog'liq fayllar (masalan Sales.xml) qatorlari kunlarga bo'lib saqlanadi.
+    Har kecha faqat oxirgi bir necha kun Smartup'dan olinadi, to'liq davrdagi
+    fayllar esa ombordan lokal ravishda qayta yig'iladi.
+    Sanasiz (ma'lumotnoma) fayllar har safar yangi yuklangan holida qoldiriladi.
+    """
+
+    DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%Y%m%d")
+
+    def __init__(self, base_dir: str = None, date_attrs: List[str] = None):
+        self.base_dir = base_dir or os.path.join(settings.SALESWORK_STORE_DIR, settings.COMPANY_NAME)
+        self.date_attrs = date_attrs or settings.get_incremental_date_attrs
+
+    # === YORDAMCHI FUNKSIYALAR ===
+
+    def _template_dir(self, template_id: int) -> str:
+        return os.path.join(self.base_dir, str(template_id))
+
+    def _day_dir(self, template_id: int, day: date) -> str:
+        return os.path.join(self._template_dir(template_id), "days", day.isoformat())
+
+    def _load_meta(self, template_id: int) -> dict:
+        meta_path = os.path.join(self._template_dir(template_id), "meta.json")
+        if not os.path.exists(meta_path):
+            return {"days": [], "dated_files": []}
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_meta(self, template_id: int, meta: dict):
+        template_dir = self._template_dir(template_id)
+        os.makedirs(template_dir, exist_ok=True)
+        meta_path = os.path.join(template_dir, "meta.json")
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, meta_path)
+
+    def _row_date(self, row: ET.Element) -> Optional[date]:
+        """Qator atributlaridan sanani topadi (topilmasa None)."""
+        for attr in self.date_attrs:
+            value = row.get(attr)
+            if not value:
+                continue
+            for fmt in self.DATE_FORMATS:
+                try:
+                    return datetime.strptime(value[:10], fmt).date()
+                except ValueError:
+                    continue
+        return None
+
+    @staticmethod
+    def _days(begin: date, end: date) -> List[date]:
+        return [begin + timedelta(days=i) for i in range((end - begin).days + 1)]
+
+    @staticmethod
+    def _write_xml(root: ET.Element, file_path: str):
+        ET.ElementTree(root).write(file_path, encoding='utf-8', xml_declaration=True)
+
+    # === ASOSIY FUNKSIYALAR ===
+
+    def get_fetch_begin(self, template_id: int, begin: datetime, end: datetime) -> datetime:
+        """
+        Smartup'dan qaysi sanadan boshlab yuklash kerakligini aniqlaydi.
+        Faqat ombor butun davrni qoplasa va oldingi yuklashdagi har bir fayl tasniflangan bo'lsa
+        (kamida bitta sanali fayl bor) - oxirgi SALESWORK_INCREMENTAL_DAYS kun, aks holda to'liq davr.
+        """
+        trailing_days = max(1, settings.SALESWORK_INCREMENTAL_DAYS)
+        trailing_begin = end - timedelta(days=trailing_days - 1)
+        if trailing_begin <= begin:
+            return begin
+
+        meta = self._load_meta(template_id)
+        stored_days = set(meta.get("days", []))
+        dated_files = set(meta.get("dated_files", []))
+        required = self._days(begin.date(), (trailing_begin - timedelta(days=1)).date())
+        if (dated_files and dated_files <= set(meta.get("files", []))
+                and all(day.isoformat() in stored_days for day in required)):
+            return trailing_begin
+
+        logger.info(f"Инкрементальное хранилище шаблона {template_id} неполное, загружается полный период.")
+        return begin
+
+    def _find_rows(self, root: ET.Element) -> Optional[str]:
+        """
+        Sanali qatorlar joylashgan element yo'li (ildizning o'zi bo'lsa "."), topilmasa None.
+        Qatorlar ichma-ich joylashgan bo'lsa (<Root><Rows><Row DATE=.../></Rows></Root>) ham topiladi.
+        """
+        queue = [(root, ".")]
+        while queue:
+            element, path = queue.pop(0)
+            if any(self._row_date(child) for child in element):
+                return path
+            for child in element:
+                queue.append((child, child.tag if path == "." else f"{path}/{child.tag}"))
+        return None
+
+    def _undated_file(self, template_id: int, file_name: str) -> str:
+        return os.path.join(self._template_dir(template_id), "undated", file_name)
+
+    def ingest(self, template_id: int, xml_files: List[str], begin: datetime, end: datetime,
+               period_begin: datetime = None):
+        """
+        Yangi yuklangan fayllardagi qatorlarni kunlarga bo'lib omborga yozadi.
+        begin..end (yuklangan oyna) kunlari to'liq almashtiriladi (kechikkan tuzatishlar uchun).
+        Oynadan tashqari, lekin period_begin..end ichidagi sanali qatorlar o'z kuniga qo'shiladi;
+        sanasiz (masalan, jami) va davrdan tashqari qatorlar oxirgi yuklangan holida alohida saqlanadi.
+        Qisqartirilgan yuklashda (begin > period_begin) sanali fayllar to'plami oldingisidan farq qilsa -
+        ombor to'liq emas deb belgilanadi va IncrementalStoreError ko'tariladi (ma'lumot yo'qolmasligi uchun).
+        """
+        meta = self._load_meta(template_id)
+        period_begin = period_begin or begin
+        narrowed = begin.date() > period_begin.date()
+        prev_dated = set(meta.get("dated_files", []))
+        prev_containers = meta.get("containers", {})
+        fetched_days = self._days(begin.date(), end.date())
+
+        file_names, dated_files, containers, roots = set(), set(), {}, {}
+        buckets = {}   # {kun: {fayl_nomi: [qatorlar]}} - yuklangan oyna kunlari
+        late = {}      # {kun: {fayl_nomi: [qatorlar]}} - oynadan tashqari, davr ichidagi kunlar
+        undated = {}   # {fayl_nomi: [qatorlar]}
+        for xml_file in xml_files:
+            file_name = os.path.basename(xml_file)
+            file_names.add(file_name)
+            root = ET.parse(xml_file).getroot()
+
+            path = self._find_rows(root)
+            if path is None and file_name in prev_dated:
+                # Oynada birorta qator yo'q - fayl baribir sanaga bog'liq
+                container = root.find(prev_containers.get(file_name, "."))
+                if container is not None and len(container) == 0:
+                    path = prev_containers.get(file_name, ".")
+            if path is None:
+                continue  # Ma'lumotnoma fayli: yangi yuklangan holida qoladi
+
+            dated_files.add(file_name)
+            containers[file_name] = path
+            roots[file_name] = root
+            for row in root.find(path):
+                row_day = self._row_date(row)
+                if row_day is None or not period_begin.date() <= row_day <= end.date():
+                    undated.setdefault(file_name, []).append(row)
+                elif row_day < begin.date():
+                    late.setdefault(row_day, {}).setdefault(file_name, []).append(row)
+                else:
+                    buckets.setdefault(row_day, {}).setdefault(file_name, []).append(row)
+
+        if narrowed:
+            missing = sorted(prev_dated - file_names)
+            changed = sorted(prev_dated ^ dated_files)
+            if missing or changed:
+                meta["days"] = []
+                self._save_meta(template_id, meta)
+                raise IncrementalStoreError(
+                    f"Шаблон {template_id}: набор файлов с датами изменился "
+                    f"(нет: {missing or '-'}, изменились: {changed or '-'}). "
+                    f"Загружены только последние дни - данные не отправлены, "
+                    f"при следующем запуске будет загружен полный период."
+                )
+
+        for day in fetched_days:
+            day_dir = self._day_dir(template_id, day)
+            if os.path.exists(day_dir):
+                shutil.rmtree(day_dir)
+            os.makedirs(day_dir)
+
+            for file_name, root in roots.items():
+                day_root = ET.Element(root.tag, root.attrib)
+                day_root.extend(buckets.get(day, {}).get(file_name, []))
+                self._write_xml(day_root, os.path.join(day_dir, file_name))
+
+        for day, files in late.items():
+            # Mavjud kunga qo'shiladi; bir xil qator takroran qo'shilmaydi
+            day_dir = self._day_dir(template_id, day)
+            os.makedirs(day_dir, exist_ok=True)
+            for file_name, rows in files.items():
+                day_file = os.path.join(day_dir, file_name)
+                if os.path.exists(day_file):
+                    day_root = ET.parse(day_file).getroot()
+                else:
+                    day_root = ET.Element(roots[file_name].tag, roots[file_name].attrib)
+                known = {ET.tostring(row) for row in day_root}
+                day_root.extend(row for row in rows if ET.tostring(row) not in known)
+                self._write_xml(day_root, day_file)
+
+        undated_dir = os.path.join(self._template_dir(template_id), "undated")
+        if os.path.exists(undated_dir):
+            shutil.rmtree(undated_dir)
+        for file_name, rows in undated.items():
+            os.makedirs(undated_dir, exist_ok=True)
+            undated_root = ET.Element(roots[file_name].tag, roots[file_name].attrib)
+            undated_root.extend(rows)
+            self._write_xml(undated_root, self._undated_file(template_id, file_name))
+
+        days = set(meta.get("days", []))
+        days.update(day.isoformat() for day in fetched_days)
+        meta["days"] = sorted(days)
+        meta["dated_files"] = sorted(dated_files)
+        meta["files"] = sorted(file_names)
+        meta["containers"] = containers
+        self._save_meta(template_id, meta)
+
+        logger.info(f"Инкрементальное хранилище обновлено: шаблон {template_id}, дней: {len(fetched_days)}.")
+
+    def rebuild(self, template_id: int, xml_files: List[str], begin: datetime, end: datetime) -> List[str]:
+        """
+        Sanaga bog'liq fayllarni ombordan begin..end davri uchun qayta yig'adi
+        (xml_files ichidagi fayllar joyida qayta yoziladi) va eskirgan kunlarni o'chiradi.
+        Qatorlar konteyneri kunlar tartibida to'ldiriladi, sanasiz qatorlar oxiriga qo'shiladi;
+        konteynerdan tashqaridagi elementlar yangi yuklangan fayldagidek qoladi.
+        """
+        meta = self._load_meta(template_id)
+        dated_files = set(meta.get("dated_files", []))
+        containers = meta.get("containers", {})
+        period_days = self._days(begin.date(), end.date())
+
+        rebuilt = []
+        for xml_file in xml_files:
+            file_name = os.path.basename(xml_file)
+            if file_name not in dated_files:
+                continue
+
+            full_root = ET.parse(xml_file).getroot()
+            container = full_root.find(containers.get(file_name, "."))
+            if container is None:
+                continue
+
+            rows = []
+            for day in period_days:
+                day_file = os.path.join(self._day_dir(template_id, day), file_name)
+                if os.path.exists(day_file):
+                    rows.extend(ET.parse(day_file).getroot())
+            undated_file = self._undated_file(template_id, file_name)
+            if os.path.exists(undated_file):
+                rows.extend(ET.parse(undated_file).getroot())
+            container[:] = rows
+
+            self._write_xml(full_root, xml_file)
+            rebuilt.append(xml_file)
+            logger.info(f"Файл {file_name} собран из хранилища: {len(rows)} строк.")
+
+        self._prune(template_id, meta, begin.date())
+        return rebuilt
+
+    def _prune(self, template_id: int, meta: dict, keep_from: date):
+        """Davrdan tashqaridagi (eski) kunlarni ombordan o'chiradi."""
+        kept_days = []
+        for day_str in meta.get("days", []):
+            if day_str < keep_from.isoformat():
+                day_dir = os.path.join(self._template_dir(template_id), "days", day_str)
+                if os.path.exists(day_dir):
+                    shutil.rmtree(day_dir)
+            else:
+                kept_days.append(day_str)
+
+        if len(kept_days) != len(meta.get("days", [])):
+            meta["days"] = kept_days
+            self._save_meta(template_id, meta)
+
+
+# Singleton instance
+saleswork_store = SalesworkStore()
@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional, Tuple
+from core.config import settings
+from core.logger import logger
+
+
+class UploadManifest:
+    """
+    Muvaffaqiyatli yuklangan fayllarning kontent xeshlari (klient va manzil bo'yicha).
+    Keyingi ishga tushirishda o'zgarmagan fayllar qayta yuborilmaydi.
+    """
+
+    def __init__(self, file_path: str = None):
+        self.file_path = file_path or settings.UPLOAD_MANIFEST_FILE
+
+    @staticmethod
+    def file_hash(path: str) -> str:
+        """Faylning SHA-256 xeshini bo'laklab hisoblaydi."""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.file_path):
+            return {}
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Манифест загрузок поврежден, будет создан заново: {e}")
+            return {}
+
+    def _save(self, data: dict):
+        manifest_dir = os.path.dirname(self.file_path)
+        if manifest_dir and not os.path.exists(manifest_dir):
+            os.makedirs(manifest_dir)
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.file_path)
+
+    def filter_changed(self, client: str, destination: str, file_paths: List[str],
+                       force: bool = False) -> Tuple[List[str], List[str], Dict[str, str]]:
+        """
+        Fayllarni yuborilishi kerak bo'lgan va o'zgarmagan (o'tkazib yuboriladigan) larga ajratadi.
+        Qaytadi: (yuboriladiganlar, o'tkazib yuborilganlar, {yo'l: xesh}).
+        """
+        known = self._load().get(client, {}).get(destination, {})
+
+        to_send, skipped, hashes = [], [], {}
+        for path in file_paths:
+            hashes[path] = self.file_hash(path)
+            if not force and known.get(os.path.basename(path)) == hashes[path]:
+                skipped.append(path)
+            else:
+                to_send.append(path)
+        return to_send, skipped, hashes
+
+    def record(self, client: str, destination: str, hashes: Dict[str, str]):
+        """Muvaffaqiyatli yuklangan fayllar xeshlarini manifestga yozadi."""
+        data = self._load()
+        entries = data.setdefault(client, {}).setdefault(destination, {})
+        for path, file_hash in hashes.items():
+            entries[os.path.basename(path)] = file_hash
+        self._save(data)
+
+
+def staged_file_name(local_path: str) -> str:
+    """
+    Atomar yuklash uchun vaqtinchalik nom: Sales.xml -> Sales.xml.<xesh>.part.
+    Nomda kontent xeshi bor, shuning uchun serverdagi qoldiq fayl faqat aynan shu kontent bo'lsa qayta ishlatiladi.
+    """
+    digest = UploadManifest.file_hash(local_path)[:16]
+    return f"{os.path.basename(local_path)}.{digest}{settings.UPLOAD_TEMP_SUFFIX}"
+
+
+def staged_base_name(entry: str) -> Optional[str]:
+    """
+    Serverdagi nom vaqtinchalik (staged) nom bo'lsa, asl fayl nomini qaytaradi, aks holda None.
+    Sales.xml.<xesh yoki token><UPLOAD_TEMP_SUFFIX> -> Sales.xml (suffiksdagi nuqtalar soni ahamiyatsiz).
+    """
+    suffix = settings.UPLOAD_TEMP_SUFFIX
+    if not suffix or not entry.endswith(suffix):
+        return None
+    base, dot, token = entry[:-len(suffix)].rpartition('.')
+    return base if dot and base and token else None
+
+
+# Singleton instance
+upload_manifest = UploadManifest()
@@ -0,0 +1,51 @@
+import os
+import hashlib
+from typing import BinaryIO, Callable, Union
+
+
+class UploadSource:
+    """
+    Diskda alohida fayl sifatida mavjud bo'lmagan yuklash manbasi (masalan, ZIP arxiv a'zosi).
+    open() har safar yangi oqim qaytaradi - qayta urinishda fayl boshidan o'qiladi.
+    size - taxminiy hajm (navbat tartibi va log uchun); transformatsiyadan keyin farq qilishi mumkin.
+    """
+
+    def __init__(self, name: str, opener: Callable[[], BinaryIO], size: int = 0):
+        self.name = name
+        self.size = size
+        self._opener = opener
+
+    def open(self) -> BinaryIO:
+        return self._opener()
+
+    def __repr__(self):
+        return f"UploadSource({self.name!r})"
+
+
+def upload_name(item: Union[str, UploadSource]) -> str:
+    """Serverdagi fayl nomi: manba uchun - uning nomi, lokal fayl uchun - basename."""
+    return item.name if isinstance(item, UploadSource) else os.path.basename(item)
+
+
+def upload_size(item: Union[str, UploadSource]) -> int:
+    if isinstance(item, UploadSource):
+        return item.size
+    try:
+        return os.path.getsize(item)
+    except OSError:
+        return 0
+
+
+class DigestReader:
+    """Fayl-obyekt o'rami: o'qilgan baytlarning SHA1 xeshini va sonini hisoblaydi (yuborilgan oqimni tekshirish uchun)."""
+
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self.digest = hashlib.sha1()
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.digest.update(data)
+        self.bytes_read += len(data)
+        return data